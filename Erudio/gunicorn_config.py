@@ -0,0 +1,117 @@
+"""
+Gunicorn configuration for Erudio.
+
+Used by the Procfile via ``gunicorn -c python:Erudio.gunicorn_config``.
+Every setting can be overridden from the environment, so the same file
+serves Render, a VM or a laptop.
+
+SERVER_MODE picks the stack:
+  - ``asgi`` (default): Erudio.asgi under uvicorn workers. One worker per
+    CPU is enough because each worker multiplexes many requests, including
+    the async payment views waiting on Paystack.
+  - ``wsgi``: Erudio.wsgi under threaded sync workers (2 x CPU + 1).
+
+See https://docs.gunicorn.org/en/stable/settings.html
+"""
+
+import multiprocessing
+import os
+import resource
+import sys
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'asgi').lower()
+CPU_COUNT = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+if SERVER_MODE == 'wsgi':
+    wsgi_app = 'Erudio.wsgi:application'
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    workers = _env_int('WEB_CONCURRENCY', CPU_COUNT * 2 + 1)
+    threads = _env_int('GUNICORN_THREADS', 4)
+else:
+    wsgi_app = 'Erudio.asgi:application'
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn_worker.UvicornWorker')
+    workers = _env_int('WEB_CONCURRENCY', CPU_COUNT + 1)
+
+# Import Django and the app once in the master so workers share the loaded
+# code copy-on-write instead of each importing it.
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+# WeasyPrint and the HTTP clients are imported lazily on first use. Set this
+# to also import them in the master, trading master RSS for no first-use
+# import cost in any worker.
+preload_heavy_modules = _env_bool('GUNICORN_PRELOAD_HEAVY', False)
+
+# Recycle workers periodically to cap slow memory growth; the jitter stops
+# every worker from restarting at the same moment.
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+# The slowest legitimate request is a Paystack verify that times out on every
+# attempt: (PAYSTACK_VERIFY_RETRIES + 1) x (PAYSTACK_CONNECT_TIMEOUT +
+# PAYSTACK_READ_TIMEOUT) plus up to 1.5s of backoff, about 41s with the
+# defaults (3 x 13.05s). Keep this above that if those settings change.
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Not Linux: fall back to the peak RSS (kilobytes on Linux, bytes on macOS).
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _warm_django(log):
+    """
+    Django resolves the URLconf (and so imports every view and its helpers)
+    and compiles each template on first use. Doing both in the master before
+    forking means the workers inherit the modules and compiled templates
+    instead of each building their own.
+    """
+    from django.urls import get_resolver
+    from lmsApp.template_cache import warm_template_cache
+
+    get_resolver().url_patterns
+    compiled, seconds = warm_template_cache()
+    log.info("Compiled %s templates in %.0f ms", compiled, seconds * 1000)
+    if preload_heavy_modules:
+        from lmsApp.lazy import preload_heavy_modules as preload
+
+        preload()
+
+
+def when_ready(server):
+    if preload_app:
+        _warm_django(server.log)
+    server.log.info(
+        "Erudio %s server ready: %s x %s, preload=%s, master RSS %.1f MB",
+        SERVER_MODE, workers, worker_class, preload_app, _rss_mb(),
+    )
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _warm_django(worker.log)
+    worker.log.info("Worker %s booted, RSS %.1f MB", worker.pid, _rss_mb())
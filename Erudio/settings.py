@@ -43,27 +43,44 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lmsApp.middleware.PerformanceMiddleware',
+    'lmsApp.middleware.QueryInspectorMiddleware',
+    'lmsApp.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'lmsApp.middleware.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'Erudio.urls'
 
+# Not a setting (the old TEMPLATE_LOADERS setting is gone from Django); the
+# loaders are read back from TEMPLATES, e.g. by benchmark_templates.
+template_source_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Production keeps compiled templates in memory for the life of
+            # the worker; they are compiled up front by
+            # lmsApp.template_cache.warm_template_cache() at boot.
+            'loaders': template_source_loaders if DEBUG else [
+                ('django.template.loaders.cached.Loader', template_source_loaders),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'lmsApp.context_processors.user_profile',
             ],
         },
     },
@@ -76,24 +93,70 @@ WSGI_APPLICATION = 'Erudio.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 
+# How each process reaches Postgres (DB_POOL_MODE):
+#   persistent (default): one connection per worker thread, reused for
+#       DB_CONN_MAX_AGE seconds.
+#   psycopg: Django's native psycopg 3 pool, DB_POOL_MIN_SIZE to
+#       DB_POOL_MAX_SIZE connections shared by every thread of the process.
+#       Requests wait up to DB_POOL_TIMEOUT seconds for a free connection.
+#   pgbouncer: DATABASE_URL points at a transaction-pooling pgbouncer, so
+#       server-side cursors are disabled.
+# Health checks are on in every mode, so a connection dropped by a database
+# restart is replaced at the start of the next request instead of failing it.
+DB_POOL_MODE = config('DB_POOL_MODE', default='persistent')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+DB_POOL_MIN_SIZE = config('DB_POOL_MIN_SIZE', default=2, cast=int)
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=10, cast=int)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=10, cast=float)
+
 if config('DATABASE_URL', default=None):
     # Production: Use Postgres
     DATABASES = {
         'default': dj_database_url.config(
             default=config('DATABASE_URL'),
-            conn_max_age=600,
+            # The psycopg pool owns connection reuse; Django must close (i.e.
+            # return) the connection after every request.
+            conn_max_age=0 if DB_POOL_MODE == 'psycopg' else DB_CONN_MAX_AGE,
+            conn_health_checks=True,
+            disable_server_side_cursors=DB_POOL_MODE == 'pgbouncer',
             ssl_require=True
         )
     }
+    if DB_POOL_MODE == 'psycopg':
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
 else:
     # Development: Use SQLite
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'CONN_HEALTH_CHECKS': True,
         }
     }
 
+# Optional read replica. Catalog pages and analytics dashboards read from it
+# (see lmsApp.db_router); everything else, and any user who wrote within the
+# last REPLICA_PIN_SECONDS, uses the primary. Locally, point it at a copy of
+# the SQLite file, e.g. REPLICA_DATABASE_URL=sqlite:///db-replica.sqlite3.
+if config('REPLICA_DATABASE_URL', default=None):
+    DATABASES['replica'] = dj_database_url.config(
+        env='REPLICA_DATABASE_URL',
+        conn_max_age=DATABASES['default'].get('CONN_MAX_AGE', 0),
+        conn_health_checks=True,
+        disable_server_side_cursors=DB_POOL_MODE == 'pgbouncer',
+    )
+    if DATABASES['replica']['ENGINE'] == DATABASES['default']['ENGINE']:
+        # Same SSL and pool options as the primary.
+        DATABASES['replica']['OPTIONS'] = dict(DATABASES['default'].get('OPTIONS', {}))
+    # Tests read and write a single database.
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['lmsApp.db_router.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -141,6 +204,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'lmsApp.CustomUser'
 
+# ErudioBackend is a ModelBackend, so it is configured alone: listing both
+# would check every failed login's password twice. Sessions created by
+# ModelBackend before it was introduced log in again once.
+AUTHENTICATION_BACKENDS = [
+    'lmsApp.auth.ErudioBackend',
+]
+
+# Session storage (SESSION_MODE):
+#   db (default): one session SELECT per authenticated request.
+#   cached_db: reads served from CACHES, writes go through to the database.
+#       Only use it with a cache shared by every worker, otherwise a logout
+#       on one worker leaves the session alive in the others' caches.
+#   signed_cookies: no server-side storage at all; the session lives in a
+#       signed cookie, so it cannot be revoked server-side before it expires.
+SESSION_MODE = config('SESSION_MODE', default='db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
@@ -165,6 +249,25 @@ else:
 
 PAYSTACK_PUBLIC_KEY=config("PAYSTACK_PUBLIC_KEY")
 PAYSTACK_SECRET_KEY=config("PAYSTACK_SECRET_KEY")
+# Point this at a local stub (`python manage.py paystack_stub`) when testing.
+PAYSTACK_BASE_URL = config("PAYSTACK_BASE_URL", default="https://api.paystack.co")
+# Currency every charge is initialized in; prices are stored in its major unit.
+PAYSTACK_CURRENCY = config("PAYSTACK_CURRENCY", default="NGN")
+PAYSTACK_CONNECT_TIMEOUT = config("PAYSTACK_CONNECT_TIMEOUT", default=3.05, cast=float)
+PAYSTACK_READ_TIMEOUT = config("PAYSTACK_READ_TIMEOUT", default=10, cast=float)
+# Keep-alive connections held per worker process.
+PAYSTACK_POOL_SIZE = config("PAYSTACK_POOL_SIZE", default=10, cast=int)
+# Concurrent connections per event loop for the async client used by ASGI workers.
+PAYSTACK_ASYNC_POOL_SIZE = config("PAYSTACK_ASYNC_POOL_SIZE", default=100, cast=int)
+# Extra attempts for idempotent verify calls, with jittered exponential backoff.
+PAYSTACK_VERIFY_RETRIES = config("PAYSTACK_VERIFY_RETRIES", default=2, cast=int)
+PAYSTACK_RETRY_BACKOFF = config("PAYSTACK_RETRY_BACKOFF", default=0.5, cast=float)
+# Consecutive failures before the circuit breaker opens, and how long it stays open.
+PAYSTACK_BREAKER_THRESHOLD = config("PAYSTACK_BREAKER_THRESHOLD", default=5, cast=int)
+PAYSTACK_BREAKER_RESET_SECONDS = config("PAYSTACK_BREAKER_RESET_SECONDS", default=30, cast=float)
+
+# Threads per process that run deferred side effects (emails, bulk enrollments).
+BACKGROUND_TASK_WORKERS = config("BACKGROUND_TASK_WORKERS", default=2, cast=int)
 
 
 USE_AZURE_STORAGE = config("USE_AZURE_STORAGE", default=not DEBUG, cast=bool)
@@ -191,7 +294,8 @@ if USE_AZURE_STORAGE and not DEBUG:
             },
         },
         "staticfiles": {
-            "BACKEND": "storages.backends.azure_storage.AzureStorage",
+            # Content-hashed names (with immutable Cache-Control) and gzip/Brotli copies.
+            "BACKEND": "lmsApp.storage.AzureManifestStaticStorage",
             "OPTIONS": {
                 "account_name": AZURE_ACCOUNT_NAME,
                 "account_key": AZURE_ACCOUNT_KEY,
@@ -201,8 +305,64 @@ if USE_AZURE_STORAGE and not DEBUG:
         },
     }
 
+else:
+    # Served by WhiteNoise: collectstatic writes content-hashed files plus
+    # gzip and Brotli copies, and hashed files are sent with far-future
+    # immutable Cache-Control headers, negotiated on Accept-Encoding.
+    STORAGES = {
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        },
+    }
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+        'whitenoise.middleware.WhiteNoiseMiddleware',
+    )
+
 AZURE_OVERWRITE_FILES = True
 
 CSRF_TRUSTED_ORIGINS = [
     "https://erudio.onrender.com"
 ]
+
+
+# Performance instrumentation
+# Fraction of requests (0.0 - 1.0) timed by lmsApp.middleware.PerformanceMiddleware.
+PERFORMANCE_SAMPLE_RATE = config('PERFORMANCE_SAMPLE_RATE', default=1.0 if DEBUG else 0.05, cast=float)
+# Number of recent requests kept per URL name for the staff stats endpoint.
+PERFORMANCE_HISTOGRAM_SIZE = config('PERFORMANCE_HISTOGRAM_SIZE', default=500, cast=int)
+
+# Duplicate / N+1 query detection (lmsApp.middleware.QueryInspectorMiddleware).
+QUERY_INSPECTOR_SAMPLE_RATE = config('QUERY_INSPECTOR_SAMPLE_RATE', default=1.0 if DEBUG else 0.0, cast=float)
+# A fingerprint executed this many times in one request is reported.
+QUERY_INSPECTOR_THRESHOLD = config('QUERY_INSPECTOR_THRESHOLD', default=2, cast=int)
+# Raise DuplicateQueryError instead of logging a warning (use in test settings).
+QUERY_INSPECTOR_STRICT = config('QUERY_INSPECTOR_STRICT', default=False, cast=bool)
+
+# Player heartbeats are summed in memory per worker and written at most this
+# often (in seconds), or sooner once this many lesson views are buffered.
+WATCH_TIME_FLUSH_INTERVAL = config('WATCH_TIME_FLUSH_INTERVAL', default=30, cast=int)
+WATCH_TIME_MAX_BUFFERED = config('WATCH_TIME_MAX_BUFFERED', default=5000, cast=int)
+
+# Responses smaller than this (in bytes) are sent uncompressed.
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=500, cast=int)
+# Identifies the deployed code in page ETags, so a deploy invalidates cached pages.
+CONTENT_RELEASE = config('RELEASE_VERSION', default=config('RENDER_GIT_COMMIT', default=''))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'lmsApp': {
+            'handlers': ['console'],
+            'level': config('LMSAPP_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
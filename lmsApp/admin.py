@@ -1,7 +1,48 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .course_content import clone_course
 from .models import *
 
+
+# --- PAGINATION FOR LARGE TABLES ---
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for big tables. An unfiltered changelist on PostgreSQL uses the
+    planner's row estimate instead of COUNT(*), which has to scan the whole
+    table. Filtered or searched changelists, small tables and other
+    databases still get an exact count.
+    """
+    # Below this estimate an exact count is cheap enough.
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is not None and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= self.exact_count_threshold:
+                    return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Base for changelists of tables that grow with traffic."""
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) behind "x of y results".
+    show_full_result_count = False
+
+
 # --- INLINES FOR A BETTER ADMIN EXPERIENCE ---
 
 class ModuleInline(admin.TabularInline):
@@ -14,7 +55,7 @@ class LessonInline(admin.TabularInline):
     """Allows editing lessons directly within the module admin page."""
     model = Lesson
     extra = 1
-    prepopulated_fields = {'slug': ('title',)}
+    # Slugs left blank are allocated by Lesson.save(), unique within the course.
 
 
 # --- MODELADMIN CONFIGURATIONS ---
@@ -23,6 +64,8 @@ class LessonInline(admin.TabularInline):
 class CustomUserAdmin(UserAdmin):
     """Customizes the admin interface for the CustomUser model."""
     model = CustomUser
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_display = ('email', 'first_name', 'last_name', 'is_staff', 'is_instructor', 'is_verified', 'is_active')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'is_instructor', 'groups')
     search_fields = ('email', 'first_name', 'last_name')
@@ -40,11 +83,14 @@ class CustomUserAdmin(UserAdmin):
 
 
 @admin.register(EmailVerificationToken)
-class EmailVerificationTokenAdmin(admin.ModelAdmin):
+class EmailVerificationTokenAdmin(LargeTableAdmin):
     """Customizes the admin interface for EmailVerificationToken."""
     list_display = ('user', 'id', 'created_at', 'is_expired')
     search_fields = ('user__email',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -58,12 +104,23 @@ class CourseAdmin(admin.ModelAdmin):
     list_display = ('title', 'instructor', 'display_categories', 'price', 'is_paid', 'is_published', 'created_at')
     list_filter = ('is_paid', 'is_published', 'category', 'instructor') # Corrected field name
     search_fields = ('title', 'short_description', 'long_description')
-    prepopulated_fields = {'slug': ('title',)}
+    # Not prepopulated: a blank slug is allocated by Course.save(), which
+    # picks the next free suffix instead of failing on duplicate titles.
     inlines = [ModuleInline]
     list_editable = ('is_published', 'is_paid')
+    actions = ['duplicate_courses']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('instructor').prefetch_related('category')
     
+    @admin.action(description="Duplicate selected courses as unpublished copies")
+    def duplicate_courses(self, request, queryset):
+        clones = [clone_course(course) for course in queryset]
+        self.message_user(request, f"Created {len(clones)} unpublished cop{'y' if len(clones) == 1 else 'ies'}.")
+
     def display_categories(self, obj):
         """Creates a string for the categories. This is required for ManyToMany fields."""
+        # Reads the categories prefetched by get_queryset().
         return ", ".join([category.name for category in obj.category.all()])
     display_categories.short_description = 'Categories' # Sets column header name
 
@@ -76,32 +133,58 @@ class ModuleAdmin(admin.ModelAdmin):
     search_fields = ('title',)
     inlines = [LessonInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('course')
+
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(LargeTableAdmin):
     """Customizes the admin interface for Lesson."""
     list_display = ('title', 'module', 'order', 'slug')
     list_filter = ('module__course',)
     search_fields = ('title',)
-    prepopulated_fields = {'slug': ('title',)}
+    # Not prepopulated: a blank slug is allocated by Lesson.save(), unique within the course.
+
+    def get_queryset(self, request):
+        # Module.__str__ includes the course title.
+        return super().get_queryset(request).select_related('module__course')
 
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableAdmin):
     """Customizes the admin interface for Enrollment."""
     list_display = ('student', 'course', 'enrolled_at', 'get_progress_percentage')
     search_fields = ('student__email', 'course__title')
     list_filter = ('course',)
 
+    def get_queryset(self, request):
+        # with_progress() annotates the lesson counts get_progress_percentage reads.
+        return super().get_queryset(request).select_related('student', 'course').with_progress()
+
+
+@admin.register(LessonWatchProgress)
+class LessonWatchProgressAdmin(LargeTableAdmin):
+    """Read-only view of the watch time aggregated from player heartbeats."""
+    list_display = ('enrollment', 'lesson', 'seconds_watched', 'last_position', 'updated_at')
+    search_fields = ('enrollment__student__email', 'enrollment__course__title')
+    raw_id_fields = ('enrollment', 'lesson')
+    readonly_fields = ('seconds_watched', 'last_position', 'updated_at')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('enrollment__student', 'enrollment__course', 'lesson')
+
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     """Customizes the admin interface for Transaction."""
     list_display = ('student', 'course', 'reference', 'amount', 'status', 'created_at')
     list_filter = ('status', 'course')
     search_fields = ('student__email', 'reference')
     readonly_fields = ('created_at',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('student', 'course')
+
 
 @admin.register(SubscriptionPlan)
 class SubscriptionPlanAdmin(admin.ModelAdmin):
@@ -115,4 +198,7 @@ class TeamAdmin(admin.ModelAdmin):
     list_display = ('name', 'owner', 'plan', 'is_active', 'subscription_ends')
     list_filter = ('plan', 'is_active')
     search_fields = ('name', 'owner__email')
-    autocomplete_fields = ['owner', 'members']
\ No newline at end of file
+    autocomplete_fields = ['owner', 'members']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('owner', 'plan')
\ No newline at end of file
@@ -0,0 +1,363 @@
+"""
+Read-only JSON API (v1) for the mobile app and partner integrations.
+
+    Endpoint                              Budget per request (queries include
+                                          the session and user lookups)
+    GET /api/v1/courses/                  <= 3 queries, p90 <= 60 ms
+    GET /api/v1/courses/<slug>/outline/   <= 9 queries, p90 <= 80 ms
+                                          (<= 4 when answered with 304)
+    GET /api/v1/me/enrollments/           <= 3 queries, p90 <= 60 ms
+    GET /api/v1/team/progress/            <= 3 queries, p90 <= 80 ms
+
+Budgets are checked on every sampled request (a warning is logged when a
+request runs more queries than its budget) and listed next to the observed
+figures on the performance stats page.
+
+Conventions:
+  - Lists are paginated by keyset, newest first: `?limit=` (default 20,
+    max 100) and `?cursor=` with the `next_cursor` of the previous page.
+    The database seeks straight to the cursor, so deep pages cost the same
+    as the first one.
+  - `?fields=a,b` returns only the listed fields of each item (the course
+    object for the outline); unknown fields are a 400.
+  - Rows are serialised from values() dictionaries; no model instances
+    are built.
+  - Responses carry an ETag and If-None-Match is answered with 304.
+  - The "me" and team endpoints use the session; without one they return 401.
+  - Errors are {"status": "error", "message": "..."} with a 4xx status.
+"""
+import base64
+import binascii
+import json
+import logging
+from functools import wraps
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Trim
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.views.decorators.http import condition
+from .auth import get_user_profile
+from .conditional import course_detail_etag, course_detail_last_modified
+from .db_router import replica_reads
+from .metrics import current_metrics
+from .models import Course, Enrollment, Lesson, Module
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# URL name -> {'queries': max queries, 'p90_ms': target 90th percentile}.
+API_BUDGETS = {}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_endpoint(url_name, queries, p90_ms, login_required=False):
+    """
+    Wraps a read-only API view: GET/HEAD only, ApiError turned into a JSON
+    error, optional session login (401 instead of a redirect), and the
+    endpoint's performance budget registered and checked.
+    """
+    API_BUDGETS[url_name] = {'queries': queries, 'p90_ms': p90_ms}
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                response = JsonResponse({'status': 'error', 'message': 'Method not allowed.'}, status=405)
+                response['Allow'] = 'GET, HEAD'
+                return response
+            try:
+                if login_required and not request.user.is_authenticated:
+                    raise ApiError('Authentication required.', status=401)
+                response = view_func(request, *args, **kwargs)
+            except ApiError as e:
+                response = JsonResponse({'status': 'error', 'message': str(e)}, status=e.status)
+
+            metrics = current_metrics.get()
+            if metrics is not None and metrics.query_count > queries:
+                logger.warning(
+                    "%s ran %d queries, over its budget of %d", url_name, metrics.query_count, queries
+                )
+            return response
+        return _wrapped_view
+    return decorator
+
+
+# --- HELPERS ---
+
+class Fieldset:
+    """
+    The fields an endpoint can return. `fields` maps each public name to a
+    values() path; `computed` maps a name to (paths it needs, function of
+    the row).
+    """
+    def __init__(self, fields, computed=None):
+        self.fields = fields
+        self.computed = computed or {}
+
+    def select(self, request):
+        raw = request.GET.get('fields')
+        if not raw:
+            return [*self.fields, *self.computed]
+        names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields and name not in self.computed]
+        if unknown:
+            available = ', '.join([*self.fields, *self.computed])
+            raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available fields: {available}.")
+        return names
+
+    def paths(self, names):
+        paths = []
+        for name in names:
+            paths.extend(self.computed[name][0] if name in self.computed else [self.fields[name]])
+        return list(dict.fromkeys(paths))
+
+    def serialize(self, row, names):
+        return {
+            name: self.computed[name][1](row) if name in self.computed else row[self.fields[name]]
+            for name in names
+        }
+
+
+def _encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        last_id = value['id']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ApiError('Invalid cursor.')
+    if not isinstance(last_id, int):
+        raise ApiError('Invalid cursor.')
+    return last_id
+
+
+def _page_size(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("'limit' must be an integer.")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(request, queryset, paths):
+    """
+    One page of `queryset` as values() rows, newest (highest id) first, and
+    the cursor of the next page (None on the last page). Fetches one extra
+    row instead of counting.
+    """
+    limit = _page_size(request)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        queryset = queryset.filter(id__lt=_decode_cursor(cursor))
+    if 'id' not in paths:
+        paths = [*paths, 'id']
+    rows = list(queryset.order_by('-id').values(*paths)[:limit + 1])
+    next_cursor = _encode_cursor(rows[limit - 1]['id']) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def json_response(request, payload):
+    """A JsonResponse with an ETag of its body, or 304 if the client has it."""
+    response = JsonResponse(payload)
+    set_response_etag(response)
+    response['Cache-Control'] = 'private, no-cache'
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def _progress(row):
+    # Same rounding as Enrollment.get_progress_percentage.
+    total = row['total_lesson_count']
+    return int(row['completed_lesson_count'] / total * 100) if total else 0
+
+
+PROGRESS_FIELDS = {
+    'completed_lessons': 'completed_lesson_count',
+    'total_lessons': 'total_lesson_count',
+}
+PROGRESS_COMPUTED = {'progress': (['completed_lesson_count', 'total_lesson_count'], _progress)}
+
+
+# --- CATALOG ---
+
+COURSE_FIELDS = Fieldset(
+    fields={
+        'id': 'id',
+        'slug': 'slug',
+        'title': 'title',
+        'short_description': 'short_description',
+        'difficulty': 'difficulty',
+        'price': 'price',
+        'is_paid': 'is_paid',
+        'thumbnail_url': 'thumbnail_url',
+        'instructor': 'instructor_name',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    # Filled in with one query per page, after the course rows.
+    computed={'categories': ([], lambda row: row['categories'])},
+)
+
+
+def _with_instructor_name(queryset, paths):
+    if 'instructor_name' in paths:
+        queryset = queryset.annotate(
+            instructor_name=Trim(Concat(F('instructor__first_name'), Value(' '), F('instructor__last_name')))
+        )
+    return queryset
+
+
+def _categories_for(course_ids):
+    """Course id -> [{'slug', 'name'}] for `course_ids`, with one query."""
+    categories = {course_id: [] for course_id in course_ids}
+    links = Course.category.through.objects.filter(course_id__in=course_ids).order_by('category__name')
+    for course_id, slug, name in links.values_list('course_id', 'category__slug', 'category__name'):
+        categories[course_id].append({'slug': slug, 'name': name})
+    return categories
+
+
+@api_endpoint('api_catalog', queries=3, p90_ms=60)
+@replica_reads
+def catalog_api_view(request):
+    """Published courses, newest first. Filters: `?category=<slug>`, `?difficulty=`."""
+    names = COURSE_FIELDS.select(request)
+    paths = COURSE_FIELDS.paths(names)
+
+    queryset = Course.objects.filter(is_published=True)
+    if request.GET.get('category'):
+        queryset = queryset.filter(category__slug=request.GET['category'])
+    if request.GET.get('difficulty'):
+        queryset = queryset.filter(difficulty=request.GET['difficulty'])
+    rows, next_cursor = keyset_page(request, _with_instructor_name(queryset, paths), paths)
+
+    if 'categories' in names:
+        categories = _categories_for([row['id'] for row in rows])
+        for row in rows:
+            row['categories'] = categories[row['id']]
+
+    return json_response(request, {
+        'results': [COURSE_FIELDS.serialize(row, names) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+# --- COURSE OUTLINE ---
+
+@api_endpoint('api_course_outline', queries=9, p90_ms=80)
+@replica_reads
+@condition(etag_func=course_detail_etag, last_modified_func=course_detail_last_modified)
+def course_outline_api_view(request, slug):
+    """
+    A published course with its modules and published lessons, in order.
+    Signed-in users also get their enrollment state and completed lessons.
+    """
+    names = COURSE_FIELDS.select(request)
+    paths = COURSE_FIELDS.paths(names)
+    queryset = _with_instructor_name(Course.objects.filter(slug=slug, is_published=True), paths)
+    course = queryset.values(*dict.fromkeys([*paths, 'id'])).first()
+    if course is None:
+        raise ApiError('Course not found.', status=404)
+    if 'categories' in names:
+        course['categories'] = _categories_for([course['id']])[course['id']]
+
+    modules = {
+        module['id']: {**module, 'lessons': []}
+        for module in Module.objects.filter(course_id=course['id']).order_by('order', 'id').values('id', 'title', 'order')
+    }
+    lessons = (
+        Lesson.objects.filter(module__course_id=course['id'], is_published=True)
+        .order_by('order', 'id').values('id', 'module_id', 'slug', 'title', 'order')
+    )
+    for lesson in lessons:
+        modules[lesson.pop('module_id')]['lessons'].append(lesson)
+
+    payload = {'course': COURSE_FIELDS.serialize(course, names), 'modules': list(modules.values())}
+    if request.user.is_authenticated:
+        # One row per completed lesson (lesson None if there are none); no rows if not enrolled.
+        completions = list(
+            Enrollment.objects.filter(student=request.user, course_id=course['id'])
+            .order_by('completed_lessons').values_list('completed_lessons', flat=True)
+        )
+        payload['progress'] = {
+            'enrolled': bool(completions),
+            'completed_lesson_ids': [lesson_id for lesson_id in completions if lesson_id is not None],
+        }
+    response = JsonResponse(payload)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# --- MY ENROLLMENTS ---
+
+ENROLLMENT_FIELDS = Fieldset(
+    fields={
+        'id': 'id',
+        'course': 'course__slug',
+        'course_title': 'course__title',
+        'enrolled_at': 'enrolled_at',
+        **PROGRESS_FIELDS,
+    },
+    computed=PROGRESS_COMPUTED,
+)
+
+
+@api_endpoint('api_my_enrollments', queries=3, p90_ms=60, login_required=True)
+@replica_reads
+def my_enrollments_api_view(request):
+    """The signed-in user's enrollments with progress, most recent first."""
+    names = ENROLLMENT_FIELDS.select(request)
+    rows, next_cursor = keyset_page(
+        request,
+        Enrollment.objects.filter(student=request.user).with_progress(),
+        ENROLLMENT_FIELDS.paths(names),
+    )
+    return json_response(request, {
+        'results': [ENROLLMENT_FIELDS.serialize(row, names) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+# --- TEAM PROGRESS ---
+
+TEAM_PROGRESS_FIELDS = Fieldset(
+    fields={
+        'id': 'id',
+        'member_id': 'student_id',
+        'member_email': 'student__email',
+        'member_name': 'member_name',
+        'course': 'course__slug',
+        'course_title': 'course__title',
+        'enrolled_at': 'enrolled_at',
+        **PROGRESS_FIELDS,
+    },
+    computed=PROGRESS_COMPUTED,
+)
+
+
+@api_endpoint('api_team_progress', queries=3, p90_ms=80, login_required=True)
+@replica_reads
+def team_progress_api_view(request):
+    """Course progress of every member of the signed-in owner's team, one item per enrollment."""
+    team_id = get_user_profile(request).owned_team_id
+    if team_id is None:
+        raise ApiError('Only team owners can see team progress.', status=403)
+    names = TEAM_PROGRESS_FIELDS.select(request)
+    paths = TEAM_PROGRESS_FIELDS.paths(names)
+    queryset = Enrollment.objects.filter(student__teams=team_id).with_progress()
+    if 'member_name' in paths:
+        queryset = queryset.annotate(
+            member_name=Trim(Concat(F('student__first_name'), Value(' '), F('student__last_name')))
+        )
+    rows, next_cursor = keyset_page(request, queryset, paths)
+    return json_response(request, {
+        'results': [TEAM_PROGRESS_FIELDS.serialize(row, names) for row in rows],
+        'next_cursor': next_cursor,
+    })
@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from .models import Team
+
+UserModel = get_user_model()
+
+# Outcomes of a login attempt, left on request.login_state by
+# ErudioBackend.authenticate() for LoginForm to turn into a message.
+LOGIN_OK = 'ok'
+LOGIN_INVALID = 'invalid_login'
+LOGIN_INVITED = 'invited'
+LOGIN_INACTIVE_B2B = 'inactive_b2b'
+LOGIN_UNVERIFIED = 'unverified'
+LOGIN_INACTIVE = 'inactive'
+
+
+class ErudioBackend(ModelBackend):
+    """
+    ModelBackend that loads the session user together with the team they
+    own in a single query, so request.user.owned_team and the user profile
+    below cost nothing extra on authenticated pages.
+
+    Logins are checked with one user query and one password hash; the
+    outcome, including why an account cannot log in, is left on the request
+    (see check_login).
+    """
+    def check_login(self, email, password):
+        """
+        Returns (user, state) for an email and password with one user query
+        and at most one password hash. Account states other than LOGIN_OK
+        and LOGIN_INVITED are only reported once the password matched, so
+        they do not reveal anything about an account to a wrong password.
+        """
+        user = UserModel._default_manager.filter(email__iexact=email).order_by('pk').first() if email else None
+        if user is None:
+            # Hash anyway, so an unknown email takes as long as a wrong password.
+            UserModel().set_password(password)
+            return None, LOGIN_INVALID
+        if user.is_invited and not user.has_usable_password():
+            return user, LOGIN_INVITED
+        if not user.check_password(password):
+            return user, LOGIN_INVALID
+        if not user.is_active and user.is_b2b_member:
+            return user, LOGIN_INACTIVE_B2B
+        if not user.is_verified:
+            return user, LOGIN_UNVERIFIED
+        if not self.user_can_authenticate(user):
+            return user, LOGIN_INACTIVE
+        return user, LOGIN_OK
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        user, state = self.check_login(username, password)
+        if request is not None:
+            request.login_state = state
+        if state != LOGIN_OK:
+            # Ends authenticate() here, so no backend configured after this
+            # one fetches the user and hashes the password a second time.
+            raise PermissionDenied
+        return user
+
+    def _session_user_queryset(self):
+        return UserModel._default_manager.select_related('owned_team')
+
+    def get_user(self, user_id):
+        try:
+            user = self._session_user_queryset().get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await self._session_user_queryset().aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class UserProfile:
+    """
+    The role flags the views, decorators and templates check on every
+    request, read once from request.user.
+    """
+    def __init__(self, user):
+        self.is_authenticated = user.is_authenticated
+        self.is_superuser = user.is_superuser
+        self.is_instructor = getattr(user, 'is_instructor', False)
+        self.is_b2b_member = getattr(user, 'is_b2b_member', False)
+        self.owned_team_id = None
+        if self.is_authenticated:
+            try:
+                # Already loaded when the session was resolved by ErudioBackend.
+                self.owned_team_id = user.owned_team.pk
+            except Team.DoesNotExist:
+                pass
+
+    def __repr__(self):
+        return (
+            f'<UserProfile instructor={self.is_instructor} superuser={self.is_superuser} '
+            f'b2b={self.is_b2b_member} owned_team={self.owned_team_id}>'
+        )
+
+
+def get_user_profile(request):
+    """Returns the UserProfile for request.user, building it at most once per request."""
+    profile = getattr(request, '_user_profile', None)
+    if profile is None:
+        profile = request._user_profile = UserProfile(request.user)
+    return profile
@@ -0,0 +1,262 @@
+"""
+Course bundles: a versioned file holding a course with its categories,
+learning outcomes, modules and lessons, used to move or copy a course
+between environments.
+
+A bundle is JSON Lines (one JSON object per line), optionally stored as
+`course.jsonl` inside a ZIP archive:
+
+    {"type": "bundle", "format": "erudio-course", "version": 1, "exported_at": "..."}
+    {"type": "course", "title": "...", "categories": ["..."], "outcomes": ["..."], ...}
+    {"type": "module", "id": 7, "title": "...", "order": 1}
+    ...
+    {"type": "lesson", "module": 7, "title": "...", "slug": "...", "video_url": "...", ...}
+    ...
+
+Every module record comes before the first lesson record. IDs are the
+exporting database's and only link lessons to their module; the importer
+assigns new IDs and slugs. One record per line lets both sides stream:
+the exporter never holds the course in memory and the importer inserts
+lessons in batches as it reads them.
+"""
+import json
+import zipfile
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from .models import Category, Course, Lesson, Module
+from .slugs import SlugSet
+
+BUNDLE_FORMAT = 'erudio-course'
+BUNDLE_VERSION = 1
+# Name of the JSON Lines member in a ZIP bundle.
+BUNDLE_MEMBER = 'course.jsonl'
+# Lessons inserted per bulk_create().
+IMPORT_BATCH_SIZE = 500
+# Longest line and largest (decompressed) bundle the importer reads, so a
+# small upload cannot expand into an unbounded amount of memory or work.
+MAX_LINE_BYTES = 1024 * 1024
+MAX_BUNDLE_BYTES = 256 * 1024 * 1024
+
+COURSE_FIELDS = (
+    'title', 'slug', 'short_description', 'long_description', 'difficulty',
+    'price', 'thumbnail_url', 'is_paid', 'is_published',
+)
+LESSON_FIELDS = ('title', 'slug', 'video_url', 'content', 'order', 'is_published')
+
+
+class BundleError(ValueError):
+    """Raised when a course bundle cannot be read or imported."""
+
+
+# --- EXPORT ---
+
+def iter_bundle_records(course):
+    """Yields the records of `course`'s bundle, reading lessons in chunks."""
+    yield {
+        'type': 'bundle', 'format': BUNDLE_FORMAT, 'version': BUNDLE_VERSION,
+        'exported_at': timezone.now().isoformat(),
+    }
+    record = {'type': 'course'}
+    record.update({field: getattr(course, field) for field in COURSE_FIELDS})
+    record['price'] = str(course.price)
+    record['categories'] = list(course.category.order_by('name').values_list('name', flat=True))
+    record['outcomes'] = course.learning_outcomes
+    yield record
+
+    for module in Module.objects.filter(course=course).order_by('order', 'id').values('id', 'title', 'order'):
+        yield {'type': 'module', **module}
+
+    lessons = (
+        Lesson.objects.filter(module__course=course)
+        .order_by('module__order', 'module_id', 'order', 'id')
+        .values('module_id', *LESSON_FIELDS)
+    )
+    for lesson in lessons.iterator(chunk_size=IMPORT_BATCH_SIZE):
+        yield {'type': 'lesson', 'module': lesson.pop('module_id'), **lesson}
+
+
+def iter_bundle_lines(course):
+    """Yields the bundle of `course` as encoded JSON Lines."""
+    for record in iter_bundle_records(course):
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def write_bundle(course, fileobj, compress=False):
+    """Writes `course`'s bundle to a binary file, as a ZIP archive if `compress`."""
+    if not compress:
+        for line in iter_bundle_lines(course):
+            fileobj.write(line)
+        return
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(BUNDLE_MEMBER, 'w') as member:
+            for line in iter_bundle_lines(course):
+                member.write(line)
+
+
+# --- IMPORT ---
+
+def read_bundle_records(fileobj):
+    """
+    Yields (line number, record) from a bundle file, plain or zipped. Lines
+    are parsed one at a time; a ZIP member is decompressed as it is read.
+    Raises BundleError for a line longer than MAX_LINE_BYTES or once more
+    than MAX_BUNDLE_BYTES have been read.
+    """
+    is_zip = zipfile.is_zipfile(fileobj)
+    fileobj.seek(0)
+    if is_zip:
+        try:
+            stream = zipfile.ZipFile(fileobj).open(BUNDLE_MEMBER)
+        except KeyError:
+            raise BundleError(f"The ZIP archive has no {BUNDLE_MEMBER} file.")
+    else:
+        stream = fileobj
+
+    with stream:
+        total_bytes = 0
+        line_number = 0
+        while True:
+            line = stream.readline(MAX_LINE_BYTES + 1)
+            if not line:
+                return
+            line_number += 1
+            if len(line) > MAX_LINE_BYTES:
+                raise BundleError(f"Line {line_number}: longer than {MAX_LINE_BYTES} bytes.")
+            total_bytes += len(line)
+            if total_bytes > MAX_BUNDLE_BYTES:
+                raise BundleError(f"The bundle is larger than {MAX_BUNDLE_BYTES} bytes.")
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise BundleError(f"Line {line_number}: not valid JSON.")
+            if not isinstance(record, dict):
+                raise BundleError(f"Line {line_number}: expected a JSON object.")
+            yield line_number, record
+
+
+def _clean(instance, line_number, exclude):
+    try:
+        instance.full_clean(exclude=exclude, validate_unique=False)
+    except ValidationError as e:
+        errors = '; '.join(f'{field}: {" ".join(messages)}' for field, messages in e.message_dict.items())
+        raise BundleError(f"Line {line_number}: {errors}")
+
+
+def _string_list(record, key, line_number, max_length=None):
+    """The list of strings under `key` in a record (empty if missing)."""
+    values = record.get(key)
+    if values is None:
+        return []
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise BundleError(f"Line {line_number}: {key}: expected a list of strings.")
+    if max_length is not None and any(len(value) > max_length for value in values):
+        raise BundleError(f"Line {line_number}: {key}: values can be at most {max_length} characters.")
+    return values
+
+
+def _expect(records, record_type):
+    try:
+        line_number, record = next(records)
+    except StopIteration:
+        raise BundleError(f"The bundle ends before the {record_type} record.")
+    if record.get('type') != record_type:
+        raise BundleError(f"Line {line_number}: expected the {record_type} record.")
+    return line_number, record
+
+
+def _import_course(line_number, record, instructor):
+    course = Course(instructor=instructor)
+    for field in COURSE_FIELDS:
+        if field in record and field != 'slug':
+            setattr(course, field, record[field])
+    outcomes = _string_list(record, 'outcomes', line_number)
+    names = _string_list(record, 'categories', line_number, Category._meta.get_field('name').max_length)
+    course.what_you_will_learn = '\n'.join(outcomes) or None
+    # Imported courses are reviewed before they go live, and get their own slug.
+    course.is_published = False
+    course.slug = ''
+    _clean(course, line_number, exclude=['instructor', 'slug'])
+    course.save()
+
+    if names:
+        categories = list(Category.objects.filter(name__in=names))
+        known = {category.name for category in categories}
+        for name in dict.fromkeys(names):
+            if name not in known:
+                categories.append(Category.objects.get_or_create(name=name)[0])
+        course.category.add(*categories)
+    return course
+
+
+def _insert_modules(pending):
+    """Inserts the modules read so far; returns bundle module ID -> new ID."""
+    Module.objects.bulk_create([module for _, module in pending])
+    return {source_id: module.pk for source_id, module in pending}
+
+
+def import_bundle(fileobj, instructor):
+    """
+    Creates a new, unpublished course owned by `instructor` from a bundle.
+    Categories are matched by name and created if missing; modules are
+    inserted with one bulk_create() and lessons in batches while the file
+    is read. Everything runs in one transaction, so an invalid record
+    leaves nothing behind. Returns (course, module count, lesson count).
+    """
+    records = read_bundle_records(fileobj)
+    line_number, header = _expect(records, 'bundle')
+    if header.get('format') != BUNDLE_FORMAT:
+        raise BundleError("This file is not an Erudio course bundle.")
+    if not isinstance(header.get('version'), int) or not 1 <= header['version'] <= BUNDLE_VERSION:
+        raise BundleError(f"Unsupported bundle version {header.get('version')!r}; this site reads up to version {BUNDLE_VERSION}.")
+
+    with transaction.atomic():
+        course = _import_course(*_expect(records, 'course'), instructor)
+
+        pending_modules = []
+        seen_module_ids = set()
+        module_ids = None
+        lesson_slugs = SlugSet(Lesson._meta.get_field('slug').max_length, 'lesson')
+        batch = []
+        lesson_count = 0
+
+        for line_number, record in records:
+            record_type = record.get('type')
+            if record_type == 'module':
+                if module_ids is not None:
+                    raise BundleError(f"Line {line_number}: modules must come before the first lesson.")
+                if not isinstance(record.get('id'), (int, str)) or record['id'] in seen_module_ids:
+                    raise BundleError(f"Line {line_number}: modules need an 'id' that is unique within the bundle.")
+                seen_module_ids.add(record['id'])
+                module = Module(course=course, title=record.get('title', ''), order=record.get('order', 0))
+                _clean(module, line_number, exclude=['course'])
+                pending_modules.append((record['id'], module))
+            elif record_type == 'lesson':
+                if module_ids is None:
+                    module_ids = _insert_modules(pending_modules)
+                if not isinstance(record.get('module'), (int, str)) or record['module'] not in module_ids:
+                    raise BundleError(f"Line {line_number}: lesson refers to unknown module {record.get('module')!r}.")
+                lesson = Lesson(module_id=module_ids[record['module']])
+                for field in LESSON_FIELDS:
+                    if field in record and field != 'slug':
+                        setattr(lesson, field, record[field])
+                _clean(lesson, line_number, exclude=['module', 'slug'])
+                # bulk_create() skips Lesson.save(), which normally does this.
+                lesson.set_video_ref()
+                lesson.slug = lesson_slugs.allocate(record.get('slug'), lesson.title)
+                batch.append(lesson)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    Lesson.objects.bulk_create(batch)
+                    lesson_count += len(batch)
+                    batch = []
+            else:
+                raise BundleError(f"Line {line_number}: unknown record type {record_type!r}.")
+
+        if module_ids is None:
+            _insert_modules(pending_modules)
+        if batch:
+            Lesson.objects.bulk_create(batch)
+            lesson_count += len(batch)
+    return course, len(pending_modules), lesson_count
@@ -0,0 +1,110 @@
+"""
+ETag / Last-Modified validators for the public course pages, used with
+django.views.decorators.http.condition so an unchanged page is answered
+with 304 Not Modified before the view queries or renders anything.
+
+A page's validator combines:
+  - the deployed release, so template changes invalidate every page;
+  - what the page shows: Course.updated_at, Course.content_revision
+    (bumped on module/lesson edits) and the instructor's name or, for the
+    catalog, the same for every published course plus the categories and
+    which courses they are on. Names are hashed because renaming a
+    category or an instructor does not touch Course.updated_at;
+  - who is looking: the navbar and enrollment state differ per user.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count
+from .auth import get_user_profile
+from .models import Category, Course, Enrollment
+
+# Falls back to the process start time, which preloaded gunicorn workers share.
+RELEASE = getattr(settings, 'CONTENT_RELEASE', '') or f'boot-{time.time_ns()}'
+
+
+def _viewer_key(request):
+    if not request.user.is_authenticated:
+        return 'anonymous'
+    profile = get_user_profile(request)
+    return (
+        f'{request.user.pk}:{request.user.get_full_name()}:'
+        f'{profile.is_instructor}:{profile.is_superuser}:{profile.owned_team_id}'
+    )
+
+
+def _make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in (RELEASE, *parts)).encode()).hexdigest()
+
+
+def _memoized(request, key, compute):
+    cache = request.__dict__.setdefault('_conditional_state', {})
+    if key not in cache:
+        # A page with pending flash messages must be rendered to show them.
+        cache[key] = None if get_messages(request) else compute()
+    return cache[key]
+
+
+# --- COURSE DETAIL ---
+
+def _course_detail_state(request, slug):
+    def compute():
+        course = Course.objects.filter(slug=slug, is_published=True).values_list(
+            'id', 'updated_at', 'content_revision', 'instructor__first_name', 'instructor__last_name',
+        ).first()
+        if course is None:
+            return None
+        course_id, updated_at, revision, *instructor = course
+        progress = None
+        if request.user.is_authenticated:
+            progress = Enrollment.objects.filter(student=request.user, course_id=course_id).annotate(
+                completed=Count('completed_lessons')
+            ).values_list('id', 'completed').first()
+        return {
+            'etag': _make_etag(
+                'course', course_id, updated_at.isoformat(), revision, instructor, progress, _viewer_key(request),
+            ),
+            'last_modified': updated_at,
+        }
+    return _memoized(request, ('course', slug), compute)
+
+
+def course_detail_etag(request, slug):
+    state = _course_detail_state(request, slug)
+    return state and state['etag']
+
+
+def course_detail_last_modified(request, slug):
+    state = _course_detail_state(request, slug)
+    return state and state['last_modified']
+
+
+# --- CATALOG (home page and course list) ---
+
+def _catalog_state(request):
+    def compute():
+        # One row per published course and category it is on; the pages
+        # render every one of these values, so they are read rather than
+        # summarised by count and newest id.
+        courses = list(
+            Course.objects.filter(is_published=True).order_by('id', 'category__id').values_list(
+                'id', 'updated_at', 'content_revision', 'instructor__first_name', 'instructor__last_name', 'category__id',
+            )
+        )
+        categories = list(Category.objects.order_by('id').values_list('id', 'name', 'slug'))
+        return {
+            'etag': _make_etag('catalog', courses, categories, _viewer_key(request)),
+            'last_modified': max((row[1] for row in courses), default=None),
+        }
+    return _memoized(request, 'catalog', compute)
+
+
+def catalog_etag(request, *args, **kwargs):
+    state = _catalog_state(request)
+    return state and state['etag']
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    state = _catalog_state(request)
+    return state and state['last_modified']
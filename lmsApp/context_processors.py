@@ -0,0 +1,7 @@
+from django.utils.functional import SimpleLazyObject
+from .auth import get_user_profile
+
+
+def user_profile(request):
+    """Makes the request's UserProfile available to templates as `user_profile`."""
+    return {'user_profile': SimpleLazyObject(lambda: get_user_profile(request))}
@@ -0,0 +1,144 @@
+from django.db import transaction
+from .models import Course, Lesson, Module
+from .slugs import SlugSet
+
+# Lessons read and inserted per batch when cloning.
+CLONE_BATCH_SIZE = 500
+
+
+class ContentOrderError(ValueError):
+    """Raised when a reorder payload does not describe the course's content exactly."""
+
+
+def _parse_ids(values, label):
+    if not isinstance(values, list):
+        raise ContentOrderError(f"'{label}' must be a list of IDs.")
+    try:
+        ids = [int(value) for value in values]
+    except (TypeError, ValueError):
+        raise ContentOrderError(f"'{label}' must only contain integer IDs.")
+    if len(set(ids)) != len(ids):
+        raise ContentOrderError(f"'{label}' lists an ID more than once.")
+    return ids
+
+
+def parse_content_order(payload):
+    """
+    Validates the shape of a reorder payload:
+
+        {"modules": [{"id": 3, "lessons": [12, 10, 11]}, {"id": 1, "lessons": []}]}
+
+    Returns a list of (module_id, [lesson_id, ...]) in the new order.
+    """
+    modules = payload.get('modules') if isinstance(payload, dict) else None
+    if not isinstance(modules, list):
+        raise ContentOrderError("Expected a 'modules' list.")
+    layout = []
+    for entry in modules:
+        if not isinstance(entry, dict) or 'id' not in entry:
+            raise ContentOrderError("Each module needs an 'id' and a 'lessons' list.")
+        module_id = _parse_ids([entry['id']], 'modules')[0]
+        layout.append((module_id, _parse_ids(entry.get('lessons', []), f'lessons of module {module_id}')))
+    _parse_ids([module_id for module_id, _ in layout], 'modules')
+    _parse_ids([lesson_id for _, lesson_ids in layout for lesson_id in lesson_ids], 'lessons')
+    return layout
+
+
+def reorder_course_content(course, layout):
+    """
+    Applies a new module and lesson order to `course` in one transaction:
+    one query reads the current modules, one the lessons, and one
+    bulk_update per model writes the rows that changed. Lessons can move
+    between modules of the same course. Orders are 1-based.
+
+    `layout` must list every module and lesson of the course exactly once;
+    otherwise ContentOrderError is raised and nothing is written. Returns
+    the new order in the same shape as the input, with orders filled in.
+    """
+    with transaction.atomic():
+        # Serialises with lesson creation, which locks the same row.
+        list(Course.objects.select_for_update().filter(pk=course.pk).values_list('pk'))
+        module_orders = dict(Module.objects.filter(course=course).values_list('id', 'order'))
+        lesson_rows = {
+            lesson_id: (module_id, order)
+            for lesson_id, module_id, order in Lesson.objects.filter(module__course=course).values_list('id', 'module_id', 'order')
+        }
+
+        if {module_id for module_id, _ in layout} != module_orders.keys():
+            raise ContentOrderError("The module list must contain every module of this course exactly once.")
+        if {lesson_id for _, lesson_ids in layout for lesson_id in lesson_ids} != lesson_rows.keys():
+            raise ContentOrderError("The lesson lists must contain every lesson of this course exactly once.")
+
+        changed_modules, changed_lessons, result = [], [], []
+        for module_order, (module_id, lesson_ids) in enumerate(layout, start=1):
+            if module_orders[module_id] != module_order:
+                changed_modules.append(Module(id=module_id, order=module_order))
+            lessons = []
+            for lesson_order, lesson_id in enumerate(lesson_ids, start=1):
+                if lesson_rows[lesson_id] != (module_id, lesson_order):
+                    changed_lessons.append(Lesson(id=lesson_id, module_id=module_id, order=lesson_order))
+                lessons.append({'id': lesson_id, 'order': lesson_order})
+            result.append({'id': module_id, 'order': module_order, 'lessons': lessons})
+
+        # bulk_update() bypasses save(), so the revision is bumped here, once.
+        if changed_modules:
+            Module.objects.bulk_update(changed_modules, ['order'])
+        if changed_lessons:
+            Lesson.objects.bulk_update(changed_lessons, ['module', 'order'])
+        if changed_modules or changed_lessons:
+            Course.bump_content_revision(course.pk)
+    return result
+
+
+def clone_course(course, instructor=None, title=None):
+    """
+    Deep-copies `course` with its categories, modules and lessons into a new,
+    unpublished course owned by `instructor` (default: the same instructor).
+
+    The query count does not grow with the size of the course: the course
+    row is saved once (its slug comes from the allocator), categories are
+    copied with one insert, modules with one bulk_create(), and lessons in
+    batches of CLONE_BATCH_SIZE. Lesson slugs are worked out in memory, as
+    the new course has none yet. Returns the new course.
+    """
+    CourseCategory = Course.category.through
+    max_title = Course._meta.get_field('title').max_length
+    with transaction.atomic():
+        clone = Course.objects.get(pk=course.pk)
+        clone.pk = None
+        clone._state.adding = True
+        clone.title = title or f"{course.title[:max_title - 7]} (Copy)"
+        clone.slug = ''
+        clone.instructor = instructor or course.instructor
+        clone.is_published = False
+        clone.content_revision = 0
+        clone.save()
+
+        CourseCategory.objects.bulk_create([
+            CourseCategory(course_id=clone.pk, category_id=category_id)
+            for category_id in CourseCategory.objects.filter(course_id=course.pk).values_list('category_id', flat=True)
+        ])
+
+        source_modules = list(Module.objects.filter(course=course).order_by('order', 'id').values_list('id', 'title', 'order'))
+        modules = Module.objects.bulk_create([
+            Module(course=clone, title=module_title, order=order) for _, module_title, order in source_modules
+        ])
+        module_ids = {source_id: module.pk for (source_id, _, _), module in zip(source_modules, modules)}
+
+        lesson_slugs = SlugSet(Lesson._meta.get_field('slug').max_length, 'lesson')
+        lessons = (
+            Lesson.objects.filter(module__course=course)
+            .order_by('module__order', 'module_id', 'order', 'id')
+            .values('module_id', 'title', 'slug', 'video_url', 'video_provider', 'video_id', 'content', 'order', 'is_published')
+        )
+        batch = []
+        for lesson in lessons.iterator(chunk_size=CLONE_BATCH_SIZE):
+            lesson['module_id'] = module_ids[lesson['module_id']]
+            lesson['slug'] = lesson_slugs.allocate(lesson['slug'], lesson['title'])
+            batch.append(Lesson(**lesson))
+            if len(batch) >= CLONE_BATCH_SIZE:
+                Lesson.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Lesson.objects.bulk_create(batch)
+    return clone
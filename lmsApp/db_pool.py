@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from .metrics import current_metrics
+
+
+class CheckoutStats:
+    """
+    Process-wide record of how long getting a database connection took for
+    one alias. With the psycopg pool this is the wait for a free pooled
+    connection; otherwise it is the cost of opening a new connection.
+    Durations are stored in seconds.
+    """
+    def __init__(self, size=1000):
+        self.recent = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def add(self, duration, failed=False):
+        with self.lock:
+            self.recent.append(duration)
+            self.count += 1
+            self.total += duration
+            self.max = max(self.max, duration)
+            if failed:
+                self.errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            recent = sorted(self.recent)
+            count, total, longest, errors = self.count, self.total, self.max, self.errors
+        if not count:
+            return {'count': 0}
+
+        def percentile(p):
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))] * 1000, 2)
+
+        return {
+            'count': count,
+            'errors': errors,
+            'avg_ms': round(total / count * 1000, 2),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(longest * 1000, 2),
+        }
+
+
+_checkout_stats = {}
+_checkout_stats_lock = threading.Lock()
+
+
+def record_checkout(alias, duration, failed=False):
+    stats = _checkout_stats.get(alias)
+    if stats is None:
+        with _checkout_stats_lock:
+            stats = _checkout_stats.setdefault(alias, CheckoutStats())
+    stats.add(duration, failed)
+
+
+# --- CONNECTION CHECKOUT HOOK ---
+
+_original_connect = BaseDatabaseWrapper.connect
+
+
+def _timed_connect(self):
+    """
+    Wraps BaseDatabaseWrapper.connect() so every connection checkout is
+    recorded for the process and charged to the current request, if sampled.
+    """
+    start = time.perf_counter()
+    failed = True
+    try:
+        _original_connect(self)
+        failed = False
+    finally:
+        duration = time.perf_counter() - start
+        record_checkout(self.alias, duration, failed)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.record_db_connect(duration)
+
+
+_timed_connect.is_erudio_timer = True
+
+
+def install_checkout_timer():
+    if not getattr(BaseDatabaseWrapper.connect, 'is_erudio_timer', False):
+        BaseDatabaseWrapper.connect = _timed_connect
+
+
+def database_stats():
+    """
+    Summarises every configured database for this process: how connections
+    are managed, checkout timings and, with the psycopg pool, the pool's own
+    counters (size, idle connections, queued requests, total wait).
+    """
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        settings_dict = connection.settings_dict
+        pool = getattr(connection, 'pool', None)
+        entry = {
+            'vendor': connection.vendor,
+            'mode': getattr(settings, 'DB_POOL_MODE', 'persistent') if connection.vendor == 'postgresql' else 'local',
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+            'checkout': _checkout_stats[alias].snapshot() if alias in _checkout_stats else {'count': 0},
+        }
+        if pool is not None:
+            entry['pool'] = pool.get_stats()
+        stats[alias] = entry
+    return stats
@@ -0,0 +1,77 @@
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+# Signed cookie marking a user who wrote recently and must read from the primary.
+PRIMARY_PIN_COOKIE = 'erudio_primary_pin'
+
+# Routing state for the request being handled (None outside a request, e.g.
+# in management commands, where every query goes to the primary).
+current_routing = ContextVar('erudio_db_routing', default=None)
+
+
+class RoutingState:
+    """
+    Per-request routing decisions.
+
+    use_replica: set by @replica_reads for views that may tolerate
+        replication lag.
+    pinned: the user wrote recently, so reads stay on the primary.
+    wrote: this request wrote to the primary.
+    """
+    def __init__(self, pinned=False):
+        self.use_replica = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_available():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to the replica only inside views marked with @replica_reads,
+    and only while the user is not pinned to the primary. Writes always go
+    to the primary and pin the user there (see ReplicaPinningMiddleware) so
+    they read their own writes, e.g. a new enrollment or completed lesson.
+    """
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        if state is None or not state.use_replica or state.pinned or state.wrote:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives schema changes through replication.
+        return db != REPLICA_DB_ALIAS
+
+
+def replica_reads(view_func):
+    """
+    Decorator for read-only views (catalog pages, analytics dashboards) whose
+    queries may be served by the read replica.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        state = current_routing.get()
+        if state is None:
+            return view_func(request, *args, **kwargs)
+        state.use_replica = True
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            state.use_replica = False
+    return _wrapped_view
@@ -0,0 +1,281 @@
+"""
+Streaming CSV and XLSX exports.
+
+Rows are read from the database in chunks and written to the response as
+they arrive, so memory use does not depend on the number of rows: nothing
+ever holds the full result. XLSX files are written with the standard
+library (an XLSX file is a ZIP archive of XML parts), which lets the
+worksheet be streamed row by row as well.
+"""
+import csv
+import datetime
+import decimal
+import re
+import zipfile
+from xml.sax.saxutils import escape
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Rows fetched from the database per round trip.
+EXPORT_CHUNK_SIZE = 2000
+# Rows written between two yields to the client.
+ROWS_PER_YIELD = 200
+
+# Spreadsheet apps evaluate a CSV cell starting with one of these as a formula.
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Control characters are not allowed in XML 1.0, even escaped.
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def iter_rows(queryset, fields, keyset=False):
+    """
+    Returns an iterator of `fields` tuples from `queryset` in primary-key
+    order, read chunk by chunk.
+
+    Uses a server-side cursor (QuerySet.iterator()) where the connection
+    allows one. Behind PgBouncer in transaction mode server-side cursors are
+    disabled and iterator() would fetch the whole result, so the rows are
+    read in primary-key ranges instead (keyset pagination). `keyset` forces
+    the latter, for streams that must not hold a cursor open between chunks.
+    """
+    # Bind to the database chosen now (e.g. the replica inside
+    # @replica_reads); the response is streamed after the view returns.
+    queryset = queryset.using(queryset.db).order_by('pk')
+    if not keyset and not connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        return queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return _iter_keyset(queryset, fields)
+
+
+def _iter_keyset(queryset, fields):
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk.values_list('pk', *fields)[:EXPORT_CHUNK_SIZE])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+        last_pk = rows[-1][0]
+
+
+async def _aiter_blocks(blocks):
+    """
+    Serves a synchronous byte generator to an async response. Each block is
+    produced in a worker thread, one at a time, so the database reads and
+    encoding never block the event loop and the stream is never collected
+    in memory (which is what Django does with a synchronous iterator).
+    """
+    next_block = sync_to_async(next)
+    while True:
+        block = await next_block(blocks, None)
+        if block is None:
+            return
+        yield block
+
+
+class _Sink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data if isinstance(data, bytes) else data.encode('utf-8'))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    value = _format_value(value)
+    # Names and titles are user input: quote anything that would run as a formula.
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_csv(header, rows):
+    """Yields a CSV file, with a BOM so spreadsheet apps detect UTF-8."""
+    sink = _Sink()
+    writer = csv.writer(sink)
+    sink.write('\ufeff')
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % ROWS_PER_YIELD == 0:
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+
+def _xlsx_row(number, values):
+    cells = []
+    for index, value in enumerate(values):
+        value = _format_value(value)
+        ref = f'{_column_name(index)}{number}'
+        if isinstance(value, bool):
+            cells.append(f'<c r="{ref}" t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float, decimal.Decimal)):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        elif value != '':
+            text = escape(_XML_ILLEGAL.sub('', str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+}
+
+
+def iter_xlsx(header, rows, sheet_name='Export'):
+    """
+    Yields a single-sheet XLSX workbook. The worksheet is compressed as it
+    is written; the ZIP archive uses data descriptors, so it never needs to
+    seek back and can go straight to the client.
+    """
+    sink = _Sink()
+    sheet = escape(_XML_ILLEGAL.sub('', sheet_name)[:31], {'"': '&quot;'})
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content.replace('{sheet}', sheet))
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as worksheet:
+            worksheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            worksheet.write(_xlsx_row(1, header).encode('utf-8'))
+            for number, row in enumerate(rows, start=2):
+                worksheet.write(_xlsx_row(number, row).encode('utf-8'))
+                if number % ROWS_PER_YIELD == 0:
+                    yield sink.drain()
+            worksheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+def streams_async(request):
+    """
+    Whether the response to `request` is served by the ASGI handler, which
+    needs an async iterator to stream. Exports read in keyset chunks there,
+    so no server-side cursor stays open while a slow client downloads.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def export_response(request, filename, header, rows, sheet_name='Export'):
+    """
+    Streams `rows` (an iterable of tuples) as a CSV download, or XLSX with
+    ?format=xlsx, named `filename` plus the format's extension.
+    """
+    export_format = 'xlsx' if request.GET.get('format') == 'xlsx' else 'csv'
+    if export_format == 'xlsx':
+        content = iter_xlsx(header, rows, sheet_name)
+    else:
+        content = iter_csv(header, rows)
+    if streams_async(request):
+        content = _aiter_blocks(content)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{timezone.localdate():%Y%m%d}.{export_format}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+# --- DATASETS ---
+
+TRANSACTION_COLUMNS = (
+    ('Reference', 'reference'),
+    ('Date', 'created_at'),
+    ('Status', 'status'),
+    ('Amount', 'amount'),
+    ('Student email', 'student__email'),
+    ('Course', 'course__title'),
+    ('Business plan', 'plan__name'),
+)
+
+ENROLLMENT_COLUMNS = (
+    ('Student email', 'student__email'),
+    ('First name', 'student__first_name'),
+    ('Last name', 'student__last_name'),
+    ('Course', 'course__title'),
+    ('Enrolled at', 'enrolled_at'),
+    ('Completed lessons', 'completed_lesson_count'),
+    ('Total lessons', 'total_lesson_count'),
+)
+
+
+def transaction_export(queryset, keyset=False):
+    """(header, rows) for a Transaction queryset."""
+    header = [label for label, _ in TRANSACTION_COLUMNS]
+    return header, iter_rows(queryset, [field for _, field in TRANSACTION_COLUMNS], keyset)
+
+
+def enrollment_export(queryset, keyset=False):
+    """(header, rows) for an Enrollment queryset, with a progress column."""
+    header = [label for label, _ in ENROLLMENT_COLUMNS] + ['Progress (%)']
+    rows = iter_rows(queryset.with_progress(), [field for _, field in ENROLLMENT_COLUMNS], keyset)
+
+    def with_percentage():
+        # Same rounding as Enrollment.get_progress_percentage.
+        for row in rows:
+            completed, total = row[-2], row[-1]
+            yield (*row, int(completed / total * 100) if total else 0)
+    return header, with_percentage()
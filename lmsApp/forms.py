@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm
 from .models import *
 from django.contrib.auth.forms import SetPasswordForm
+from .auth import LOGIN_INACTIVE_B2B, LOGIN_INVITED, LOGIN_UNVERIFIED
 
 User = get_user_model()
 
@@ -64,6 +65,23 @@ class LoginForm(AuthenticationForm):
         widget=forms.PasswordInput(attrs={'class': 'form-input', 'placeholder': 'Password', 'autocomplete': 'current-password'}),
     )
 
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        LOGIN_INVITED: "This account was created via an invitation. Please use the link in your invitation email to set your password.",
+        LOGIN_INACTIVE_B2B: "Your account is inactive. Your team's subscription may have expired. Please contact your team manager.",
+        LOGIN_UNVERIFIED: "Your account is not verified. Please check your email for the activation link.",
+    }
+
+    @property
+    def login_state(self):
+        """Outcome of the last authentication, as set by ErudioBackend (None before validation)."""
+        return getattr(self.request, 'login_state', None)
+
+    def get_invalid_login_error(self):
+        if self.login_state in (LOGIN_INVITED, LOGIN_INACTIVE_B2B, LOGIN_UNVERIFIED):
+            return forms.ValidationError(self.error_messages[self.login_state], code=self.login_state)
+        return super().get_invalid_login_error()
+
 
 class CourseForm(forms.ModelForm):
     """
@@ -198,6 +216,27 @@ class AccountDeleteConfirmationForm(forms.Form):
             raise forms.ValidationError("You must type 'DELETE' to confirm.")
         return data
 
+class CourseImportForm(forms.Form):
+    """
+    Upload form for a course bundle exported from another Erudio site.
+    """
+    # Bundles are JSON Lines; 1,000 lessons come to a few megabytes.
+    MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+
+    bundle = forms.FileField(
+        label="Course bundle (.jsonl or .zip)",
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'mt-1 block w-full text-sm text-gray-700 border border-gray-300 rounded-md shadow-sm py-2 px-3',
+            'accept': '.jsonl,.json,.zip',
+        })
+    )
+
+    def clean_bundle(self):
+        bundle = self.cleaned_data['bundle']
+        if bundle.size > self.MAX_UPLOAD_SIZE:
+            raise forms.ValidationError("The bundle is too large (the limit is 50 MB).")
+        return bundle
+
 class SubscriptionPlanForm(forms.ModelForm):
     """
     Form for Super Admins to create and update Subscription Plans.
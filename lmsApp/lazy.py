@@ -0,0 +1,47 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on first attribute access.
+
+    Used for heavy optional-path dependencies (WeasyPrint pulls in cairo,
+    pango and fonttools) so that importing lmsApp.utils, which every view
+    and management command does, stays cheap:
+
+        weasyprint = LazyModule('weasyprint')
+        ...
+        weasyprint.HTML(string=html)  # imported here, once per process
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            # importlib is protected by the import lock, so concurrent first
+            # uses from several threads still import the module only once.
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def is_loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule '{self._name}' ({state})>"
+
+
+requests = LazyModule('requests')
+httpx = LazyModule('httpx')
+weasyprint = LazyModule('weasyprint')
+
+
+def preload_heavy_modules():
+    """Imports every lazy dependency now, e.g. in a preforking master process."""
+    for module in (requests, httpx, weasyprint):
+        module._load()
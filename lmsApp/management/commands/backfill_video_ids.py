@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from lmsApp.models import Lesson
+from lmsApp.video import BACKFILL_BATCH_SIZE, backfill_video_refs
+
+# Unrecognised URLs listed in the report; the rest are only counted.
+MAX_LISTED = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-parses every lesson's video URL into its stored provider and video ID, "
+        "e.g. after a video provider was added. Lists URLs no provider recognises."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+            help=f'Lessons read and updated per query (default: {BACKFILL_BATCH_SIZE}).',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        updated, unrecognised = backfill_video_refs(Lesson, batch_size=options['batch_size'])
+
+        for lesson_id, url in unrecognised[:MAX_LISTED]:
+            self.stdout.write(f"  lesson {lesson_id}: {url}")
+        if len(unrecognised) > MAX_LISTED:
+            self.stdout.write(f"  ... and {len(unrecognised) - MAX_LISTED} more")
+        if unrecognised:
+            self.stdout.write(self.style.WARNING(f"{len(unrecognised)} lesson(s) have a video URL no provider recognises."))
+        self.stdout.write(self.style.SUCCESS(f"Updated the video fields of {updated} lesson(s)."))
@@ -0,0 +1,76 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from lmsApp.utils import AsyncPaystackAPI, PaystackAPI, get_async_paystack_client
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures how many concurrent checkouts (initialize + verify against the gateway) one '
+        'process sustains with blocking sync workers versus the async client used by the ASGI views. '
+        'Run it against the local stub with an artificial delay, e.g. '
+        '`manage.py paystack_stub --delay 1` and PAYSTACK_BASE_URL=http://127.0.0.1:8765.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=500, help='Checkouts to run per mode (default: 500).')
+        parser.add_argument('--sync-workers', type=int, default=3, help='Blocking workers in the sync model, like gunicorn sync workers (default: 3).')
+        parser.add_argument('--concurrency', type=int, default=200, help='Checkouts in flight at once in the async model (default: 200).')
+        parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Gateway: {settings.PAYSTACK_BASE_URL}")
+        if options['mode'] in ('sync', 'both'):
+            self._report('sync', *self._run_sync(options['checkouts'], options['sync_workers']))
+        if options['mode'] in ('async', 'both'):
+            self._report('async', *asyncio.run(self._run_async(options['checkouts'], options['concurrency'])))
+
+    def _run_sync(self, checkouts, workers):
+        paystack = PaystackAPI()
+
+        def checkout(_):
+            reference = f'BENCH-{uuid.uuid4().hex}'
+            started = time.perf_counter()
+            ok = paystack.initialize_transaction('bench@erudio.test', 100000, reference, 'http://localhost/cb') is not None
+            ok = paystack.verify_transaction(reference) is not None and ok
+            return ok, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(checkout, range(checkouts)))
+        return results, time.perf_counter() - started
+
+    async def _run_async(self, checkouts, concurrency):
+        paystack = AsyncPaystackAPI()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def checkout():
+            async with semaphore:
+                reference = f'BENCH-{uuid.uuid4().hex}'
+                started = time.perf_counter()
+                ok = await paystack.initialize_transaction('bench@erudio.test', 100000, reference, 'http://localhost/cb') is not None
+                ok = await paystack.verify_transaction(reference) is not None and ok
+                return ok, time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(checkout() for _ in range(checkouts)))
+        elapsed = time.perf_counter() - started
+        await get_async_paystack_client().aclose()
+        return results, elapsed
+
+    def _report(self, mode, results, elapsed):
+        latencies = sorted(latency for _, latency in results)
+        succeeded = sum(1 for ok, _ in results if ok)
+        throughput = len(results) / elapsed
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        # Little's law: checkouts in flight = arrival rate x time each one takes.
+        in_flight = throughput * (sum(latencies) / len(latencies))
+        self.stdout.write(self.style.SUCCESS(
+            f"[{mode}] {succeeded}/{len(results)} checkouts ok in {elapsed:.2f}s: "
+            f"{throughput:.1f} checkouts/s, p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, "
+            f"~{in_flight:.0f} concurrent checkouts sustained"
+        ))
@@ -0,0 +1,84 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+# What a worker or management command imports on startup.
+STARTUP_SCRIPT = 'import django; django.setup(); import lmsApp.views'
+# The same, plus the dependencies that used to be imported eagerly by lmsApp.utils.
+EAGER_SCRIPT = STARTUP_SCRIPT + '; from lmsApp.lazy import preload_heavy_modules; preload_heavy_modules()'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures process startup with `python -X importtime`: total import time, baseline RSS and '
+        'the slowest top-level packages, for the lazy-import startup path versus importing '
+        'WeasyPrint, requests and httpx eagerly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per mode; the median is reported (default: 5).')
+        parser.add_argument('--top', type=int, default=10, help='Slowest top-level packages to list (default: 10).')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode, script in (('lazy', STARTUP_SCRIPT), ('eager', EAGER_SCRIPT)):
+            runs = [self._run(script) for _ in range(options['repeat'])]
+            results[mode] = {
+                'import_ms': statistics.median(r['import_ms'] for r in runs),
+                'rss_mb': statistics.median(r['rss_mb'] for r in runs),
+                'modules': runs[-1]['modules'],
+                'packages': runs[-1]['packages'],
+            }
+            self._report(mode, results[mode], options['top'])
+
+        lazy, eager = results['lazy'], results['eager']
+        self.stdout.write(self.style.SUCCESS(
+            f"\nLazy imports save {eager['import_ms'] - lazy['import_ms']:.0f} ms of import time "
+            f"({(1 - lazy['import_ms'] / eager['import_ms']) * 100:.0f}%), "
+            f"{eager['rss_mb'] - lazy['rss_mb']:.1f} MB of baseline RSS and "
+            f"{eager['modules'] - lazy['modules']} modules per process."
+        ))
+
+    def _run(self, script):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'Erudio.settings')
+        process = subprocess.Popen(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env, text=True,
+        )
+        stderr = process.stderr.read()
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            raise RuntimeError(f'Startup script failed:\n{stderr}')
+
+        total_us = 0
+        modules = 0
+        packages = defaultdict(int)
+        for line in stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            self_us = int(match.group(1))
+            total_us += self_us
+            modules += 1
+            packages[match.group(4).split('.')[0]] += self_us
+
+        # ru_maxrss is kilobytes on Linux and bytes on macOS.
+        rss_kb = usage.ru_maxrss / 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+        return {'import_ms': total_us / 1000, 'rss_mb': rss_kb / 1024, 'modules': modules, 'packages': packages}
+
+    def _report(self, mode, result, top):
+        self.stdout.write(
+            f"[{mode}] import time {result['import_ms']:.0f} ms, peak RSS {result['rss_mb']:.1f} MB, "
+            f"{result['modules']} modules"
+        )
+        slowest = sorted(result['packages'].items(), key=lambda item: -item[1])[:top]
+        for package, self_us in slowest:
+            self.stdout.write(f"    {package:<24} {self_us / 1000:8.1f} ms")
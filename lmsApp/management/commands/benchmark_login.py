@@ -0,0 +1,128 @@
+import time
+from contextlib import contextmanager
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from lmsApp.forms import LoginForm
+from lmsApp.models import CustomUser
+
+PASSWORD = 'correct-horse-battery'
+
+# (label, user flags or None for an unknown email, password sent)
+SCENARIOS = [
+    ('valid login', {'is_active': True, 'is_verified': True}, PASSWORD),
+    ('wrong password', {'is_active': True, 'is_verified': True}, 'wrong-password'),
+    ('unknown email', None, PASSWORD),
+    ('unverified', {'is_active': False, 'is_verified': False}, PASSWORD),
+    ('unverified, wrong password', {'is_active': False, 'is_verified': False}, 'wrong-password'),
+    ('inactive B2B member', {'is_active': False, 'is_verified': True, 'is_b2b_member': True}, PASSWORD),
+    ('invited, no password yet', {'is_active': True, 'is_verified': True, 'is_b2b_member': True, 'is_invited': True}, 'a-guess'),
+]
+
+# The previous flow ran with Django's default backend configuration.
+LEGACY_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the CPU time and password hashes of one login POST per account state, for the '
+        'current login flow and the previous one (separate user lookup, then up to three password '
+        'checks). Test users are created in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=5, help='Logins measured per scenario and flow (default: 5).')
+
+    def handle(self, *args, **options):
+        if options['rounds'] < 1:
+            raise CommandError('--rounds must be at least 1.')
+        self.factory = RequestFactory()
+        self.stdout.write(f"Password hasher: {get_hasher().algorithm}, {getattr(get_hasher(), 'iterations', '-')} iterations")
+        try:
+            with transaction.atomic():
+                for label, flags, password in SCENARIOS:
+                    email = self._create_user(flags)
+                    current = self._measure(self._current_login, email, password, options['rounds'])
+                    with override_settings(AUTHENTICATION_BACKENDS=LEGACY_BACKENDS):
+                        legacy = self._measure(self._legacy_login, email, password, options['rounds'])
+                    self.stdout.write(self.style.SUCCESS(
+                        f'[{label}] current: {current[0]:.1f} ms CPU, {current[1]:.0f} hash(es), {current[2]:.0f} queries | '
+                        f'previous: {legacy[0]:.1f} ms CPU, {legacy[1]:.0f} hash(es), {legacy[2]:.0f} queries'
+                    ))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _create_user(self, flags):
+        email = f'login-bench-{time.time_ns()}@erudio.test'
+        if flags is None:
+            return email
+        user = CustomUser(email=email, first_name='Bench', last_name='User', **flags)
+        if flags.get('is_invited'):
+            user.set_unusable_password()
+        else:
+            user.set_password(PASSWORD)
+        user.save()
+        return email
+
+    def _request(self, email, password):
+        request = self.factory.post('/accounts/login/', {'username': email, 'password': password})
+        request.session = SessionBase()
+        request._messages = FallbackStorage(request)
+        return request
+
+    def _current_login(self, email, password):
+        # What login_view does before rendering or redirecting.
+        form = LoginForm(self._request(email, password), data={'username': email, 'password': password})
+        form.is_valid()
+        return form.login_state
+
+    def _legacy_login(self, email, password):
+        # The checks login_view ran before this flow, followed by form validation.
+        request = self._request(email, password)
+        form = LoginForm(request, data=request.POST)
+        user_check = CustomUser.objects.filter(email__iexact=email).first()
+        if user_check:
+            if user_check.is_invited and not user_check.has_usable_password():
+                return 'invited'
+            if not user_check.is_active and user_check.is_b2b_member:
+                if authenticate(request, email=email, password=password) is None:
+                    return 'inactive_b2b'
+            if not user_check.is_verified and user_check.check_password(password):
+                return 'unverified'
+        form.is_valid()
+
+    @contextmanager
+    def _count_hashes(self):
+        hasher = type(get_hasher())
+        original = hasher.encode
+        counter = [0]
+
+        def encode(instance, *args, **kwargs):
+            counter[0] += 1
+            return original(instance, *args, **kwargs)
+
+        hasher.encode = encode
+        try:
+            yield counter
+        finally:
+            hasher.encode = original
+
+    def _measure(self, login, email, password, rounds):
+        """Mean CPU ms, password hashes and queries per login."""
+        queries = []
+        with self._count_hashes() as hashes, \
+                connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            started = time.process_time()
+            for _ in range(rounds):
+                login(email, password)
+            elapsed = time.process_time() - started
+        return elapsed / rounds * 1000, hashes[0] / rounds, len(queries) / rounds
@@ -0,0 +1,73 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils.text import slugify
+from lmsApp.models import Course, CustomUser, Lesson, Module
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates thousands of lessons with the same title in a throwaway course and compares the slug '
+        'allocator (one prefix query per save) with the previous `while exists()` loop (one query per '
+        'collision). Everything runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lessons', type=int, default=3000, help='Same-titled lessons created with the allocator (default: 3000).')
+        parser.add_argument('--legacy-lessons', type=int, default=500, help='Same-titled lessons created with the old loop, which is quadratic (default: 500).')
+        parser.add_argument('--title', default='Introduction')
+
+    def handle(self, *args, **options):
+        self._run('allocator', options['lessons'], options['title'], self._create_with_allocator)
+        self._run('while-exists loop', options['legacy_lessons'], options['title'], self._create_with_loop)
+
+    def _create_with_allocator(self, module, title, order):
+        Lesson.objects.create(module=module, title=title, video_url='https://youtu.be/bench', order=order)
+
+    def _create_with_loop(self, module, title, order):
+        # The implementation Lesson.save() used before lmsApp.slugs.
+        base_slug = slugify(title)
+        slug = base_slug
+        counter = 1
+        while Lesson.objects.filter(module__course=module.course, slug=slug).exists():
+            slug = f'{base_slug}-{counter}'
+            counter += 1
+        Lesson.objects.create(module=module, title=title, slug=slug, video_url='https://youtu.be/bench', order=order)
+
+    def _run(self, label, count, title, create):
+        if count <= 0:
+            return
+        window = min(100, count)
+        try:
+            with transaction.atomic():
+                instructor = CustomUser.objects.create(email=f'slug-bench-{time.time_ns()}@erudio.test', is_instructor=True)
+                course = Course.objects.create(title='Slug benchmark', short_description='-', long_description='-', instructor=instructor)
+                module = Module.objects.create(course=course, title='Benchmark')
+
+                started = time.perf_counter()
+                for order in range(count - window):
+                    create(module, title, order)
+                # Measure the last saves, where the previous loop is at its worst.
+                queries = []
+                with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                    tail_started = time.perf_counter()
+                    for order in range(count - window, count):
+                        create(module, title, order)
+                    tail_elapsed = time.perf_counter() - tail_started
+                elapsed = time.perf_counter() - started
+
+                slugs = list(Lesson.objects.filter(module=module).values_list('slug', flat=True))
+                unique = len(set(slugs)) == len(slugs) == count
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'[{label}] {count} lessons titled {title!r} in {elapsed:.2f}s; last {window} saves: '
+            f'{len(queries) / window:.1f} queries and {tail_elapsed / window * 1000:.2f} ms per save; '
+            f'slugs unique: {unique}'
+        ))
@@ -0,0 +1,127 @@
+import statistics
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.base import Template
+from django.test import Client, override_settings
+from django.urls import reverse
+from lmsApp.models import Course, Enrollment, Lesson, Team
+from lmsApp.template_cache import iter_template_names, source_loader_settings
+
+
+@contextmanager
+def template_render_timer():
+    """
+    Records the inclusive render time of every template rendered inside the
+    block, keyed by template name. Covers top-level renders as well as
+    {% extends %} parents and {% include %}d partials.
+    """
+    timings = defaultdict(list)
+    original_render = Template._render
+
+    def timed_render(self, context):
+        started = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            timings[self.origin.template_name or '<string>'].append(time.perf_counter() - started)
+
+    Template._render = timed_render
+    try:
+        yield timings
+    finally:
+        Template._render = original_render
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks templates: cold compile time per template (what warming the cached loader saves), '
+        'and render time per template for representative pages (catalog, course detail, course '
+        'player, my courses, team and instructor dashboards) built from the data in the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per page (default: 20).')
+        parser.add_argument('--top', type=int, default=15, help='Slowest templates to list per table (default: 15).')
+
+    def handle(self, *args, **options):
+        self._benchmark_compile(options['top'])
+        self._benchmark_render(options['repeat'], options['top'])
+
+    def _benchmark_compile(self, top):
+        engine = engines['django'].engine
+        names = [name for name in iter_template_names(engine) if not name.startswith(('admin/', 'registration/'))]
+        # A fresh engine has nothing cached, like a worker that did not warm its templates.
+        cold = type(engine)(
+            dirs=engine.dirs, loaders=source_loader_settings(engine), libraries=engine.libraries,
+            builtins=engine.builtins,
+        )
+        results = []
+        for name in names:
+            try:
+                started = time.perf_counter()
+                cold.get_template(name)
+                results.append((name, time.perf_counter() - started))
+            except Exception as e:
+                self.stderr.write(f'{name}: {type(e).__name__}: {e}')
+
+        total = sum(seconds for _, seconds in results)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Cold compile time: {len(results)} templates, {total * 1000:.1f} ms per worker without warm-up'
+        ))
+        for name, seconds in sorted(results, key=lambda item: -item[1])[:top]:
+            self.stdout.write(f'    {name:<48} {seconds * 1000:8.2f} ms')
+
+    def _pages(self):
+        """(label, user or None, url) for each page the data allows."""
+        pages = [('home', None, reverse('home')), ('catalog', None, reverse('course_list'))]
+        course = Course.objects.filter(is_published=True).order_by('-created_at').first()
+        if course:
+            pages.append(('course detail', None, course.get_absolute_url()))
+
+        enrollment = Enrollment.objects.filter(course__is_published=True).select_related('student', 'course').first()
+        if enrollment:
+            pages.append(('my courses', enrollment.student, reverse('my_courses')))
+            lesson = Lesson.objects.filter(module__course=enrollment.course).order_by('module__order', 'order').first()
+            if lesson:
+                pages.append(('course player', enrollment.student, lesson.get_absolute_url()))
+
+        team = Team.objects.select_related('owner').first()
+        if team:
+            pages.append(('team dashboard', team.owner, reverse('team_dashboard')))
+
+        instructor_course = Course.objects.select_related('instructor').first()
+        if instructor_course and instructor_course.instructor.is_instructor:
+            pages.append(('instructor dashboard', instructor_course.instructor, reverse('instructor_dashboard')))
+            pages.append(('instructor analytics', instructor_course.instructor, reverse('instructor_analytics')))
+        return pages
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0.0, QUERY_INSPECTOR_SAMPLE_RATE=0.0)
+    def _benchmark_render(self, repeat, top):
+        for label, user, url in self._pages():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            # The first request compiles templates and fills per-process caches.
+            client.get(url)
+            with template_render_timer() as timings:
+                statuses = {client.get(url).status_code for _ in range(repeat)}
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}: {url} (status {", ".join(map(str, sorted(statuses)))})'))
+            self._report(timings, repeat, top)
+
+    def _report(self, timings, repeat, top):
+        rows = []
+        for name, samples in timings.items():
+            samples = sorted(samples)
+            rows.append((
+                name,
+                len(samples) / repeat,
+                statistics.mean(samples) * 1000,
+                samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+                sum(samples) / repeat * 1000,
+            ))
+        self.stdout.write(f"    {'template':<48} {'renders':>8} {'mean ms':>9} {'p95 ms':>9} {'ms/page':>9}")
+        for name, per_page, mean, p95, per_request in sorted(rows, key=lambda row: -row[4])[:top]:
+            self.stdout.write(f'    {name:<48} {per_page:8.1f} {mean:9.2f} {p95:9.2f} {per_request:9.2f}')
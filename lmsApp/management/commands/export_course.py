@@ -0,0 +1,31 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from lmsApp.bundles import write_bundle
+from lmsApp.models import Course
+
+
+class Command(BaseCommand):
+    help = (
+        'Exports a course with its categories, outcomes, modules and lessons as a course bundle '
+        '(JSON Lines, or a ZIP archive with --zip) that import_course can load into any environment.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slug of the course to export.')
+        parser.add_argument('--output', '-o', help='File to write (default: standard output).')
+        parser.add_argument('--zip', action='store_true', help='Write a ZIP archive instead of plain JSON Lines.')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(slug=options['slug'])
+        except Course.DoesNotExist:
+            raise CommandError(f"No course with slug '{options['slug']}'.")
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                write_bundle(course, output, compress=options['zip'])
+            self.stderr.write(self.style.SUCCESS(f"Exported '{course.title}' to {options['output']}."))
+        else:
+            if options['zip']:
+                raise CommandError('--zip needs --output; ZIP archives are not written to standard output.')
+            write_bundle(course, sys.stdout.buffer)
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from lmsApp.bundles import BundleError, import_bundle
+from lmsApp.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports a course bundle written by export_course (JSON Lines or ZIP) as a new, unpublished '
+        'course owned by the given instructor. Slugs and IDs are assigned afresh, so the same bundle '
+        'can be imported more than once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Bundle file to import.')
+        parser.add_argument('--instructor', required=True, help='Email of the instructor who will own the course.')
+
+    def handle(self, *args, **options):
+        try:
+            instructor = CustomUser.objects.get(email=options['instructor'], is_instructor=True)
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No instructor with email '{options['instructor']}'.")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as bundle:
+                course, modules, lessons = import_bundle(bundle, instructor)
+        except OSError as e:
+            raise CommandError(str(e))
+        except BundleError as e:
+            raise CommandError(f'Import failed, nothing was saved: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported '{course.title}' as /{course.slug}/ with {modules} modules and {lessons} lessons "
+            f"in {time.perf_counter() - started:.2f}s. The course is unpublished."
+        ))
@@ -0,0 +1,109 @@
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs a local stand-in for the Paystack API. Set PAYSTACK_BASE_URL=http://127.0.0.1:<port> '
+        'to exercise the payment flow, retries and circuit breaker without touching api.paystack.co.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--verify-status', default='success', help="Status reported by /transaction/verify (e.g. 'success', 'failed', 'abandoned').")
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of API calls answered with a 503.')
+        parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before answering each API call.')
+
+    def handle(self, *args, **options):
+        port = options['port']
+        verify_status = options['verify_status']
+        fail_rate = options['fail_rate']
+        delay = options['delay']
+        transactions = {}
+        stdout = self.stdout
+
+        class PaystackStubHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _simulate_gateway(self):
+                if delay:
+                    time.sleep(delay)
+                if fail_rate and random.random() < fail_rate:
+                    self._send_json(503, {'status': False, 'message': 'Stub gateway failure'})
+                    return False
+                return True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if self.path != '/transaction/initialize':
+                    return self._send_json(404, {'status': False, 'message': 'Not found'})
+                if not self._simulate_gateway():
+                    return
+                reference = payload['reference']
+                if reference in transactions:
+                    return self._send_json(400, {'status': False, 'message': 'Duplicate Transaction Reference'})
+                transactions[reference] = payload
+                self._send_json(200, {
+                    'status': True,
+                    'message': 'Authorization URL created',
+                    'data': {
+                        'authorization_url': f'http://127.0.0.1:{port}/checkout/{reference}',
+                        'access_code': reference.lower(),
+                        'reference': reference,
+                    },
+                })
+
+            def do_GET(self):
+                if self.path.startswith('/checkout/'):
+                    # Simulates the hosted checkout page by sending the browser straight back.
+                    reference = self.path.rsplit('/', 1)[-1]
+                    transaction = transactions.get(reference, {})
+                    callback_url = transaction.get('callback_url', '/')
+                    separator = '&' if '?' in callback_url else '?'
+                    self.send_response(302)
+                    self.send_header('Location', f"{callback_url}{separator}{urlencode({'reference': reference})}")
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if not self.path.startswith('/transaction/verify/'):
+                    return self._send_json(404, {'status': False, 'message': 'Not found'})
+                if not self._simulate_gateway():
+                    return
+                reference = self.path.rsplit('/', 1)[-1]
+                data = {'status': verify_status, 'reference': reference}
+                transaction = transactions.get(reference)
+                if transaction:
+                    # References created outside this stub's lifetime are reported without an amount.
+                    data['amount'] = int(transaction['amount'])
+                    data['currency'] = transaction.get('currency', 'NGN')
+                    data['customer'] = {'email': transaction['email']}
+                self._send_json(200, {'status': True, 'message': 'Verification successful', 'data': data})
+
+            def log_message(self, format, *args):
+                stdout.write(f'[paystack-stub] {format % args}')
+
+        class PaystackStubServer(ThreadingHTTPServer):
+            # Large enough for the concurrent checkouts of benchmark_checkout.
+            request_queue_size = 1024
+
+        server = PaystackStubServer(('127.0.0.1', port), PaystackStubHandler)
+        self.stdout.write(self.style.SUCCESS(f'Paystack stub listening on http://127.0.0.1:{port} (Ctrl+C to stop)'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
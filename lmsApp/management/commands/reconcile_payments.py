@@ -0,0 +1,147 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from lmsApp.models import Enrollment, Transaction
+from lmsApp.payments import FAILED_CHARGE_STATUSES, apply_charge_result
+from lmsApp.utils import PaystackAPI, send_enrollment_confirmation_email
+
+# Pending transactions older than this are closed out as failed instead of
+# being verified again on every run. A late webhook can still settle them.
+RECONCILE_MAX_AGE = timedelta(days=3)
+
+
+class Command(BaseCommand):
+    help = (
+        'Verifies stale pending transactions with Paystack and settles them in batches. '
+        'Safe to run from cron every few minutes: only rows still pending are updated, '
+        'so overlapping runs, webhooks and browser callbacks never apply a payment twice.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=15, help='Only pending transactions older than this many minutes (default: 15).')
+        parser.add_argument('--max-age', type=int, default=int(RECONCILE_MAX_AGE.total_seconds() // 3600), help='Close out pending transactions older than this many hours as failed instead of verifying them (default: 72).')
+        parser.add_argument('--limit', type=int, default=1000, help='Maximum transactions to check in one run (default: 1000).')
+        parser.add_argument('--workers', type=int, default=settings.PAYSTACK_POOL_SIZE, help='Concurrent verify calls (default: PAYSTACK_POOL_SIZE).')
+        parser.add_argument('--batch-size', type=int, default=100, help='Transactions settled per database transaction (default: 100).')
+        parser.add_argument('--dry-run', action='store_true', help='Verify and report without changing anything.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        now = timezone.now()
+        cutoff = now - timedelta(minutes=options['older_than'])
+        expiry = now - timedelta(hours=options['max_age'])
+        expired = Transaction.objects.filter(status='pending', created_at__lt=expiry)
+        expired_count = expired.count() if options['dry_run'] else expired.update(status='failed')
+        if expired_count:
+            self.stdout.write(self.style.WARNING(
+                f"Closed out {expired_count} pending transactions older than {options['max_age']} hours as failed."
+                + (' (dry run, nothing saved)' if options['dry_run'] else '')
+            ))
+
+        pending = list(
+            Transaction.objects.filter(status='pending', created_at__lt=cutoff, created_at__gte=expiry)
+            .order_by('created_at')[:options['limit']]
+        )
+        if not pending:
+            self.stdout.write(self.style.NOTICE('No stale pending transactions found.'))
+            return
+
+        self.stdout.write(f"Verifying {len(pending)} pending transactions with {options['workers']} workers...")
+        self.summary = {
+            'checked': len(pending), 'succeeded': 0, 'failed': 0, 'still_pending': 0,
+            'unreachable': 0, 'amount_mismatch': 0, 'enrollments_created': 0,
+        }
+
+        paystack = PaystackAPI()
+        batch_size = options['batch_size']
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                responses = executor.map(lambda t: paystack.verify_transaction(t.reference), batch)
+                self._settle_batch(list(zip(batch, responses)), options['dry_run'])
+
+        elapsed = time.monotonic() - started
+        s = self.summary
+        self.stdout.write(self.style.SUCCESS(
+            f"\nChecked {s['checked']} transactions in {elapsed:.1f}s: "
+            f"{s['succeeded']} succeeded, {s['failed']} failed, {s['still_pending']} still pending, "
+            f"{s['unreachable']} unreachable, {s['amount_mismatch']} amount mismatches. "
+            f"{s['enrollments_created']} enrollments created."
+            + (' (dry run, nothing saved)' if options['dry_run'] else '')
+        ))
+
+    def _settle_batch(self, results, dry_run):
+        succeeded, failed = [], []
+        for transaction, api_response in results:
+            if api_response is None:
+                self.summary['unreachable'] += 1
+                continue
+            # No data: Paystack definitively rejected the reference.
+            charge = api_response.get('data') or {'status': 'failed'}
+            status = charge.get('status')
+            if status == 'success':
+                if charge.get('amount') is not None and int(charge['amount']) != int(transaction.amount * 100):
+                    self.summary['amount_mismatch'] += 1
+                    self.stdout.write(self.style.WARNING(f"  - Amount mismatch on {transaction.reference}; left pending."))
+                    continue
+                succeeded.append((transaction, charge))
+            elif status in FAILED_CHARGE_STATUSES:
+                failed.append(transaction)
+            else:
+                self.summary['still_pending'] += 1
+
+        if dry_run:
+            self.summary['succeeded'] += len(succeeded)
+            self.summary['failed'] += len(failed)
+            return
+
+        # Subscription payments may need to activate a team; they are rare, so
+        # they go through the same per-reference path as the webhook.
+        course_payments = []
+        for transaction, charge in succeeded:
+            if transaction.plan_id:
+                if apply_charge_result(transaction.reference, charge).status == 'success':
+                    self.summary['succeeded'] += 1
+            else:
+                course_payments.append(transaction)
+
+        with db_transaction.atomic():
+            # Claim only rows nobody else has settled in the meantime.
+            claimed = list(
+                Transaction.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=[t.pk for t in course_payments], status='pending')
+                .values_list('pk', 'student_id', 'course_id')
+            )
+            Transaction.objects.filter(pk__in=[pk for pk, _, _ in claimed]).update(status='success')
+            self.summary['succeeded'] += len(claimed)
+
+            pairs = {(student_id, course_id) for _, student_id, course_id in claimed if course_id}
+            existing = set(
+                Enrollment.objects.filter(
+                    student_id__in={s for s, _ in pairs}, course_id__in={c for _, c in pairs}
+                ).values_list('student_id', 'course_id')
+            )
+            new_pairs = pairs - existing
+            Enrollment.objects.bulk_create(
+                [Enrollment(student_id=s, course_id=c) for s, c in new_pairs], ignore_conflicts=True
+            )
+
+            self.summary['failed'] += Transaction.objects.filter(
+                pk__in=[t.pk for t in failed], status='pending'
+            ).update(status='failed')
+
+        if new_pairs:
+            new_enrollments = [
+                enrollment for enrollment in Enrollment.objects.filter(
+                    student_id__in={s for s, _ in new_pairs}, course_id__in={c for _, c in new_pairs}
+                ).select_related('student', 'course')
+                if (enrollment.student_id, enrollment.course_id) in new_pairs
+            ]
+            self.summary['enrollments_created'] += len(new_enrollments)
+            for enrollment in new_enrollments:
+                send_enrollment_confirmation_email(enrollment)
+                self.stdout.write(f"  - Enrolled {enrollment.student.email} in {enrollment.course.title}")
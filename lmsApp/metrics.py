@@ -0,0 +1,160 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+
+# The metrics object for the request currently being handled (None when the
+# request was not sampled). A ContextVar keeps it isolated per thread and per
+# async task.
+current_metrics = ContextVar('erudio_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Collects timings for a single sampled request.
+    All durations are stored in seconds.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall_time = 0.0
+        self.db_time = 0.0
+        self.query_count = 0
+        self.db_connect_time = 0.0
+        self.duplicate_query_count = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.outbound_time = {}
+        self._seen_queries = set()
+
+    def record_query(self, key, duration):
+        self.query_count += 1
+        self.db_time += duration
+        if key in self._seen_queries:
+            self.duplicate_query_count += 1
+        else:
+            self._seen_queries.add(key)
+
+    def record_db_connect(self, duration):
+        self.db_connect_time += duration
+
+    def record_outbound(self, service, duration):
+        self.outbound_time[service] = self.outbound_time.get(service, 0.0) + duration
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Formats the collected timings as a Server-Timing header value."""
+        parts = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries, {self.duplicate_query_count} duplicate"',
+            f'db-connect;dur={self.db_connect_time * 1000:.1f}',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ]
+        for service, duration in self.outbound_time.items():
+            parts.append(f'{service};dur={duration * 1000:.1f}')
+        parts.append(f'total;dur={self.wall_time * 1000:.1f}')
+        return ', '.join(parts)
+
+    def as_dict(self):
+        return {
+            'wall_ms': round(self.wall_time * 1000, 1),
+            'db_ms': round(self.db_time * 1000, 1),
+            'queries': self.query_count,
+            'duplicate_queries': self.duplicate_query_count,
+            'db_connect_ms': round(self.db_connect_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'outbound_ms': {k: round(v * 1000, 1) for k, v in self.outbound_time.items()},
+        }
+
+
+@contextmanager
+def timed_outbound(service):
+    """
+    Context manager that charges the wrapped block to an outbound service
+    (e.g. 'paystack' or 'mail') on the current request's metrics, if any.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.record_outbound(service, time.perf_counter() - start)
+
+
+# --- ROLLING HISTOGRAMS ---
+
+# Upper bounds (in ms) of the histogram buckets shown on the stats endpoint.
+HISTOGRAM_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RollingHistogram:
+    """
+    Keeps the wall times of the last `size` requests for one URL name and
+    summarises them into buckets and percentiles on demand.
+    """
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.total_count = 0
+        self.lock = threading.Lock()
+
+    def add(self, metrics):
+        with self.lock:
+            self.samples.append((metrics.wall_time * 1000, metrics.db_time * 1000, metrics.query_count))
+            self.total_count += 1
+
+    def snapshot(self):
+        with self.lock:
+            samples = list(self.samples)
+            total_count = self.total_count
+        if not samples:
+            return {'count': total_count, 'window': 0}
+
+        wall = sorted(s[0] for s in samples)
+        buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for value in wall:
+            buckets[bisect_left(HISTOGRAM_BUCKETS_MS, value)] += 1
+
+        def percentile(p):
+            return round(wall[min(len(wall) - 1, int(len(wall) * p))], 1)
+
+        labels = [f'<={b}ms' for b in HISTOGRAM_BUCKETS_MS] + [f'>{HISTOGRAM_BUCKETS_MS[-1]}ms']
+        return {
+            'count': total_count,
+            'window': len(wall),
+            'p50_ms': percentile(0.50),
+            'p90_ms': percentile(0.90),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(wall[-1], 1),
+            'avg_db_ms': round(sum(s[1] for s in samples) / len(samples), 1),
+            'avg_queries': round(sum(s[2] for s in samples) / len(samples), 1),
+            'buckets': dict(zip(labels, buckets)),
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def record_request(url_name, metrics):
+    """Adds a finished request's metrics to the histogram for its URL name."""
+    histogram = _histograms.get(url_name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(
+                url_name, RollingHistogram(getattr(settings, 'PERFORMANCE_HISTOGRAM_SIZE', 500))
+            )
+    histogram.add(metrics)
+
+
+def histogram_snapshot():
+    """Returns a summary of every URL name seen by this process."""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {url_name: histogram.snapshot() for url_name, histogram in sorted(items)}
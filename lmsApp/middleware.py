@@ -0,0 +1,340 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+import brotli
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.template.backends.django import Template as DjangoBackendTemplate
+from .db_pool import install_checkout_timer
+from .db_router import PRIMARY_PIN_COOKIE, RoutingState, current_routing, replica_available
+from .metrics import RequestMetrics, current_metrics, record_request
+from .query_inspector import QueryInspector
+
+logger = logging.getLogger('lmsApp.performance')
+
+
+# --- TEMPLATE TIMING HOOK ---
+
+_original_template_render = DjangoBackendTemplate.render
+
+
+def _timed_template_render(self, context=None, request=None):
+    """
+    Wraps the Django template backend so top-level renders are charged to
+    the current request. Nested render_to_string() calls are not counted twice.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return _original_template_render(self, context, request)
+    metrics.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_template_render(self, context, request)
+    finally:
+        metrics.template_depth -= 1
+        if metrics.template_depth == 0:
+            metrics.template_time += time.perf_counter() - start
+
+
+_timed_template_render.is_erudio_timer = True
+
+
+def install_template_timer():
+    if not getattr(DjangoBackendTemplate.render, 'is_erudio_timer', False):
+        DjangoBackendTemplate.render = _timed_template_render
+
+
+# --- PERFORMANCE MIDDLEWARE ---
+
+class PerformanceMiddleware:
+    """
+    Records wall time, DB time, connection checkout time, query counts,
+    template render time and outbound HTTP time for a sample of requests. Sampled requests get a
+    Server-Timing header, a structured log line and a slot in the in-process
+    rolling histogram for their URL name.
+
+    Unsampled requests only pay for one random() call. Works under both
+    WSGI and ASGI so async views are not forced onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERFORMANCE_SAMPLE_RATE', 0.0)
+        install_template_timer()
+        install_checkout_timer()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        stack = self._install_query_timer(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            stack.close()
+            current_metrics.reset(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        # The ORM runs on the request's thread-sensitive executor, so the
+        # execute wrappers have to be installed on that thread's connections.
+        stack = await sync_to_async(self._install_query_timer)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_metrics.reset(token)
+        return self._finish(request, response, metrics)
+
+    def _install_query_timer(self, metrics):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self._query_timer(metrics)))
+        return stack
+
+    def _finish(self, request, response, metrics):
+        metrics.finish()
+        url_name = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        record_request(url_name, metrics)
+        response['Server-Timing'] = metrics.server_timing()
+        logger.info(json.dumps({
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'url_name': url_name,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }))
+        return response
+
+    @staticmethod
+    def _query_timer(metrics):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                key = (sql, repr(params))
+                metrics.record_query(key, time.perf_counter() - start)
+        return wrapper
+
+
+# --- QUERY INSPECTOR MIDDLEWARE ---
+
+class QueryInspectorMiddleware:
+    """
+    Runs a sample of requests under a QueryInspector so repeated (N+1) query
+    fingerprints are reported with their Python and template call sites.
+    Enabled for every request in development; set QUERY_INSPECTOR_SAMPLE_RATE
+    to a small fraction to sample production traffic.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'QUERY_INSPECTOR_SAMPLE_RATE', 0.0)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        with QueryInspector(label=f'{request.method} {request.path}'):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        inspector = QueryInspector(label=f'{request.method} {request.path}')
+        await sync_to_async(inspector.__enter__)()
+        try:
+            response = await self.get_response(request)
+        except BaseException as e:
+            await sync_to_async(inspector.__exit__)(type(e), e, e.__traceback__)
+            raise
+        await sync_to_async(inspector.__exit__)(None, None, None)
+        return response
+
+
+# --- READ REPLICA PINNING MIDDLEWARE ---
+
+class ReplicaPinningMiddleware:
+    """
+    Sets up per-request database routing for PrimaryReplicaRouter.
+
+    A request that writes to the primary sets a short-lived signed cookie;
+    while it is present the user's reads stay on the primary, so they see
+    their own writes despite replication lag. Does nothing unless a
+    'replica' database is configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = replica_available()
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _start(self, request):
+        pinned = request.get_signed_cookie(PRIMARY_PIN_COOKIE, default=None, max_age=self.pin_seconds) is not None
+        return RoutingState(pinned=pinned)
+
+    def _finish(self, response, state):
+        if state.wrote:
+            response.set_signed_cookie(
+                PRIMARY_PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        state = self._start(request)
+        token = current_routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        # sync_to_async copies the context, so ORM calls made on the
+        # executor thread see (and update) the same RoutingState.
+        state = self._start(request)
+        token = current_routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        return self._finish(response, state)
+
+
+# --- RESPONSE COMPRESSION MIDDLEWARE ---
+
+# Only text formats are worth compressing; images, PDFs and archives are not.
+COMPRESSIBLE_CONTENT_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+# Brotli's default quality (11) is meant for static assets; 5 compresses
+# dynamic pages better than gzip at a similar CPU cost.
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(header):
+    """Parses an Accept-Encoding header into {coding: q-value}."""
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        encodings[coding] = weight
+    return encodings
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses text responses of at least COMPRESSION_MIN_SIZE bytes with
+    Brotli when the client accepts it at least as readily as gzip, and with
+    Django's gzip (including its BREACH length randomisation) otherwise.
+    Responses that already carry a Content-Encoding, such as WhiteNoise's
+    precompressed static files, are left alone.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 500)
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return response
+
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encodings.get('br', 0) <= 0 or encodings['br'] < encodings.get('gzip', 0):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = self._brotli_stream(response)
+            del response.headers['Content-Length']
+        else:
+            compressed_content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # A compressed representation can only carry a weak ETag (RFC 9110 8.8.1).
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+    @staticmethod
+    def _brotli_stream(response):
+        # Pull to lexical scope in case streaming_content is replaced later.
+        original_iterator = response.streaming_content
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        # Each chunk is flushed so streamed responses reach the client as
+        # they are produced rather than when the stream ends.
+
+        if response.is_async:
+            async def brotli_wrapper():
+                async for chunk in original_iterator:
+                    data = compressor.process(chunk) + compressor.flush()
+                    if data:
+                        yield data
+                yield compressor.finish()
+            return brotli_wrapper()
+
+        def brotli_wrapper():
+            for chunk in original_iterator:
+                data = compressor.process(chunk) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        return brotli_wrapper()
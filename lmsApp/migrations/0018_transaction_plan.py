@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0017_customuser_is_invited'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='plan',
+            field=models.ForeignKey(blank=True, help_text='Set for Erudio for Business subscription payments instead of a course.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='lmsApp.subscriptionplan'),
+        ),
+    ]
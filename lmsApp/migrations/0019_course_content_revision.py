@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0018_transaction_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='content_revision',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Incremented whenever the course's modules or lessons change."),
+        ),
+    ]
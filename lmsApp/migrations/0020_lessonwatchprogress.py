@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0019_course_content_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonWatchProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seconds_watched', models.PositiveIntegerField(default=0)),
+                ('last_position', models.PositiveIntegerField(default=0, help_text='Playback position, in seconds, of the latest heartbeat.')),
+                ('updated_at', models.DateTimeField()),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_progress', to='lmsApp.enrollment')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watch_progress', to='lmsApp.lesson')),
+            ],
+            options={
+                'verbose_name_plural': 'lesson watch progress',
+                'unique_together': {('enrollment', 'lesson')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:15
+
+from django.db import migrations, models
+from lmsApp.video import backfill_video_refs
+
+
+def parse_video_urls(apps, schema_editor):
+    backfill_video_refs(apps.get_model('lmsApp', 'Lesson'), using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0020_lessonwatchprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='video_id',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='video_provider',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(parse_video_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:32
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_owned_team_payments_applied(apps, schema_editor):
+    # Subscription payments of users who already own a team were used by it.
+    Transaction = apps.get_model('lmsApp', 'Transaction')
+    Team = apps.get_model('lmsApp', 'Team')
+    Transaction.objects.using(schema_editor.connection.alias).filter(
+        plan__isnull=False,
+        status='success',
+        student_id__in=Team.objects.values('owner_id'),
+    ).update(subscription_applied_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0021_lesson_video_provider'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='subscription_applied_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When this subscription payment activated or renewed a team. A payment is only applied once.', null=True),
+        ),
+        migrations.RunPython(mark_owned_team_payments_applied, migrations.RunPython.noop),
+    ]
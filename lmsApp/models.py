@@ -1,10 +1,15 @@
 import uuid
+from functools import partial
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.conf import settings
 from django.utils.text import slugify
 from django.urls import reverse
+from .slugs import base_slug_for, save_with_unique_slug
+from .video import embed_url, parse_video_url
 
 # === USER MANAGEMENT MODELS ===
 
@@ -123,6 +128,11 @@ class Course(models.Model):
     is_published = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    content_revision = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Incremented whenever the course's modules or lessons change."
+    )
     what_you_will_learn = models.TextField(
         blank=True, 
         null=True, 
@@ -130,19 +140,25 @@ class Course(models.Model):
     )
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            while Course.objects.filter(slug=slug).exists():
-                slug = f'{base_slug}-{counter}'
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        base_slug = base_slug_for(self.title, self._meta.get_field('slug').max_length, 'course')
+        save_with_unique_slug(self, Course.objects.all(), base_slug, partial(super().save, *args, **kwargs))
 
     def get_absolute_url(self):
         return reverse('course_detail', kwargs={'slug': self.slug})
 
+    @staticmethod
+    def bump_content_revision(course_id):
+        """
+        Marks a course's pages as changed after its modules or lessons were
+        edited, so cached copies (ETag / Last-Modified) are revalidated.
+        """
+        Course.objects.filter(pk=course_id).update(
+            content_revision=models.F('content_revision') + 1,
+            updated_at=timezone.now(),
+        )
+
     def get_total_lesson_count(self):
         return sum(module.lessons.count() for module in self.modules.all())
     
@@ -169,6 +185,16 @@ class Module(models.Model):
     class Meta:
         ordering = ['order']
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Course.bump_content_revision(self.course_id)
+
+    def delete(self, *args, **kwargs):
+        course_id = self.course_id
+        result = super().delete(*args, **kwargs)
+        Course.bump_content_revision(course_id)
+        return result
+
     def __str__(self):
         return f"{self.course.title} - Module {self.order}: {self.title}"
 
@@ -181,6 +207,9 @@ class Lesson(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, blank=True)
     video_url = models.URLField(max_length=500)
+    # Parsed from video_url on save (see lmsApp.video).
+    video_provider = models.CharField(max_length=20, blank=True, editable=False)
+    video_id = models.CharField(max_length=64, blank=True, editable=False)
     content = models.TextField(blank=True, null=True)
     order = models.PositiveIntegerField(default=0)
     is_published = models.BooleanField(default=True)
@@ -189,17 +218,45 @@ class Lesson(models.Model):
         unique_together = ('module', 'slug')
         ordering = ['order']
 
+    def clean(self):
+        super().clean()
+        if self.video_url and parse_video_url(self.video_url) is None:
+            raise ValidationError({'video_url': "Enter a YouTube or Vimeo video link."})
+
+    def set_video_ref(self):
+        """Stores the provider and ID parsed from video_url; bulk_create() callers must call this."""
+        ref = parse_video_url(self.video_url)
+        self.video_provider, self.video_id = ref if ref else ('', '')
+
+    def get_embed_url(self, start=0):
+        return embed_url(self.video_provider, self.video_id, start)
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            # Ensure slug is unique within the course
-            while Lesson.objects.filter(module__course=self.module.course, slug=slug).exists():
-                slug = f'{base_slug}-{counter}'
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        self.set_video_ref()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'video_url' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'video_provider', 'video_id'}
+        course_id = self.module.course_id
+        if self.slug:
+            super().save(*args, **kwargs)
+        else:
+            # Slugs are unique within the course, which no database constraint
+            # covers, so concurrent lesson creates are serialised on the course row.
+            base_slug = base_slug_for(self.title, self._meta.get_field('slug').max_length, 'lesson')
+            save_with_unique_slug(
+                self,
+                Lesson.objects.filter(module__course_id=course_id),
+                base_slug,
+                partial(super().save, *args, **kwargs),
+                lock=lambda: list(Course.objects.select_for_update().filter(pk=course_id).values_list('pk')),
+            )
+        Course.bump_content_revision(course_id)
+
+    def delete(self, *args, **kwargs):
+        course_id = self.module.course_id
+        result = super().delete(*args, **kwargs)
+        Course.bump_content_revision(course_id)
+        return result
 
     def get_absolute_url(self):
         return reverse('lesson_detail', kwargs={
@@ -212,6 +269,24 @@ class Lesson(models.Model):
 
 # === STUDENT & PAYMENT MODELS ===
 
+class EnrollmentQuerySet(models.QuerySet):
+    def with_progress(self):
+        """
+        Annotates completed_lesson_count and total_lesson_count, so
+        get_progress_percentage needs no queries of its own.
+        """
+        completed = Enrollment.completed_lessons.through.objects.filter(
+            enrollment_id=models.OuterRef('pk')
+        ).values('enrollment_id').annotate(count=models.Count('*')).values('count')
+        total = Lesson.objects.filter(
+            module__course_id=models.OuterRef('course_id')
+        ).values('module__course_id').annotate(count=models.Count('*')).values('count')
+        return self.annotate(
+            completed_lesson_count=Coalesce(models.Subquery(completed), 0),
+            total_lesson_count=Coalesce(models.Subquery(total), 0),
+        )
+
+
 class Enrollment(models.Model):
     """
     Model to track user enrollment in courses and their progress.
@@ -221,15 +296,24 @@ class Enrollment(models.Model):
     enrolled_at = models.DateTimeField(auto_now_add=True)
     completed_lessons = models.ManyToManyField('Lesson', blank=True)
 
+    objects = EnrollmentQuerySet.as_manager()
+
     class Meta:
         unique_together = ('student', 'course')
 
     @property
     def get_progress_percentage(self):
-        total_lessons = self.course.get_total_lesson_count()
+        if hasattr(self, 'total_lesson_count'):
+            # Annotated by Enrollment.objects.with_progress().
+            total_lessons = self.total_lesson_count
+            completed_count = self.completed_lesson_count
+        else:
+            total_lessons = self.course.get_total_lesson_count()
+            completed_count = None
         if total_lessons == 0:
             return 0
-        completed_count = self.completed_lessons.count()
+        if completed_count is None:
+            completed_count = self.completed_lessons.count()
         return int((completed_count / total_lessons) * 100)
     
     def get_next_lesson(self):
@@ -262,16 +346,48 @@ class Enrollment(models.Model):
         return f"{self.student.email} enrolled in {self.course.title}"
 
 
+class LessonWatchProgress(models.Model):
+    """
+    Aggregated video watch time per enrollment and lesson, written in batches
+    from the player's heartbeats (see lmsApp.watch_time).
+    """
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='watch_progress')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='watch_progress')
+    seconds_watched = models.PositiveIntegerField(default=0)
+    last_position = models.PositiveIntegerField(default=0, help_text="Playback position, in seconds, of the latest heartbeat.")
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('enrollment', 'lesson')
+        verbose_name_plural = 'lesson watch progress'
+
+    def __str__(self):
+        return f"{self.enrollment_id} / {self.lesson_id}: {self.seconds_watched}s"
+
+
 class Transaction(models.Model):
     """
     Model to store payment transaction details from Paystack.
     """
     student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True)
     course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True)
+    plan = models.ForeignKey(
+        'SubscriptionPlan',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="Set for Erudio for Business subscription payments instead of a course."
+    )
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     reference = models.CharField(max_length=100, unique=True)
     status = models.CharField(max_length=20, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    subscription_applied_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="When this subscription payment activated or renewed a team. A payment is only applied once."
+    )
 
     def __str__(self):
         return f"Transaction {self.reference} for {self.student.email}"
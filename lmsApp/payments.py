@@ -0,0 +1,169 @@
+import datetime
+import hashlib
+import hmac
+import logging
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from .models import Enrollment, Team, Transaction
+from .utils import (
+    AsyncPaystackAPI, defer_after_commit, send_enrollment_confirmation_email, send_subscription_confirmation_email
+)
+
+logger = logging.getLogger(__name__)
+
+# Paystack charge statuses that mean the customer was not (or is no longer) charged.
+FAILED_CHARGE_STATUSES = {'failed', 'abandoned', 'reversed'}
+# How long after payment a subscription can still be claimed by team setup
+# when the callback page's session no longer names the payment.
+SUBSCRIPTION_CLAIM_WINDOW = datetime.timedelta(days=7)
+
+
+def verify_webhook_signature(body, signature):
+    """
+    Checks the X-Paystack-Signature header: an HMAC-SHA512 of the raw
+    request body keyed with our Paystack secret key.
+    """
+    if not signature:
+        return False
+    expected = hmac.new(settings.PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def activate_team_subscription(team, plan):
+    """
+    Activates or renews a team's subscription for 30 days. Granting course
+    access to every member and the confirmation email run after commit.
+    """
+    team.plan = plan
+    team.is_active = True
+    team.subscription_ends = timezone.now() + datetime.timedelta(days=30)
+    team.save()
+    defer_after_commit(team.grant_all_members_course_access)
+    defer_after_commit(send_subscription_confirmation_email, team)
+    return team
+
+
+def pending_subscription_payment(user, transaction_id=None):
+    """
+    The successful subscription payment of `user` that has not activated a
+    team yet: the one with `transaction_id` if given (set in the session by
+    the payment callback), otherwise the latest one within
+    SUBSCRIPTION_CLAIM_WINDOW. Returns None if there is none.
+    """
+    payments = Transaction.objects.filter(
+        student=user, plan__isnull=False, status='success', subscription_applied_at__isnull=True
+    )
+    if transaction_id is not None:
+        payments = payments.filter(pk=transaction_id)
+    else:
+        payments = payments.filter(created_at__gte=timezone.now() - SUBSCRIPTION_CLAIM_WINDOW)
+    return payments.select_related('plan').order_by('-created_at').first()
+
+
+def _claim_subscription_payment(transaction):
+    """Marks a subscription payment as applied; False if it already was."""
+    return bool(
+        Transaction.objects.filter(pk=transaction.pk, subscription_applied_at__isnull=True)
+        .update(subscription_applied_at=timezone.now())
+    )
+
+
+def setup_team_from_payment(transaction, owner, **details):
+    """
+    Creates (or updates) `owner`'s team with `details` and activates it with
+    the plan of a successful subscription payment, marking the payment as
+    applied in the same database transaction. Returns the team, or None if
+    the payment had already been applied, so one payment activates one team.
+    """
+    with db_transaction.atomic():
+        if not _claim_subscription_payment(transaction):
+            return None
+        team, created = Team.objects.get_or_create(owner=owner, defaults={'name': details.get('name', '')})
+        for field, value in details.items():
+            setattr(team, field, value)
+        return activate_team_subscription(team, transaction.plan)
+
+
+def apply_charge_result(reference, charge):
+    """
+    Applies a Paystack charge (from a webhook event or a verify call) to the
+    local Transaction with the given reference and returns it, or None if
+    the reference is unknown.
+
+    Idempotent: the transaction row is locked, and a transaction that is
+    already successful is returned untouched, so duplicate webhook
+    deliveries, browser callbacks and reconciliation runs can race safely.
+    A successful course payment creates the enrollment; a subscription
+    payment renews the payer's team if they already have one (otherwise
+    team_setup_view creates it). Emails are sent after commit. A charge
+    whose amount or currency differs from what was initialized is logged
+    and left pending.
+    """
+    with db_transaction.atomic():
+        transaction = (
+            Transaction.objects.select_for_update()
+            .filter(reference=reference)
+            .first()
+        )
+        if transaction is None:
+            return None
+        if transaction.status == 'success':
+            return transaction
+
+        status = charge.get('status')
+        if status in FAILED_CHARGE_STATUSES:
+            transaction.status = 'failed'
+            transaction.save(update_fields=['status'])
+            return transaction
+        if status != 'success':
+            return transaction
+
+        expected_amount = int(transaction.amount * 100)
+        if charge.get('amount') is not None and int(charge['amount']) != expected_amount:
+            logger.error(
+                "Paystack charge %s amount %s does not match expected %s; leaving it pending.",
+                reference, charge['amount'], expected_amount,
+            )
+            return transaction
+        # The amount alone is not enough: 5000 USD cents is not 5000 kobo.
+        expected_currency = settings.PAYSTACK_CURRENCY
+        if charge.get('currency') is not None and str(charge['currency']).upper() != expected_currency:
+            logger.error(
+                "Paystack charge %s currency %s does not match expected %s; leaving it pending.",
+                reference, charge['currency'], expected_currency,
+            )
+            return transaction
+
+        transaction.status = 'success'
+        transaction.save(update_fields=['status'])
+
+        if transaction.course_id:
+            enrollment, created = Enrollment.objects.get_or_create(
+                student_id=transaction.student_id, course_id=transaction.course_id
+            )
+            if created:
+                defer_after_commit(send_enrollment_confirmation_email, enrollment)
+        elif transaction.plan_id:
+            team = Team.objects.filter(owner_id=transaction.student_id).first()
+            if team is not None and _claim_subscription_payment(transaction):
+                activate_team_subscription(team, transaction.plan)
+                transaction.refresh_from_db(fields=['subscription_applied_at'])
+    return transaction
+
+
+async def aconfirm_transaction(transaction):
+    """
+    Returns the up-to-date state of a transaction for the browser callbacks,
+    with its course and plan loaded. Normally the webhook has already settled
+    it, so only local state is read; while it is still pending the charge is
+    verified with Paystack once. Returns None if the gateway could not be reached.
+    """
+    if transaction.status == 'pending':
+        api_response = await AsyncPaystackAPI().verify_transaction(transaction.reference)
+        if api_response is None:
+            return None
+        charge = api_response.get('data') or {'status': 'failed'}
+        await sync_to_async(apply_charge_result)(transaction.reference, charge)
+    return await Transaction.objects.select_related('course', 'plan').aget(pk=transaction.pk)
@@ -0,0 +1,132 @@
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from .models import Enrollment, Lesson
+from .utils import defer_after_commit, send_completion_certificate_email
+
+# Events accepted in one sync request.
+MAX_SYNC_EVENTS = 500
+
+
+class ProgressSyncError(ValueError):
+    """Raised when a progress sync payload is malformed as a whole."""
+
+
+def parse_completion_events(payload):
+    """
+    Validates the shape of a sync payload:
+
+        {"events": [{"course": "python-101", "lesson": 42}, ...]}
+
+    Returns (events, rejected): events as dicts with an index, course slug
+    and lesson id; rejected as {index, reason} for events that are malformed
+    on their own. Completions are stored without a timestamp, so any
+    `completed_at` a client still sends is ignored rather than validated.
+    """
+    events = payload.get('events') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        raise ProgressSyncError("Expected an 'events' list.")
+    if len(events) > MAX_SYNC_EVENTS:
+        raise ProgressSyncError(f"At most {MAX_SYNC_EVENTS} events can be sent at once.")
+
+    parsed, rejected = [], []
+    for index, event in enumerate(events):
+        if not isinstance(event, dict) or not isinstance(event.get('course'), str) \
+                or not isinstance(event.get('lesson'), int) or isinstance(event.get('lesson'), bool):
+            rejected.append({'index': index, 'reason': "Each event needs a course slug and an integer lesson ID."})
+            continue
+        parsed.append({'index': index, 'course': event['course'], 'lesson': event['lesson']})
+    return parsed, rejected
+
+
+def complete_lesson(enrollment, lesson):
+    """
+    Marks one lesson of `enrollment` complete and returns True if that
+    completed the course. The enrollment row is locked as in
+    sync_lesson_completions(), so a concurrent sync and single completion
+    cannot both (or neither) see the course go from incomplete to complete;
+    the certificate is sent once, after commit, on that transition.
+    """
+    with transaction.atomic():
+        Enrollment.objects.select_for_update().only('id').get(pk=enrollment.pk)
+        completed = Enrollment.completed_lessons.through.objects.filter(enrollment_id=enrollment.pk)
+        if completed.filter(lesson_id=lesson.pk).exists():
+            return False
+        enrollment.completed_lessons.add(lesson)
+        total = Lesson.objects.filter(module__course_id=enrollment.course_id).count()
+        finished = completed.count() >= total
+        if finished:
+            defer_after_commit(send_completion_certificate_email, enrollment)
+    return finished
+
+
+def sync_lesson_completions(user, events):
+    """
+    Records a batch of lesson completions for `user` and returns a summary.
+
+    One query checks every event against the user's enrollments (locking
+    those enrollment rows, so concurrent syncs for the same course queue
+    up) and also returns each course's lesson count; one reads what is
+    already completed; one bulk insert adds the rest. Replaying a batch is
+    harmless: completed lessons are skipped, and the certificate is only
+    sent when an enrollment goes from incomplete to complete.
+    """
+    Completion = Enrollment.completed_lessons.through
+    lesson_count = (
+        Lesson.objects.filter(module__course_id=OuterRef('course_id'))
+        .values('module__course_id').annotate(count=Count('*')).values('count')
+    )
+    with transaction.atomic():
+        rows = (
+            Enrollment.objects.select_for_update(of=('self',))
+            .filter(student=user, course__modules__lessons__id__in={event['lesson'] for event in events})
+            .annotate(total_lessons=Subquery(lesson_count))
+            .values_list('id', 'course__slug', 'course__modules__lessons__id', 'total_lessons')
+        )
+        # (course slug, lesson id) -> enrollment id, for lessons in the user's courses.
+        allowed, totals = {}, {}
+        for enrollment_id, course_slug, lesson_id, total in rows:
+            allowed[course_slug, lesson_id] = enrollment_id
+            totals[enrollment_id] = (course_slug, total)
+
+        completed = {}
+        for enrollment_id, lesson_id in Completion.objects.filter(enrollment_id__in=totals).values_list('enrollment_id', 'lesson_id'):
+            completed.setdefault(enrollment_id, set()).add(lesson_id)
+        before = {enrollment_id: len(completed.get(enrollment_id, ())) for enrollment_id in totals}
+
+        accepted, already_completed, rejected, new_rows = [], [], [], []
+        for event in events:
+            enrollment_id = allowed.get((event['course'], event['lesson']))
+            if enrollment_id is None:
+                rejected.append({'index': event['index'], 'reason': "You are not enrolled in a course with this lesson."})
+            elif event['lesson'] in completed.setdefault(enrollment_id, set()):
+                already_completed.append(event['index'])
+            else:
+                completed[enrollment_id].add(event['lesson'])
+                new_rows.append(Completion(enrollment_id=enrollment_id, lesson_id=event['lesson']))
+                accepted.append(event['index'])
+        # ignore_conflicts covers a concurrent single-lesson completion.
+        Completion.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+        finished = [
+            enrollment_id for enrollment_id, (_, total) in totals.items()
+            if before[enrollment_id] < total <= len(completed.get(enrollment_id, ()))
+        ]
+        for enrollment in Enrollment.objects.filter(id__in=finished).select_related('student', 'course'):
+            defer_after_commit(send_completion_certificate_email, enrollment)
+
+    enrollments = []
+    for enrollment_id, (course_slug, total) in totals.items():
+        done = len(completed.get(enrollment_id, ()))
+        enrollments.append({
+            'course': course_slug,
+            'completed_lessons': done,
+            'total_lessons': total,
+            'progress': int(done / total * 100) if total else 0,
+            'course_completed': total > 0 and done >= total,
+        })
+    return {
+        'accepted': accepted,
+        'already_completed': already_completed,
+        'rejected': rejected,
+        'enrollments': enrollments,
+    }
@@ -0,0 +1,138 @@
+import logging
+import os
+import re
+import sys
+from collections import defaultdict
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node, Template
+
+logger = logging.getLogger('lmsApp.queries')
+
+# Files whose frames are never reported as the call site of a query.
+_INSPECTOR_FILES = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('query_inspector.py', 'middleware.py', 'metrics.py')
+}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+# Transaction control statements repeat legitimately and are never N+1 queries.
+_TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def fingerprint_sql(sql):
+    """
+    Normalizes a SQL statement so queries that differ only in their literal
+    values (ids, strings, LIMITs, IN-list lengths) share one fingerprint.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class DuplicateQueryError(Exception):
+    """Raised by QueryInspector in strict mode when a query fingerprint repeats."""
+
+
+def _is_app_frame(filename):
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and 'site-packages' not in filename
+        and filename not in _INSPECTOR_FILES
+    )
+
+
+def describe_call_site(max_frames=3):
+    """
+    Walks the current stack and describes where a query came from: up to
+    `max_frames` project functions (innermost first) and the innermost
+    template being rendered, e.g.
+    'Course.get_total_lesson_count <- Enrollment.get_progress_percentage [template my_courses.html]'.
+    """
+    app_frames = []
+    template_name = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if len(app_frames) < max_frames and _is_app_frame(code.co_filename):
+            relative = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            app_frames.append(f'{code.co_qualname} ({relative}:{frame.f_lineno})')
+        if template_name is None:
+            # Nodes remember the file they were parsed from, so the innermost
+            # node names the child template rather than the one it extends.
+            owner = frame.f_locals.get('self')
+            if isinstance(owner, (Node, Template)) and getattr(owner, 'origin', None):
+                template_name = owner.origin.template_name
+        frame = frame.f_back
+
+    site = ' <- '.join(app_frames) or 'unknown'
+    if template_name:
+        site = f'{site} [template {template_name}]'
+    return site
+
+
+class QueryInspector:
+    """
+    Context manager that hooks every database connection's execute_wrapper,
+    groups the executed SQL by fingerprint and records the call site of each
+    repeat. On exit, fingerprints seen at least `threshold` times are logged
+    as warnings, or raised as DuplicateQueryError when `strict` is set.
+
+        with QueryInspector(strict=True):
+            client.get('/dashboard/my-courses/')
+    """
+    def __init__(self, label='', threshold=None, strict=None):
+        self.label = label
+        self.threshold = threshold or getattr(settings, 'QUERY_INSPECTOR_THRESHOLD', 2)
+        self.strict = getattr(settings, 'QUERY_INSPECTOR_STRICT', False) if strict is None else strict
+        self.counts = defaultdict(int)
+        self.call_sites = defaultdict(lambda: defaultdict(int))
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self._wrapper))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stack.close()
+        if exc_type is None:
+            self.report()
+        return False
+
+    def _wrapper(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(_TRANSACTION_CONTROL):
+            return execute(sql, params, many, context)
+        fingerprint = fingerprint_sql(sql)
+        self.counts[fingerprint] += 1
+        # Only pay for a stack walk once the fingerprint is actually repeating.
+        if self.counts[fingerprint] > 1:
+            self.call_sites[fingerprint][describe_call_site()] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def repeated(self):
+        """Maps every fingerprint over the threshold to its execution count."""
+        return {fp: count for fp, count in self.counts.items() if count >= self.threshold}
+
+    def report(self):
+        repeated = self.repeated
+        if not repeated:
+            return
+        lines = []
+        for fingerprint, count in sorted(repeated.items(), key=lambda item: -item[1]):
+            sites = ', '.join(
+                f'{site} x{hits}' for site, hits in sorted(self.call_sites[fingerprint].items(), key=lambda item: -item[1])
+            )
+            lines.append(f'{count}x {fingerprint}\n    repeated from: {sites}')
+        message = f'Repeated queries in {self.label or "block"}:\n  ' + '\n  '.join(lines)
+        if self.strict:
+            raise DuplicateQueryError(message)
+        logger.warning(message)
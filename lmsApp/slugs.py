@@ -0,0 +1,92 @@
+import re
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Length
+from django.utils.text import slugify
+
+# Room kept at the end of a slug for "-<n>" suffixes.
+SUFFIX_RESERVE = 11
+# Attempts before giving up when concurrent saves keep taking the slug.
+MAX_ATTEMPTS = 5
+
+
+def base_slug_for(text, max_length, fallback):
+    """Slugifies `text`, trimmed so that any numeric suffix still fits."""
+    slug = slugify(text)[:max_length - SUFFIX_RESERVE].strip('-')
+    return slug or fallback
+
+
+def next_free_slug(queryset, base_slug, field='slug'):
+    """
+    Returns `base_slug`, or `base_slug-<n>` with n one above the highest
+    suffix already used in `queryset`, with a single query.
+
+    Among `base`, `base-1` ... `base-n` the longest slug, and then the
+    greatest one of that length, carries the highest suffix, so the
+    database only has to return one row. The prefix filter can use the
+    slug index; the regex excludes unrelated slugs that share the prefix,
+    such as `introduction-to-python` for `introduction`, and zero-padded
+    suffixes such as `introduction-007`, which would break the ordering
+    and which this function never generates.
+    """
+    pattern = rf'^{re.escape(base_slug)}(-[1-9][0-9]*)?$'
+    last = (
+        queryset.filter(**{f'{field}__startswith': base_slug, f'{field}__regex': pattern})
+        .annotate(_slug_length=Length(field))
+        .order_by('-_slug_length', f'-{field}')
+        .values_list(field, flat=True)
+        .first()
+    )
+    if last is None:
+        return base_slug
+    if last == base_slug:
+        return f'{base_slug}-1'
+    return f'{base_slug}-{int(last.rsplit("-", 1)[1]) + 1}'
+
+
+def save_with_unique_slug(instance, queryset, base_slug, save, lock=None):
+    """
+    Allocates a free slug for `instance` and saves it with `save()`.
+
+    A concurrent save can take the same slug between the lookup and the
+    insert. If the insert then fails and the slug turns out to be taken,
+    the lookup and the save are retried; the savepoint keeps any
+    surrounding transaction usable. `lock`, if given, is called inside the
+    savepoint before the lookup, for scopes the database cannot enforce
+    with a unique constraint.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                if lock is not None:
+                    lock()
+                instance.slug = next_free_slug(queryset, base_slug)
+                save()
+            return
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1 or not queryset.filter(slug=instance.slug).exists():
+                raise
+
+
+class SlugSet:
+    """
+    Hands out unique slugs for rows created together in a new scope (an
+    imported or cloned course), where nothing in the database can collide
+    yet, so no queries are needed.
+    """
+
+    def __init__(self, max_length, fallback):
+        self.max_length = max_length
+        self.fallback = fallback
+        self.used = set()
+
+    def allocate(self, slug, text):
+        """Keeps `slug` if it is valid and unused, otherwise derives one from `text`."""
+        slug = slugify(slug or '')[:self.max_length]
+        if not slug or slug in self.used:
+            base = base_slug_for(text, self.max_length, self.fallback)
+            slug, counter = base, 1
+            while slug in self.used:
+                slug = f'{base}-{counter}'
+                counter += 1
+        self.used.add(slug)
+        return slug
@@ -0,0 +1,82 @@
+import gzip
+import brotli
+from django.contrib.staticfiles.storage import ManifestFilesMixin
+from django.core.files.base import ContentFile
+from storages.backends.azure_storage import AzureStorage
+
+# Long-lived, never-revalidated caching is only safe for content-hashed names.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Everything else, such as the unhashed originals and staticfiles.json,
+# changes under the same name on the next deploy.
+SHORT_CACHE_CONTROL = 'public, max-age=300'
+
+# Formats that are already compressed gain nothing from another pass.
+SKIP_COMPRESS_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.ico', '.zip', '.gz', '.tgz', '.bz2', '.br',
+    '.woff', '.woff2', '.mp3', '.mp4', '.webm', '.pdf',
+)
+
+
+def compressed_variants(data):
+    """
+    Yields (suffix, compressed bytes) for the gzip and Brotli encodings of
+    `data`, skipping an encoding when it does not shrink the file by at
+    least 5%.
+    """
+    for suffix, compressed in (
+        ('.gz', gzip.compress(data, compresslevel=9, mtime=0)),
+        ('.br', brotli.compress(data)),
+    ):
+        if len(compressed) < len(data) * 0.95:
+            yield suffix, compressed
+
+
+class AzureManifestStaticStorage(ManifestFilesMixin, AzureStorage):
+    """
+    Static files storage for the Azure deployment.
+
+    collectstatic uploads content-hashed copies of every file plus a
+    staticfiles.json manifest, so {% static %} resolves to the hashed URL.
+    Content-hashed blobs are stored with an immutable Cache-Control header,
+    all others with `cache_control` (SHORT_CACHE_CONTROL by default).
+    Compressible files also get .gz and .br siblings stored with the
+    matching Content-Encoding, ready to be served by a CDN rule that
+    rewrites on Accept-Encoding.
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('cache_control', SHORT_CACHE_CONTROL)
+        super().__init__(*args, **kwargs)
+        # Storage paths of the hashed names created during post_process().
+        self._immutable_paths = set()
+
+    def hashed_name(self, name, content=None, filename=None):
+        hashed_name = super().hashed_name(name, content, filename)
+        self._immutable_paths.add(self._get_valid_path(hashed_name))
+        return hashed_name
+
+    def _get_content_settings_parameters(self, name, content=None):
+        params = super()._get_content_settings_parameters(name, content)
+        if name in self._immutable_paths:
+            params['cache_control'] = IMMUTABLE_CACHE_CONTROL
+        return params
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+
+        for hashed_name in sorted(hashed_names):
+            if hashed_name.lower().endswith(SKIP_COMPRESS_EXTENSIONS):
+                continue
+            with self.open(hashed_name) as original:
+                data = original.read()
+            for suffix, compressed in compressed_variants(data):
+                # mimetypes maps '.css.gz' to ('text/css', 'gzip'), so the
+                # copies keep the original Content-Type.
+                self._immutable_paths.add(self._get_valid_path(hashed_name + suffix))
+                self._save(hashed_name + suffix, ContentFile(compressed))
+                yield hashed_name + suffix, hashed_name + suffix, True
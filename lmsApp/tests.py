@@ -1,3 +1,1304 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import hashlib
+import hmac
+import io
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.core.handlers.asgi import ASGIRequest
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections
+from django.http import HttpResponse
+from django.template import Engine, engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import bundles, exports
+from .api import API_BUDGETS
+from .auth import LOGIN_INACTIVE, LOGIN_INACTIVE_B2B, LOGIN_INVALID, LOGIN_OK, LOGIN_UNVERIFIED, ErudioBackend
+from .bundles import BUNDLE_FORMAT, BUNDLE_VERSION, BundleError, import_bundle, write_bundle
+from .course_content import ContentOrderError, clone_course, parse_content_order, reorder_course_content
+from .db_pool import CheckoutStats, _checkout_stats, database_stats, install_checkout_timer, record_checkout
+from .db_router import PRIMARY_PIN_COOKIE, REPLICA_DB_ALIAS, PrimaryReplicaRouter, RoutingState, current_routing, replica_reads
+from .exports import enrollment_export, export_response, iter_csv, iter_rows, transaction_export
+from .middleware import ReplicaPinningMiddleware
+from .models import Category, Course, CustomUser, Enrollment, Lesson, LessonWatchProgress, Module, SubscriptionPlan, Team, Transaction
+from .payments import apply_charge_result, verify_webhook_signature
+from .progress import MAX_SYNC_EVENTS, ProgressSyncError, complete_lesson, parse_completion_events, sync_lesson_completions
+from .query_inspector import DuplicateQueryError, QueryInspector, fingerprint_sql
+from .slugs import next_free_slug
+from .template_cache import source_loader_settings
+from .utils import AsyncPaystackAPI, CircuitBreaker, PaystackAPI
+from .video import VideoRef, backfill_video_refs, embed_url, parse_video_url
+from .watch_time import (
+    MAX_HEARTBEAT_SECONDS, WatchTimeBuffer, WatchTimeError, flush_due_watch_time, make_watch_token, parse_heartbeat,
+    read_watch_token, record_heartbeat, resume_position, write_watch_progress,
+)
+
+TEST_SECRET_KEY = 'sk_test_webhook'
+
+
+def make_user(email, **extra):
+    extra.setdefault('is_active', True)
+    extra.setdefault('is_verified', True)
+    extra.setdefault('first_name', 'Test')
+    extra.setdefault('last_name', 'User')
+    return CustomUser.objects.create_user(email, 'password', **extra)
+
+
+def make_course(instructor, title='Course', modules=2, lessons=3, **extra):
+    """A course with `modules` modules of `lessons` lessons each, in order."""
+    extra.setdefault('short_description', 'Short')
+    extra.setdefault('long_description', 'Long')
+    course = Course.objects.create(title=title, instructor=instructor, **extra)
+    for module_order in range(1, modules + 1):
+        module = Module.objects.create(course=course, title=f'Module {module_order}', order=module_order)
+        for lesson_order in range(1, lessons + 1):
+            Lesson.objects.create(
+                module=module, title=f'Lesson {module_order}.{lesson_order}', order=lesson_order,
+                video_url='https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+            )
+    return course
+
+
+def sign(body, key=TEST_SECRET_KEY):
+    return hmac.new(key.encode(), body, hashlib.sha512).hexdigest()
+
+
+# --- AUTHENTICATION ---
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ErudioBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('learner@erudio.test')
+
+    def login(self, email, password='password'):
+        request = RequestFactory().post('/accounts/login/')
+        return authenticate(request, username=email, password=password), request.login_state
+
+    def test_successful_login(self):
+        with self.assertNumQueries(1):
+            user, state = self.login('LEARNER@erudio.test')
+        self.assertEqual((user, state), (self.user, LOGIN_OK))
+
+    def test_wrong_password_or_unknown_email(self):
+        self.assertEqual(self.login('learner@erudio.test', 'wrong'), (None, LOGIN_INVALID))
+        self.assertEqual(self.login('nobody@erudio.test'), (None, LOGIN_INVALID))
+
+    def test_inactive_user(self):
+        make_user('inactive@erudio.test', is_active=False)
+        self.assertEqual(self.login('inactive@erudio.test'), (None, LOGIN_INACTIVE))
+
+    def test_unverified_user(self):
+        make_user('unverified@erudio.test', is_verified=False)
+        self.assertEqual(self.login('unverified@erudio.test'), (None, LOGIN_UNVERIFIED))
+        self.assertEqual(self.login('unverified@erudio.test', 'wrong'), (None, LOGIN_INVALID))
+
+    def test_b2b_member_without_active_team(self):
+        make_user('member@erudio.test', is_active=False, is_b2b_member=True)
+        self.assertEqual(self.login('member@erudio.test'), (None, LOGIN_INACTIVE_B2B))
+        # The account state is not revealed to a wrong password.
+        self.assertEqual(self.login('member@erudio.test', 'wrong'), (None, LOGIN_INVALID))
+
+    def test_each_login_hashes_once(self):
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, 'encode', autospec=True, side_effect=hasher.encode) as encode:
+            for email, password in [('learner@erudio.test', 'password'), ('learner@erudio.test', 'wrong'), ('nobody@erudio.test', 'x')]:
+                encode.reset_mock()
+                self.login(email, password)
+                self.assertEqual(encode.call_count, 1, email)
+
+    def test_get_user_loads_owned_team_in_one_query(self):
+        team = Team.objects.create(owner=self.user, name='Acme')
+        with self.assertNumQueries(1):
+            user = ErudioBackend().get_user(self.user.pk)
+            self.assertEqual(user.owned_team, team)
+
+
+# --- CIRCUIT BREAKER ---
+
+class CircuitBreakerTests(SimpleTestCase):
+    def open_breaker(self, breaker):
+        for _ in range(breaker.failure_threshold):
+            self.assertTrue(breaker.allow_request())
+            breaker.record_failure()
+
+    def expire(self, breaker):
+        breaker.opened_at -= breaker.reset_timeout
+
+    def test_opens_after_threshold_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertFalse(breaker.can_request())
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        self.open_breaker(breaker)
+        self.expire(breaker)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.can_request())
+        self.assertTrue(breaker.allow_request())
+        # The trial is in flight: nothing else gets through, and
+        # can_request() agrees with allow_request().
+        self.assertFalse(breaker.can_request())
+        self.assertFalse(breaker.allow_request())
+
+    def test_successful_trial_closes(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        self.open_breaker(breaker)
+        self.expire(breaker)
+        breaker.allow_request()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        self.open_breaker(breaker)
+        self.expire(breaker)
+        breaker.allow_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.trial_in_flight)
+
+
+@override_settings(PAYSTACK_VERIFY_RETRIES=0, PAYSTACK_BASE_URL='https://paystack.test')
+class PaystackBreakerReleaseTests(SimpleTestCase):
+    """A half-open trial is released however the call ends."""
+
+    def half_open_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.allow_request()
+        breaker.record_failure()
+        breaker.opened_at -= breaker.reset_timeout
+        return breaker
+
+    def sync_api(self, error):
+        api = PaystackAPI()
+        api.breaker = self.half_open_breaker()
+        api.session = mock.Mock()
+        api.session.request.side_effect = error
+        return api
+
+    def test_sync_timeout_releases_trial(self):
+        api = self.sync_api(requests.exceptions.ReadTimeout())
+        self.assertIsNone(api.verify_transaction('ref'))
+        self.assertFalse(api.breaker.trial_in_flight)
+        self.assertEqual(api.breaker.state, CircuitBreaker.OPEN)
+
+    def test_sync_unexpected_error_releases_trial(self):
+        api = self.sync_api(requests.exceptions.ChunkedEncodingError())
+        self.assertIsNone(api.verify_transaction('ref'))
+        self.assertFalse(api.breaker.trial_in_flight)
+
+    def test_sync_is_available_follows_the_trial(self):
+        api = self.sync_api(RuntimeError('boom'))
+        self.assertTrue(api.is_available())
+        with self.assertRaises(RuntimeError):
+            api._request('GET', '/transaction/verify/ref')
+        self.assertFalse(api.breaker.trial_in_flight)
+        self.assertFalse(api.is_available())
+
+    def async_api(self, handler):
+        api = AsyncPaystackAPI()
+        api.breaker = self.half_open_breaker()
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = mock.patch('lmsApp.utils.get_async_paystack_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return api
+
+    def test_async_success_closes(self):
+        api = self.async_api(lambda request: httpx.Response(200, json={'status': True}))
+        self.assertEqual(asyncio.run(api.verify_transaction('ref')), {'status': True})
+        self.assertEqual(api.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_async_cancellation_releases_trial(self):
+        async def hang(request):
+            await asyncio.sleep(60)
+
+        api = self.async_api(hang)
+
+        async def cancel_verify():
+            task = asyncio.create_task(api.verify_transaction('ref'))
+            await asyncio.sleep(0.01)
+            self.assertTrue(api.breaker.trial_in_flight)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_verify())
+        self.assertFalse(api.breaker.trial_in_flight)
+        self.assertEqual(api.breaker.state, CircuitBreaker.OPEN)
+
+
+# --- PAYMENTS ---
+
+@override_settings(PAYSTACK_SECRET_KEY=TEST_SECRET_KEY)
+class WebhookSignatureTests(TestCase):
+    body = json.dumps({'event': 'charge.success', 'data': {'reference': 'unknown-ref'}}).encode()
+
+    def test_valid_signature(self):
+        self.assertTrue(verify_webhook_signature(self.body, sign(self.body)))
+
+    def test_rejects_missing_wrong_or_tampered_signature(self):
+        self.assertFalse(verify_webhook_signature(self.body, None))
+        self.assertFalse(verify_webhook_signature(self.body, ''))
+        self.assertFalse(verify_webhook_signature(self.body, sign(self.body, key='sk_other')))
+        self.assertFalse(verify_webhook_signature(self.body + b' ', sign(self.body)))
+
+    def test_view_rejects_unsigned_events(self):
+        response = self.client.post(reverse('paystack_webhook'), self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_view_accepts_signed_events(self):
+        response = self.client.post(
+            reverse('paystack_webhook'), self.body, content_type='application/json',
+            HTTP_X_PAYSTACK_SIGNATURE=sign(self.body),
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class ApplyChargeResultTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = make_user('student@erudio.test')
+        instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.course = Course.objects.create(
+            title='Payments 101', short_description='s', long_description='l',
+            instructor=instructor, price=Decimal('5000.00'),
+        )
+        cls.plan = SubscriptionPlan.objects.create(name='Team', price=Decimal('20000.00'), max_members=10)
+
+    def course_payment(self, reference='course-ref'):
+        return Transaction.objects.create(
+            student=self.student, course=self.course, amount=self.course.price, reference=reference,
+        )
+
+    def test_success_enrolls_once(self):
+        self.course_payment()
+        charge = {'status': 'success', 'amount': 500000}
+        for _ in range(3):
+            transaction = apply_charge_result('course-ref', charge)
+        self.assertEqual(transaction.status, 'success')
+        self.assertEqual(Enrollment.objects.filter(student=self.student, course=self.course).count(), 1)
+
+    def test_settled_transaction_is_not_changed(self):
+        self.course_payment()
+        apply_charge_result('course-ref', {'status': 'success', 'amount': 500000})
+        transaction = apply_charge_result('course-ref', {'status': 'reversed'})
+        self.assertEqual(transaction.status, 'success')
+
+    def test_amount_mismatch_stays_pending(self):
+        self.course_payment()
+        with self.assertLogs('lmsApp.payments', 'ERROR'):
+            transaction = apply_charge_result('course-ref', {'status': 'success', 'amount': 100})
+        self.assertEqual(transaction.status, 'pending')
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_currency_mismatch_stays_pending(self):
+        self.course_payment()
+        with self.assertLogs('lmsApp.payments', 'ERROR'):
+            transaction = apply_charge_result('course-ref', {'status': 'success', 'amount': 500000, 'currency': 'USD'})
+        self.assertEqual(transaction.status, 'pending')
+        self.assertFalse(Enrollment.objects.exists())
+        transaction = apply_charge_result('course-ref', {'status': 'success', 'amount': 500000, 'currency': 'NGN'})
+        self.assertEqual(transaction.status, 'success')
+
+    def test_failed_charge(self):
+        self.course_payment()
+        self.assertEqual(apply_charge_result('course-ref', {'status': 'abandoned'}).status, 'failed')
+
+    def test_unknown_reference(self):
+        self.assertIsNone(apply_charge_result('missing-ref', {'status': 'success'}))
+
+    def test_plan_payment_renews_an_existing_team_once(self):
+        team = Team.objects.create(owner=self.student, name='Acme')
+        Transaction.objects.create(student=self.student, plan=self.plan, amount=self.plan.price, reference='plan-ref')
+        charge = {'status': 'success', 'amount': 2000000}
+        transaction = apply_charge_result('plan-ref', charge)
+        self.assertIsNotNone(transaction.subscription_applied_at)
+        team.refresh_from_db()
+        self.assertEqual(team.plan, self.plan)
+        renewed_until = team.subscription_ends
+
+        apply_charge_result('plan-ref', charge)
+        team.refresh_from_db()
+        self.assertEqual(team.subscription_ends, renewed_until)
+
+
+
+@override_settings(PAYSTACK_VERIFY_RETRIES=0, PAYSTACK_BASE_URL='https://paystack.test')
+class VerifyTransactionTests(SimpleTestCase):
+    def verify(self, status_code, body):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(body).encode()
+        api = PaystackAPI()
+        api.breaker = CircuitBreaker()
+        api.session = mock.Mock()
+        api.session.request.return_value = response
+        with self.assertLogs('lmsApp.utils', 'INFO'):
+            return api.verify_transaction('ref')
+
+    def test_unknown_reference_is_a_rejection(self):
+        result = self.verify(400, {'status': False, 'message': 'Transaction reference not found'})
+        self.assertEqual(result, {'status': False, 'message': 'Transaction reference not found', 'data': None})
+
+    def test_other_errors_are_unknown_outcomes(self):
+        self.assertIsNone(self.verify(401, {'status': False, 'message': 'Invalid key'}))
+
+    @override_settings(PAYSTACK_CURRENCY='NGN')
+    def test_charges_are_initialized_in_the_expected_currency(self):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'status': True, 'data': {'authorization_url': 'https://checkout.test'}}).encode()
+        api = PaystackAPI()
+        api.breaker = CircuitBreaker()
+        api.session = mock.Mock()
+        api.session.request.return_value = response
+        api.initialize_transaction('student@erudio.test', 500000, 'ref', 'https://erudio.test/callback')
+        self.assertEqual(api.session.request.call_args.kwargs['json']['currency'], 'NGN')
+        self.assertIsNone(self.verify(503, {}))
+
+
+class ReconcilePaymentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = make_user('student@erudio.test')
+        instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.course = Course.objects.create(
+            title='Payments 101', short_description='s', long_description='l',
+            instructor=instructor, price=Decimal('5000.00'),
+        )
+
+    def payment(self, reference, age):
+        transaction = Transaction.objects.create(
+            student=self.student, course=self.course, amount=self.course.price, reference=reference,
+        )
+        Transaction.objects.filter(pk=transaction.pk).update(created_at=timezone.now() - age)
+        return transaction
+
+    def reconcile(self, responses):
+        verify = mock.Mock(side_effect=lambda reference: responses[reference])
+        with mock.patch.object(PaystackAPI, 'verify_transaction', verify):
+            call_command('reconcile_payments', workers=1, stdout=io.StringIO())
+        return verify
+
+    def status(self, reference):
+        return Transaction.objects.get(reference=reference).status
+
+    def test_rejected_reference_is_failed(self):
+        self.payment('not-found', datetime.timedelta(hours=1))
+        self.payment('unreachable', datetime.timedelta(hours=1))
+        self.reconcile({
+            'not-found': {'status': False, 'message': 'Transaction reference not found', 'data': None},
+            'unreachable': None,
+        })
+        self.assertEqual(self.status('not-found'), 'failed')
+        self.assertEqual(self.status('unreachable'), 'pending')
+
+    def test_old_pending_payments_are_closed_out_without_verifying(self):
+        self.payment('ancient', datetime.timedelta(days=30))
+        verify = self.reconcile({})
+        self.assertEqual(self.status('ancient'), 'failed')
+        verify.assert_not_called()
+
+
+# --- QUERY INSPECTOR ---
+
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(f'user{n}@erudio.test') for n in range(3)]
+
+    def n_plus_one(self):
+        for user in self.users:
+            CustomUser.objects.get(pk=user.pk)
+
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            fingerprint_sql("SELECT * FROM t WHERE id = 1 AND name = 'a'"),
+            fingerprint_sql("SELECT * FROM t WHERE id = 22 AND name = 'b''c'"),
+        )
+        self.assertEqual(
+            fingerprint_sql('SELECT * FROM t WHERE id IN (%s, %s)'),
+            fingerprint_sql('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+        )
+
+    def test_strict_raises_on_repeated_queries(self):
+        with self.assertRaisesMessage(DuplicateQueryError, 'Repeated queries in users'):
+            with QueryInspector('users', strict=True):
+                self.n_plus_one()
+
+    @override_settings(QUERY_INSPECTOR_STRICT=True)
+    def test_strict_setting_is_the_default(self):
+        with self.assertRaises(DuplicateQueryError):
+            with QueryInspector():
+                self.n_plus_one()
+
+    def test_strict_allows_distinct_queries(self):
+        with QueryInspector(strict=True) as inspector:
+            list(CustomUser.objects.all())
+            Course.objects.count()
+        self.assertEqual(inspector.repeated, {})
+
+    def test_threshold(self):
+        with QueryInspector(threshold=4, strict=True) as inspector:
+            self.n_plus_one()
+        self.assertEqual(len(inspector.counts), 1)
+
+    def test_non_strict_logs_call_site(self):
+        with self.assertLogs('lmsApp.queries', 'WARNING') as logs:
+            with QueryInspector(strict=False):
+                self.n_plus_one()
+        self.assertIn('3x SELECT', logs.output[0])
+        self.assertIn('QueryInspectorTests.n_plus_one', logs.output[0])
+
+    def test_transaction_control_is_ignored(self):
+        with QueryInspector(strict=True) as inspector:
+            for _ in range(3):
+                with connection.cursor() as cursor:
+                    cursor.execute('SAVEPOINT inspector_test')
+                    cursor.execute('RELEASE SAVEPOINT inspector_test')
+        self.assertEqual(inspector.counts, {})
+
+
+# --- COURSE CONTENT ---
+
+class ReorderCourseContentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.course = make_course(cls.instructor)
+
+    def layout(self):
+        return [
+            (module.pk, list(module.lessons.order_by('order').values_list('pk', flat=True)))
+            for module in self.course.modules.order_by('order')
+        ]
+
+    def test_reorder_with_one_bulk_update_per_model(self):
+        (first, first_lessons), (second, second_lessons) = self.layout()
+        # Swap the modules and move a lesson between them.
+        layout = [(second, [first_lessons[0]] + second_lessons), (first, first_lessons[1:])]
+        with CaptureQueriesContext(connection) as queries:
+            result = reorder_course_content(self.course, layout)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 3)
+        self.assertIn('"lmsApp_module"', updates[0])
+        self.assertIn('"lmsApp_lesson"', updates[1])
+        self.assertIn('"lmsApp_course"', updates[2])
+
+        self.assertEqual(self.layout(), layout)
+        self.assertEqual([module['id'] for module in result], [second, first])
+        self.assertEqual([lesson['order'] for lesson in result[0]['lessons']], [1, 2, 3, 4])
+
+    def test_unchanged_order_writes_nothing(self):
+        revision = Course.objects.get(pk=self.course.pk).content_revision
+        with CaptureQueriesContext(connection) as queries:
+            reorder_course_content(self.course, self.layout())
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        self.assertEqual(Course.objects.get(pk=self.course.pk).content_revision, revision)
+
+    def test_incomplete_layout_writes_nothing(self):
+        (first, first_lessons), (second, second_lessons) = self.layout()
+        with self.assertRaisesMessage(ContentOrderError, 'every lesson'):
+            reorder_course_content(self.course, [(second, second_lessons), (first, first_lessons[1:])])
+        with self.assertRaisesMessage(ContentOrderError, 'every module'):
+            reorder_course_content(self.course, [(first, first_lessons + second_lessons)])
+        self.assertEqual(self.layout(), [(first, first_lessons), (second, second_lessons)])
+
+    def test_parse_rejects_malformed_payloads(self):
+        for payload in ({}, {'modules': [{'lessons': []}]}, {'modules': [{'id': 1, 'lessons': 'x'}]},
+                        {'modules': [{'id': 1, 'lessons': [2]}, {'id': 3, 'lessons': [2]}]}):
+            with self.assertRaises(ContentOrderError):
+                parse_content_order(payload)
+        self.assertEqual(parse_content_order({'modules': [{'id': '1', 'lessons': [2, 3]}]}), [(1, [2, 3])])
+
+
+
+class CloneCourseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.course = make_course(cls.instructor, title='Original', is_published=True)
+        cls.course.category.add(Category.objects.create(name='Data'))
+
+    def content(self, course):
+        return list(
+            Lesson.objects.filter(module__course=course).order_by('module__order', 'order')
+            .values_list('module__title', 'title', 'slug', 'video_url', 'video_provider', 'video_id', 'order')
+        )
+
+    def test_clone_copies_content_under_new_slugs(self):
+        other = make_user('other@erudio.test', is_instructor=True)
+        clone = clone_course(self.course, instructor=other)
+        self.assertNotEqual(clone.pk, self.course.pk)
+        self.assertEqual(clone.title, 'Original (Copy)')
+        self.assertNotEqual(clone.slug, self.course.slug)
+        self.assertEqual(clone.instructor, other)
+        self.assertFalse(clone.is_published)
+        self.assertEqual(list(clone.category.all()), list(self.course.category.all()))
+        # Lesson slugs are unique per course, so the clone keeps them.
+        self.assertEqual(self.content(clone), self.content(self.course))
+        self.assertFalse(set(clone.modules.values_list('pk', flat=True)) & set(self.course.modules.values_list('pk', flat=True)))
+
+    def test_query_count_does_not_grow_with_the_course(self):
+        bigger = make_course(self.instructor, title='Bigger', modules=4, lessons=5)
+        bigger.category.set(self.course.category.all())
+        with CaptureQueriesContext(connection) as small:
+            clone_course(self.course)
+        with CaptureQueriesContext(connection) as large:
+            clone_course(bigger)
+        self.assertEqual(len(small), len(large))
+
+
+
+class CourseBundleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.course = make_course(cls.instructor, title='Bundled', what_you_will_learn='One\nTwo')
+        cls.course.category.add(Category.objects.create(name='Data'))
+
+    def export(self, compress=False):
+        bundle = io.BytesIO()
+        write_bundle(self.course, bundle, compress=compress)
+        bundle.seek(0)
+        return bundle
+
+    def content(self, course):
+        return [
+            (module.title, module.order, [
+                (lesson.title, lesson.order, lesson.video_provider, lesson.video_id)
+                for lesson in module.lessons.order_by('order')
+            ])
+            for module in course.modules.order_by('order')
+        ]
+
+    def test_round_trip(self):
+        for compress in (False, True):
+            course, module_count, lesson_count = import_bundle(self.export(compress), self.instructor)
+            self.assertEqual((module_count, lesson_count), (2, 6))
+            self.assertNotEqual(course.slug, self.course.slug)
+            self.assertFalse(course.is_published)
+            self.assertEqual(course.learning_outcomes, ['One', 'Two'])
+            self.assertEqual(list(course.category.values_list('name', flat=True)), ['Data'])
+            self.assertEqual(self.content(course), self.content(self.course))
+
+    def bundle_with(self, **course_fields):
+        lines = [
+            {'type': 'bundle', 'format': BUNDLE_FORMAT, 'version': BUNDLE_VERSION},
+            {'type': 'course', 'title': 'T', 'short_description': 's', 'long_description': 'l', **course_fields},
+        ]
+        return io.BytesIO(''.join(json.dumps(line) + '\n' for line in lines).encode())
+
+    def test_list_fields_must_be_lists_of_strings(self):
+        for fields in ({'categories': 'Data'}, {'categories': [1]}, {'outcomes': {'a': 1}}, {'categories': ['x' * 101]}):
+            with self.assertRaises(BundleError):
+                import_bundle(self.bundle_with(**fields), self.instructor)
+        self.assertEqual(Course.objects.count(), 1)
+
+    def test_line_length_cap(self):
+        with mock.patch.object(bundles, 'MAX_LINE_BYTES', 100):
+            with self.assertRaisesMessage(BundleError, 'Line 2: longer than 100 bytes.'):
+                import_bundle(self.bundle_with(long_description='x' * 200), self.instructor)
+
+    def test_decompressed_size_cap(self):
+        with mock.patch.object(bundles, 'MAX_BUNDLE_BYTES', 1000):
+            with self.assertRaisesMessage(BundleError, 'larger than 1000 bytes'):
+                import_bundle(self.export(compress=True), self.instructor)
+
+
+# --- PROGRESS SYNC ---
+
+class ProgressSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.student = make_user('student@erudio.test')
+        cls.course = make_course(cls.instructor, title='Synced', modules=1, lessons=3)
+        cls.other = make_course(cls.instructor, title='Not enrolled', modules=1, lessons=1)
+        cls.enrollment = Enrollment.objects.create(student=cls.student, course=cls.course)
+        cls.lessons = list(Lesson.objects.filter(module__course=cls.course).order_by('order'))
+
+    def events(self, lessons):
+        return [{'index': index, 'course': self.course.slug, 'lesson': lesson.pk} for index, lesson in enumerate(lessons)]
+
+    def completed(self):
+        return set(self.enrollment.completed_lessons.values_list('pk', flat=True))
+
+    @mock.patch('lmsApp.progress.defer_after_commit')
+    def test_replaying_a_batch_changes_nothing(self, deferred):
+        events = self.events(self.lessons)
+        first = sync_lesson_completions(self.student, events)
+        self.assertEqual(first['accepted'], [0, 1, 2])
+        self.assertEqual(first['enrollments'][0]['progress'], 100)
+        self.assertEqual(deferred.call_count, 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            replay = sync_lesson_completions(self.student, events)
+        self.assertEqual(replay['accepted'], [])
+        self.assertEqual(replay['already_completed'], [0, 1, 2])
+        self.assertEqual(self.completed(), {lesson.pk for lesson in self.lessons})
+        # Nothing new to insert, and the course was already complete: no second certificate.
+        self.assertFalse(any(query['sql'].startswith('INSERT') for query in queries))
+        self.assertEqual(deferred.call_count, 1)
+
+    @mock.patch('lmsApp.progress.defer_after_commit')
+    def test_duplicates_and_earlier_completions_are_skipped(self, deferred):
+        complete_lesson(self.enrollment, self.lessons[0])
+        events = self.events([self.lessons[0], self.lessons[1], self.lessons[1]])
+        result = sync_lesson_completions(self.student, events)
+        self.assertEqual(result['accepted'], [1])
+        self.assertEqual(result['already_completed'], [0, 2])
+        self.assertEqual(self.completed(), {self.lessons[0].pk, self.lessons[1].pk})
+        deferred.assert_not_called()
+
+    def test_a_concurrent_completion_does_not_fail_the_insert(self):
+        # Another request completes the lesson after the sync read what was
+        # done; ignore_conflicts lets the bulk insert skip the existing row.
+        Completion = Enrollment.completed_lessons.through
+        Completion.objects.create(enrollment=self.enrollment, lesson=self.lessons[0])
+        with mock.patch.object(Completion.objects, 'filter', return_value=Completion.objects.none()):
+            result = sync_lesson_completions(self.student, self.events(self.lessons[:1]))
+        self.assertEqual(result['accepted'], [0])
+        self.assertEqual(Completion.objects.filter(enrollment=self.enrollment).count(), 1)
+
+    def test_lessons_outside_the_users_enrollments_are_rejected(self):
+        foreign = Lesson.objects.get(module__course=self.other)
+        result = sync_lesson_completions(self.student, [
+            {'index': 0, 'course': self.other.slug, 'lesson': foreign.pk},
+            {'index': 1, 'course': self.other.slug, 'lesson': self.lessons[0].pk},
+        ])
+        self.assertEqual(result['accepted'], [])
+        self.assertEqual([item['index'] for item in result['rejected']], [0, 1])
+        self.assertEqual(self.completed(), set())
+
+    def test_payload_validation(self):
+        with self.assertRaises(ProgressSyncError):
+            parse_completion_events({'events': 'nope'})
+        with self.assertRaises(ProgressSyncError):
+            parse_completion_events({'events': [{}] * (MAX_SYNC_EVENTS + 1)})
+        events, rejected = parse_completion_events({'events': [
+            {'course': 'python-101', 'lesson': 1},
+            {'course': 'python-101', 'lesson': True},
+            'not an event',
+            # Completions are not timestamped; a client's completed_at is ignored.
+            {'course': 'python-101', 'lesson': 2, 'completed_at': 'yesterday'},
+        ]})
+        self.assertEqual(events, [
+            {'index': 0, 'course': 'python-101', 'lesson': 1},
+            {'index': 3, 'course': 'python-101', 'lesson': 2},
+        ])
+        self.assertEqual([item['index'] for item in rejected], [1, 2])
+
+    def test_view_merges_rejections_and_requires_login(self):
+        url = reverse('progress_sync')
+        body = json.dumps({'events': [{'course': self.course.slug, 'lesson': self.lessons[0].pk}, {'lesson': 'x'}]})
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 401)
+        self.client.force_login(self.student)
+        for _ in range(2):
+            response = self.client.post(url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([item['index'] for item in response.json()['rejected']], [1])
+        self.assertEqual(response.json()['already_completed'], [0])
+        self.assertEqual(self.completed(), {self.lessons[0].pk})
+
+
+# --- WATCH TIME ---
+
+class WatchTokenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.student = make_user('student@erudio.test')
+        cls.course = make_course(cls.instructor, modules=1, lessons=1)
+        cls.enrollment = Enrollment.objects.create(student=cls.student, course=cls.course)
+        cls.lesson = Lesson.objects.get(module__course=cls.course)
+
+    def test_token_round_trip(self):
+        token = make_watch_token(self.enrollment, self.lesson)
+        self.assertEqual(read_watch_token(token, self.student), (self.enrollment.pk, self.lesson.pk))
+
+    def test_tampered_expired_and_foreign_tokens_are_refused(self):
+        token = make_watch_token(self.enrollment, self.lesson)
+        for bad in (token[:-1] + ('A' if token[-1] != 'A' else 'B'), '', 'not-a-token'):
+            with self.assertRaises(WatchTimeError):
+                read_watch_token(bad, self.student)
+        with self.assertRaisesMessage(WatchTimeError, 'another user'):
+            read_watch_token(token, self.instructor)
+        with mock.patch('lmsApp.watch_time.WATCH_TOKEN_MAX_AGE', -1):
+            with self.assertRaisesMessage(WatchTimeError, 'expired'):
+                read_watch_token(token, self.student)
+
+    def test_heartbeat_values_are_bounded(self):
+        self.assertEqual(parse_heartbeat({'watched': '14.6', 'position': '95.9'}), (15, 95))
+        self.assertEqual(parse_heartbeat({'watched': '9999', 'position': '0'}), (MAX_HEARTBEAT_SECONDS, 0))
+        for data in ({'watched': '-1'}, {'position': 'nan'}, {'watched': 'inf'}, {'watched': 'x'}):
+            with self.assertRaises(WatchTimeError):
+                parse_heartbeat(data)
+
+
+class WatchTimeBufferTests(SimpleTestCase):
+    def test_heartbeats_are_summed_until_the_interval_passes(self):
+        with mock.patch('lmsApp.watch_time.time.monotonic', return_value=100.0) as clock:
+            buffer = WatchTimeBuffer(flush_interval=30, max_entries=10)
+            self.assertIsNone(buffer.add(1, 2, 15, 15))
+            self.assertIsNone(buffer.add(1, 2, 15, 30))
+            self.assertEqual(buffer.position(1, 2), 30)
+            clock.return_value = 130.0
+            entries = buffer.add(1, 2, 10, 40)
+        self.assertEqual({key: value[:2] for key, value in entries.items()}, {(1, 2): [40, 40]})
+        self.assertEqual(buffer.entries, {})
+        self.assertIsNone(buffer.position(1, 2))
+
+    def test_a_full_buffer_flushes_early(self):
+        buffer = WatchTimeBuffer(flush_interval=3600, max_entries=2)
+        self.assertIsNone(buffer.add(1, 1, 15, 15))
+        self.assertEqual(set(buffer.add(1, 2, 15, 15)), {(1, 1), (1, 2)})
+
+    def test_the_timer_flushes_entries_without_further_heartbeats(self):
+        with mock.patch('lmsApp.watch_time.time.monotonic', return_value=100.0) as clock:
+            buffer = WatchTimeBuffer(flush_interval=30, max_entries=10)
+            self.assertEqual(buffer.seconds_until_due(), 30)
+            clock.return_value = 110.0
+            buffer.add(1, 2, 15, 15)
+            self.assertEqual(buffer.seconds_until_due(), 20)
+            with mock.patch('lmsApp.watch_time._buffer', buffer), \
+                    mock.patch('lmsApp.watch_time.defer_after_commit') as deferred:
+                flush_due_watch_time()
+                deferred.assert_not_called()
+                clock.return_value = 130.0
+                self.assertEqual(buffer.seconds_until_due(), 0)
+                flush_due_watch_time()
+        self.assertEqual(set(deferred.call_args.args[1]), {(1, 2)})
+        self.assertEqual(buffer.entries, {})
+
+    @mock.patch('lmsApp.watch_time._start_flusher')
+    @mock.patch('lmsApp.watch_time.defer_after_commit')
+    def test_record_heartbeat_defers_the_write(self, deferred, start_flusher):
+        buffer = WatchTimeBuffer(flush_interval=3600, max_entries=1)
+        with mock.patch('lmsApp.watch_time._buffer', buffer):
+            record_heartbeat(1, 2, 15, 15)
+        start_flusher.assert_called_once()
+        deferred.assert_called_once()
+        self.assertIs(deferred.call_args.args[0], write_watch_progress)
+        self.assertEqual(set(deferred.call_args.args[1]), {(1, 2)})
+
+
+class WriteWatchProgressTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.student = make_user('student@erudio.test')
+        cls.course = make_course(cls.instructor, modules=1, lessons=2)
+        cls.enrollment = Enrollment.objects.create(student=cls.student, course=cls.course)
+        cls.first, cls.second = Lesson.objects.filter(module__course=cls.course).order_by('order')
+
+    def progress(self, lesson):
+        return LessonWatchProgress.objects.values_list('seconds_watched', 'last_position').get(
+            enrollment=self.enrollment, lesson=lesson,
+        )
+
+    def test_upsert_adds_watch_time_and_keeps_the_newest_position(self):
+        now = timezone.now()
+        with CaptureQueriesContext(connection) as queries:
+            write_watch_progress({
+                (self.enrollment.pk, self.first.pk): [30, 30, now],
+                (self.enrollment.pk, self.second.pk): [15, 15, now],
+            })
+        self.assertEqual([query['sql'].split()[0] for query in queries if 'SAVEPOINT' not in query['sql']], ['INSERT'])
+        self.assertEqual(self.progress(self.first), (30, 30))
+
+        write_watch_progress({(self.enrollment.pk, self.first.pk): [20, 50, now + datetime.timedelta(seconds=20)]})
+        self.assertEqual(self.progress(self.first), (50, 50))
+        # A late flush from another worker adds its time but does not rewind the position.
+        write_watch_progress({(self.enrollment.pk, self.first.pk): [10, 10, now - datetime.timedelta(seconds=60)]})
+        self.assertEqual(self.progress(self.first), (60, 50))
+        self.assertEqual(resume_position(self.enrollment, self.first), 50)
+
+
+class WriteWatchProgressCleanupTests(TransactionTestCase):
+    def test_rows_for_deleted_enrollments_are_dropped(self):
+        # Foreign keys are checked when the flush commits, so this needs a real commit.
+        course = make_course(make_user('instructor@erudio.test', is_instructor=True), modules=1, lessons=1)
+        lesson = Lesson.objects.get(module__course=course)
+        enrollment = Enrollment.objects.create(student=make_user('student@erudio.test'), course=course)
+        gone = Enrollment.objects.create(student=make_user('gone@erudio.test'), course=course)
+        gone_id = gone.pk
+        gone.delete()
+        now = timezone.now()
+        write_watch_progress({(gone_id, lesson.pk): [15, 15, now], (enrollment.pk, lesson.pk): [15, 15, now]})
+        self.assertEqual(
+            list(LessonWatchProgress.objects.values_list('enrollment_id', 'seconds_watched')), [(enrollment.pk, 15)],
+        )
+
+
+# --- VIDEO URLS ---
+
+class VideoUrlTests(TestCase):
+    ACCEPTED = {
+        'https://www.youtube.com/watch?v=dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+        'https://m.youtube.com/watch?feature=share&v=dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+        'https://youtu.be/dQw4w9WgXcQ?t=42': ('youtube', 'dQw4w9WgXcQ'),
+        'youtube.com/shorts/dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+        'https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+        'https://vimeo.com/76979871': ('vimeo', '76979871'),
+        'https://vimeo.com/channels/staffpicks/76979871': ('vimeo', '76979871'),
+        'https://player.vimeo.com/video/76979871': ('vimeo', '76979871'),
+    }
+    REJECTED = [
+        'https://example.com/video.mp4',
+        'https://dailymotion.com/video/x7tgad0',
+        'https://notyoutube.com/watch?v=dQw4w9WgXcQ',
+        'https://evilvimeo.com/76979871',
+        'https://example.com/?next=https://youtu.be/dQw4w9WgXcQ',
+        'https://www.youtube.com/watch?v=short',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        course = make_course(make_user('instructor@erudio.test', is_instructor=True), modules=1, lessons=1)
+        cls.lesson = Lesson.objects.get(module__course=course)
+
+    def test_youtube_and_vimeo_links_are_recognised(self):
+        for url, ref in self.ACCEPTED.items():
+            with self.subTest(url=url):
+                self.assertEqual(parse_video_url(url), VideoRef(*ref))
+                Lesson(module=self.lesson.module, title='Video', video_url=url).clean()
+
+    def test_other_hosts_are_rejected(self):
+        for url in self.REJECTED:
+            with self.subTest(url=url):
+                self.assertIsNone(parse_video_url(url))
+                with self.assertRaises(ValidationError) as raised:
+                    Lesson(module=self.lesson.module, title='Video', video_url=url).clean()
+                self.assertIn('video_url', raised.exception.message_dict)
+
+    def test_save_stores_the_reference_used_for_embeds(self):
+        self.lesson.video_url = 'https://vimeo.com/76979871'
+        self.lesson.save(update_fields=['video_url'])
+        self.lesson.refresh_from_db()
+        self.assertEqual((self.lesson.video_provider, self.lesson.video_id), ('vimeo', '76979871'))
+        self.assertEqual(self.lesson.get_embed_url(90), 'https://player.vimeo.com/video/76979871#t=90s')
+        self.assertEqual(
+            embed_url('youtube', 'dQw4w9WgXcQ', 42), 'https://www.youtube.com/embed/dQw4w9WgXcQ?enablejsapi=1&start=42',
+        )
+        self.assertIsNone(embed_url('dailymotion', 'x7tgad0'))
+        self.assertIsNone(embed_url('youtube', ''))
+
+    def test_backfill_updates_stale_references(self):
+        Lesson.objects.filter(pk=self.lesson.pk).update(video_provider='', video_id='')
+        stray = Lesson.objects.create(module=self.lesson.module, title='Stray', order=2, video_url='https://example.com/v.mp4')
+        self.assertEqual(backfill_video_refs(Lesson, batch_size=1), (1, [(stray.pk, 'https://example.com/v.mp4')]))
+        self.lesson.refresh_from_db()
+        self.assertEqual((self.lesson.video_provider, self.lesson.video_id), ('youtube', 'dQw4w9WgXcQ'))
+        self.assertEqual(backfill_video_refs(Lesson)[0], 0)
+
+
+# --- CONDITIONAL GET ---
+
+class CatalogEtagTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.course = make_course(cls.instructor, title='Cached', modules=1, lessons=1, is_published=True)
+        cls.category = Category.objects.create(name='Data')
+        cls.course.category.add(cls.category)
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        return response['ETag']
+
+    def assertChanges(self, url, change):
+        before = self.etag(url)
+        change()
+        self.assertNotEqual(self.etag(url), before)
+
+    def test_renaming_a_category_changes_the_catalog(self):
+        def rename():
+            self.category.name = 'Data Science'
+            self.category.save()
+        self.assertChanges(reverse('course_list'), rename)
+
+    def test_moving_a_course_between_categories_changes_the_catalog(self):
+        other = Category.objects.create(name='Web')
+        self.assertChanges(reverse('course_list'), lambda: self.course.category.set([other]))
+
+    def test_renaming_the_instructor_changes_catalog_and_course_pages(self):
+        def rename(name):
+            def change():
+                self.instructor.first_name = name
+                self.instructor.save()
+            return change
+        self.assertChanges(reverse('home'), rename('Ada'))
+        self.assertChanges(reverse('course_list'), rename('Grace'))
+        self.assertChanges(reverse('course_detail', args=[self.course.slug]), rename('Linus'))
+
+    def test_adding_a_lesson_changes_the_catalog(self):
+        module = self.course.modules.get()
+        self.assertChanges(
+            reverse('course_list'),
+            lambda: Lesson.objects.create(module=module, title='More', order=2, video_url='https://vimeo.com/76979871'),
+        )
+
+
+# --- JSON API ---
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True, first_name='Ada', last_name='Lovelace')
+        category = Category.objects.create(name='Data')
+        cls.courses = []
+        for n in range(5):
+            course = make_course(cls.instructor, title=f'Course {n}', modules=1, lessons=2, is_published=True)
+            course.category.add(category)
+            cls.courses.append(course)
+        make_course(cls.instructor, title='Draft')
+        cls.student = make_user('student@erudio.test')
+        owner = make_user('owner@erudio.test')
+        team = Team.objects.create(owner=owner, name='Acme')
+        team.members.add(cls.student)
+        cls.owner = owner
+        for course in cls.courses[:3]:
+            Enrollment.objects.create(student=cls.student, course=course)
+
+    def get(self, url_name, *args, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name, args=args), params)
+        budget = API_BUDGETS[url_name]['queries']
+        self.assertLessEqual(len(queries), budget, f'{url_name} ran {len(queries)} queries, budget {budget}')
+        return response
+
+    def test_catalog_within_budget(self):
+        for user in (None, self.student):
+            if user:
+                self.client.force_login(user)
+            results = self.get('api_catalog').json()['results']
+            self.assertEqual([course['slug'] for course in results], [course.slug for course in reversed(self.courses)])
+            self.assertEqual(results[0]['instructor'], 'Ada Lovelace')
+            self.assertEqual(results[0]['categories'], [{'slug': 'data', 'name': 'Data'}])
+
+    def test_outline_within_budget(self):
+        self.client.force_login(self.student)
+        course = self.courses[0]
+        body = self.get('api_course_outline', course.slug).json()
+        self.assertEqual(body['course']['slug'], course.slug)
+        self.assertEqual(len(body['modules'][0]['lessons']), 2)
+        self.assertEqual(body['progress'], {'enrolled': True, 'completed_lesson_ids': []})
+
+    def test_enrollments_and_team_progress_within_budget(self):
+        self.client.force_login(self.student)
+        self.assertEqual(len(self.get('api_my_enrollments').json()['results']), 3)
+        self.assertEqual(self.get('api_team_progress').status_code, 403)
+        self.client.force_login(self.owner)
+        results = self.get('api_team_progress').json()['results']
+        self.assertEqual({row['member_email'] for row in results}, {'student@erudio.test'})
+
+    def test_login_required(self):
+        self.assertEqual(self.client.get(reverse('api_my_enrollments')).status_code, 401)
+
+    def test_sparse_fieldsets(self):
+        results = self.get('api_catalog', fields='slug,title').json()['results']
+        self.assertEqual(set(results[0]), {'slug', 'title'})
+        response = self.get('api_catalog', fields='slug,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['message'])
+
+    def test_cursor_pages_through_everything_once(self):
+        slugs, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            body = self.get('api_catalog', **params).json()
+            slugs += [course['slug'] for course in body['results']]
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(slugs, [course.slug for course in reversed(self.courses)])
+        self.assertEqual(self.get('api_catalog', cursor='not-a-cursor').status_code, 400)
+
+    def test_matching_etag_returns_304(self):
+        response = self.get('api_catalog')
+        self.assertEqual(self.get('api_catalog').get('ETag'), response['ETag'])
+        not_modified = self.client.get(reverse('api_catalog'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+        outline = self.get('api_course_outline', self.courses[0].slug)
+        # The outline is answered from the course's revision, before the view runs.
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(
+                reverse('api_course_outline', args=[self.courses[0].slug]), HTTP_IF_NONE_MATCH=outline['ETag'],
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertLessEqual(len(queries), 4)
+
+
+# --- EXPORTS ---
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = make_user('student@erudio.test', first_name='=HYPERLINK("http://x")')
+        instructor = make_user('instructor@erudio.test', is_instructor=True)
+        cls.course = make_course(instructor, title='Exports', modules=1, lessons=1)
+        cls.payments = [
+            Transaction.objects.create(student=cls.student, course=cls.course, amount=Decimal('100.00'), reference=f'ref-{n}')
+            for n in range(5)
+        ]
+
+    def csv_rows(self, header, rows):
+        text = b''.join(iter_csv(header, rows)).decode('utf-8').lstrip('\ufeff')
+        return list(csv.reader(io.StringIO(text)))
+
+    def test_csv_neutralises_formulas(self):
+        rows = [('=1+1', '+1', '-1', '@SUM(A1)', '\tx', 'plain', -5)]
+        self.assertEqual(
+            self.csv_rows(['a', 'b', 'c', 'd', 'e', 'f', 'g'], rows)[1],
+            ["'=1+1", "'+1", "'-1", "'@SUM(A1)", "'\tx", 'plain', '-5'],
+        )
+
+    def test_enrollment_export_neutralises_names(self):
+        Enrollment.objects.create(student=self.student, course=self.course)
+        header, rows = enrollment_export(Enrollment.objects.all())
+        self.assertEqual(self.csv_rows(header, rows)[1][1], '\'=HYPERLINK("http://x")')
+
+    def test_keyset_reads_in_primary_key_chunks(self):
+        with mock.patch.object(exports, 'EXPORT_CHUNK_SIZE', 2):
+            with self.assertNumQueries(3):
+                rows = list(iter_rows(Transaction.objects.order_by('-reference'), ['reference'], keyset=True))
+        self.assertEqual(rows, [(payment.reference,) for payment in self.payments])
+
+    def test_cursor_and_keyset_give_the_same_rows(self):
+        header, cursor_rows = transaction_export(Transaction.objects.all())
+        header, keyset_rows = transaction_export(Transaction.objects.all(), keyset=True)
+        self.assertEqual(list(cursor_rows), list(keyset_rows))
+
+    def test_async_response_streams_blocks(self):
+        request = mock.Mock(spec=ASGIRequest, GET={})
+        response = export_response(request, 'payments', ['Reference'], iter([('ref',)]))
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return b''.join([block async for block in response.streaming_content])
+
+        self.assertEqual(asyncio.run(read()).decode('utf-8'), '\ufeffReference\r\nref\r\n')
+
+
+# --- SLUGS ---
+
+class SlugAllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = make_user('instructor@erudio.test', is_instructor=True)
+
+    def course(self, title='Foo', slug=''):
+        return Course.objects.create(title=title, slug=slug, short_description='s', long_description='l', instructor=self.instructor)
+
+    def next_slug(self):
+        return next_free_slug(Course.objects.all(), 'foo')
+
+    def test_free_base(self):
+        self.assertEqual(self.next_slug(), 'foo')
+
+    def test_one_above_highest_suffix(self):
+        for slug in ('foo', 'foo-2', 'foo-10'):
+            self.course(slug=slug)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.next_slug(), 'foo-11')
+
+    def test_zero_padded_and_unrelated_slugs_are_ignored(self):
+        for slug in ('foo', 'foo-3', 'foo-02', 'foo-0010', 'foo-bar', 'foobar-99', 'food'):
+            self.course(slug=slug)
+        self.assertEqual(self.next_slug(), 'foo-4')
+
+    def test_save_allocates_suffixes(self):
+        self.assertEqual([self.course().slug for _ in range(3)], ['foo', 'foo-1', 'foo-2'])
+
+    def test_collision_is_retried_in_a_savepoint(self):
+        self.course(slug='foo')
+        # The first lookup returns a slug that a concurrent save has just taken.
+        stale = iter(['foo'])
+        with mock.patch('lmsApp.slugs.next_free_slug', side_effect=lambda *args: next(stale, None) or next_free_slug(*args)) as lookup:
+            course = self.course()
+        self.assertEqual(course.slug, 'foo-1')
+        self.assertEqual(lookup.call_count, 2)
+        # The savepoint kept the test's transaction usable.
+        self.assertEqual(Course.objects.count(), 2)
+
+    def test_error_with_a_free_slug_is_raised(self):
+        # Not a slug collision, so retrying would not help.
+        with mock.patch('lmsApp.slugs.next_free_slug', side_effect=IntegrityError('other')):
+            with self.assertRaises(IntegrityError):
+                self.course()
+
+
+# --- TEMPLATES ---
+
+class SourceLoaderSettingsTests(SimpleTestCase):
+    SOURCE = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
+    def test_cached_loader_is_unwrapped(self):
+        engine = Engine(loaders=[('django.template.loaders.cached.Loader', self.SOURCE)])
+        self.assertEqual(source_loader_settings(engine), self.SOURCE)
+        self.assertEqual(source_loader_settings(Engine(loaders=self.SOURCE)), self.SOURCE)
+
+    def test_an_engine_built_from_them_does_not_cache(self):
+        cold = Engine(dirs=engines['django'].engine.dirs, loaders=source_loader_settings(engines['django'].engine))
+        self.assertFalse(any(hasattr(loader, 'get_template_cache') for loader in cold.template_loaders))
+
+
+# --- DATABASE POOL AND ROUTING ---
+
+class CheckoutStatsTests(SimpleTestCase):
+    def test_empty(self):
+        self.assertEqual(CheckoutStats().snapshot(), {'count': 0})
+
+    def test_snapshot(self):
+        stats = CheckoutStats(size=100)
+        for ms in range(1, 101):
+            stats.add(ms / 1000)
+        stats.add(0.5, failed=True)
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['count'], 101)
+        self.assertEqual(snapshot['errors'], 1)
+        self.assertEqual(snapshot['max_ms'], 500.0)
+        # Percentiles only cover the `size` most recent checkouts.
+        self.assertEqual(snapshot['p50_ms'], 52.0)
+        self.assertEqual(snapshot['p95_ms'], 97.0)
+
+
+class DatabaseStatsTests(SimpleTestCase):
+    def test_connect_is_timed(self):
+        install_checkout_timer()
+        before = database_stats()[DEFAULT_DB_ALIAS]['checkout']['count']
+        # A separate connection, so the test's own is left alone.
+        fresh = connections.create_connection(DEFAULT_DB_ALIAS)
+        fresh.connect()
+        fresh.close()
+        stats = database_stats()[DEFAULT_DB_ALIAS]
+        self.assertEqual(stats['checkout']['count'], before + 1)
+        self.assertEqual(stats['vendor'], connection.vendor)
+
+    def test_record_checkout_per_alias(self):
+        record_checkout('stats-test', 0.002)
+        record_checkout('stats-test', 0.004, failed=True)
+        snapshot = _checkout_stats['stats-test'].snapshot()
+        self.assertEqual((snapshot['count'], snapshot['errors'], snapshot['avg_ms']), (2, 1, 3.0))
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    router = PrimaryReplicaRouter()
+
+    def route(self, state):
+        token = current_routing.set(state)
+        try:
+            return self.router.db_for_read(Course)
+        finally:
+            current_routing.reset(token)
+
+    def test_outside_a_request_reads_primary(self):
+        self.assertEqual(self.router.db_for_read(Course), DEFAULT_DB_ALIAS)
+
+    def test_replica_only_for_marked_views(self):
+        state = RoutingState()
+        self.assertEqual(self.route(state), DEFAULT_DB_ALIAS)
+        state.use_replica = True
+        self.assertEqual(self.route(state), REPLICA_DB_ALIAS)
+
+    def test_pinned_or_writing_request_reads_primary(self):
+        pinned = RoutingState(pinned=True)
+        pinned.use_replica = True
+        self.assertEqual(self.route(pinned), DEFAULT_DB_ALIAS)
+
+        state = RoutingState()
+        state.use_replica = True
+        token = current_routing.set(state)
+        try:
+            self.assertEqual(self.router.db_for_write(Course), DEFAULT_DB_ALIAS)
+            self.assertTrue(state.wrote)
+            self.assertEqual(self.router.db_for_read(Course), DEFAULT_DB_ALIAS)
+        finally:
+            current_routing.reset(token)
+
+    def test_replica_is_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate(REPLICA_DB_ALIAS, 'lmsApp'))
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'lmsApp'))
+
+    def test_replica_reads_decorator(self):
+        seen = []
+
+        @replica_reads
+        def view(request):
+            seen.append(current_routing.get().use_replica)
+
+        state = RoutingState()
+        token = current_routing.set(state)
+        try:
+            view(None)
+        finally:
+            current_routing.reset(token)
+        self.assertEqual(seen, [True])
+        self.assertFalse(state.use_replica)
+
+
+@override_settings(REPLICA_PIN_SECONDS=10)
+class ReplicaPinningMiddlewareTests(SimpleTestCase):
+    factory = RequestFactory()
+
+    def run_middleware(self, request, write=False):
+        states = []
+
+        def view(request):
+            state = current_routing.get()
+            states.append(state)
+            if write:
+                state.wrote = True
+            return HttpResponse()
+
+        with mock.patch('lmsApp.middleware.replica_available', return_value=True):
+            response = ReplicaPinningMiddleware(view)(request)
+        self.assertIsNone(current_routing.get())
+        return response, states[0]
+
+    def test_read_does_not_pin(self):
+        response, state = self.run_middleware(self.factory.get('/'))
+        self.assertFalse(state.pinned)
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_write_pins_following_requests(self):
+        response, state = self.run_middleware(self.factory.post('/'), write=True)
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[PRIMARY_PIN_COOKIE] = response.cookies[PRIMARY_PIN_COOKIE].value
+        response, state = self.run_middleware(request)
+        self.assertTrue(state.pinned)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 from django.contrib.auth import views as auth_views
 from .forms import CustomSetPasswordForm
 
@@ -23,17 +23,22 @@ urlpatterns = [
     path('dashboard/my-courses/', views.my_courses_view, name='my_courses'),
     path('course/<slug:course_slug>/learn/<slug:lesson_slug>/', views.lesson_detail_view, name='lesson_detail'),
     path('course/<slug:course_slug>/learn/<slug:lesson_slug>/complete/', views.mark_lesson_complete_view, name='mark_lesson_complete'),
+    path('api/v1/me/progress/sync/', views.progress_sync_view, name='progress_sync'),
+    path('api/v1/me/watch/heartbeat/', views.watch_heartbeat_view, name='watch_heartbeat'),
 
     # --- PAYMENT FLOW URLs ---
     path('course/<slug:slug>/payment/initiate/', views.initiate_payment_view, name='initiate_payment'),
     path('payment/verify/', views.verify_payment_view, name='verify_payment'),
+    path('payment/webhook/', views.paystack_webhook_view, name='paystack_webhook'),
 
     # --- INSTRUCTOR DASHBOARD & MANAGEMENT URLs ---
     path('instructor/dashboard/', views.instructor_dashboard_view, name='instructor_dashboard'),
     path('instructor/analytics/', views.instructor_analytics_view, name='instructor_analytics'),
     path('instructor/course/create/', views.course_create_view, name='course_create'),
+    path('instructor/course/import/', views.course_import_view, name='course_import'),
     path('instructor/course/<slug:slug>/update/', views.course_update_view, name='course_update'),
     path('instructor/course/<slug:slug>/manage/', views.course_manage_view, name='course_manage'),
+    path('instructor/course/<slug:slug>/clone/', views.course_clone_view, name='course_clone'),
 
     # --- AJAX API URLs for COURSE MANAGEMENT ---
     path('instructor/api/module/create/<slug:course_slug>/', views.module_create_view, name='module_create'),
@@ -42,6 +47,7 @@ urlpatterns = [
     path('instructor/api/lesson/create/<int:module_id>/', views.lesson_create_view, name='lesson_create'),
     path('instructor/api/lesson/update/<int:lesson_id>/', views.lesson_update_view, name='lesson_update'),
     path('instructor/api/lesson/delete/<int:lesson_id>/', views.lesson_delete_view, name='lesson_delete'),
+    path('instructor/api/course/<slug:course_slug>/reorder/', views.course_reorder_view, name='course_reorder'),
 
     # --- AJAX API URLs for CATEGORY MANAGEMENT ---
     path('instructor/api/category/create/', views.category_create_view, name='category_create'),
@@ -62,8 +68,22 @@ urlpatterns = [
     path('team/dashboard/', views.team_dashboard_view, name='team_dashboard'),
     path('team/remove-member/<int:member_id>/', views.remove_team_member_view, name='remove_team_member'),
 
+    # --- DATA EXPORT URLs ---
+    path('instructor/export/transactions/', views.instructor_transactions_export_view, name='instructor_transactions_export'),
+    path('instructor/export/enrollments/', views.instructor_enrollments_export_view, name='instructor_enrollments_export'),
+    path('team/export/progress/', views.team_progress_export_view, name='team_progress_export'),
+    path('dashboard/export/transactions/', views.admin_transactions_export_view, name='admin_transactions_export'),
+    path('dashboard/export/enrollments/', views.admin_enrollments_export_view, name='admin_enrollments_export'),
+
+    # --- READ-ONLY JSON API (see lmsApp/api.py) ---
+    path('api/v1/courses/', api.catalog_api_view, name='api_catalog'),
+    path('api/v1/courses/<slug:slug>/outline/', api.course_outline_api_view, name='api_course_outline'),
+    path('api/v1/me/enrollments/', api.my_enrollments_api_view, name='api_my_enrollments'),
+    path('api/v1/team/progress/', api.team_progress_api_view, name='api_team_progress'),
+
     # --- SUPER ADMIN URLs ---
     path('dashboard/', views.super_admin_dashboard_view, name='super_admin_dashboard'),
+    path('dashboard/performance/', views.performance_stats_view, name='performance_stats'),
     path('plans/', views.plan_management_view, name='plan_management'),
     path('api/plans/<int:plan_id>/', views.plan_detail_view, name='plan_detail'),
     path('api/plans/<int:plan_id>/update/', views.plan_update_view, name='plan_update'),
@@ -3,14 +3,55 @@ from django.conf import settings
 from django.template.loader import render_to_string
 from django.core.mail import EmailMessage
 from datetime import datetime
-import requests
-import re
-from weasyprint import HTML
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
 from io import BytesIO
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections, transaction as db_transaction
+from .lazy import httpx, requests, weasyprint
+from .metrics import timed_outbound
 
+logger = logging.getLogger(__name__)
+
+
+# --- DEFERRED SIDE EFFECTS ---
+
+_background_executor = None
+_background_executor_lock = threading.Lock()
+
+
+def _run_in_background(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Deferred task %s failed", getattr(func, '__name__', func))
+    finally:
+        # Background threads open their own DB connections; don't leak them.
+        connections.close_all()
+
+
+def defer_after_commit(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on a small background thread pool once the
+    current database transaction commits (immediately if there is none).
+    Used for slow side effects such as emails and bulk enrollments so the
+    request that triggered them can respond right away.
+    """
+    global _background_executor
+    if _background_executor is None:
+        with _background_executor_lock:
+            if _background_executor is None:
+                _background_executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_TASK_WORKERS, thread_name_prefix='erudio-deferred'
+                )
+    db_transaction.on_commit(lambda: _background_executor.submit(_run_in_background, func, args, kwargs))
 
 
 def send_templated_email(template_name, subject, recipient_list, context, attachments=None):
@@ -32,7 +73,8 @@ def send_templated_email(template_name, subject, recipient_list, context, attach
             email.attach(filename, content, mimetype)
     
     try:
-        email.send()
+        with timed_outbound('mail'):
+            email.send()
         return True
     except Exception as e:
         import traceback
@@ -42,73 +84,314 @@ def send_templated_email(template_name, subject, recipient_list, context, attach
 
 # --- PAYSTACK API INTEGRATION ---
 
+class CircuitBreaker:
+    """
+    A small thread-safe circuit breaker for an outbound service.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    every call is refused for `reset_timeout` seconds. After that a single
+    trial call is let through (half-open); its outcome closes or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def _allows(self, state):
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self.trial_in_flight)
+
+    def can_request(self):
+        """Whether allow_request() would let a call through now, without claiming the trial."""
+        with self.lock:
+            return self._allows(self.state)
+
+    def allow_request(self):
+        """
+        Lets a call through or refuses it. A call let through in the
+        half-open state is the trial: the caller must report its outcome with
+        record_success() or record_failure(), whatever happens, or the
+        breaker stays shut.
+        """
+        with self.lock:
+            state = self.state
+            if not self._allows(state):
+                return False
+            if state == self.HALF_OPEN:
+                self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_paystack_session = None
+_paystack_session_lock = threading.Lock()
+
+paystack_breaker = CircuitBreaker(
+    failure_threshold=settings.PAYSTACK_BREAKER_THRESHOLD,
+    reset_timeout=settings.PAYSTACK_BREAKER_RESET_SECONDS,
+)
+
+
+def get_paystack_session():
+    """
+    Returns the process-wide requests.Session used for Paystack calls.
+    Connections to api.paystack.co are kept alive and pooled, so only the
+    first call per pooled connection pays for the TCP and TLS handshake.
+    """
+    global _paystack_session
+    if _paystack_session is None:
+        with _paystack_session_lock:
+            if _paystack_session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.PAYSTACK_POOL_SIZE,
+                    pool_block=False,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    'Authorization': f'Bearer {settings.PAYSTACK_SECRET_KEY}',
+                    'Content-Type': 'application/json',
+                })
+                _paystack_session = session
+    return _paystack_session
+
+
+class PaystackUnavailable(Exception):
+    """Raised internally when the gateway is failing or the circuit breaker is open."""
+
+
 class PaystackAPI:
     """
     A wrapper class for the Paystack API.
-    It handles transaction initialization and verification.
+    It handles transaction initialization and verification over a shared,
+    pooled session, with split connect/read timeouts, bounded retries for
+    idempotent calls and a circuit breaker that fails fast while the
+    gateway is down. Methods return the decoded JSON response, or None if
+    the call could not be completed.
     """
+    # Responses with these status codes count as gateway failures and are retried.
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    # Verify responses that settle a transaction as unpaid, e.g. "Transaction
+    # reference not found" when initialize never completed. Other 4xx, such
+    # as 401 for a wrong secret key, say nothing about the transaction.
+    DEFINITIVE_VERIFY_STATUSES = {400, 404}
+
     def __init__(self):
-        self.secret_key = settings.PAYSTACK_SECRET_KEY
-        self.base_url = 'https://api.paystack.co'
-        self.headers = {
-            'Authorization': f'Bearer {self.secret_key}',
-            'Content-Type': 'application/json',
-        }
+        self.base_url = settings.PAYSTACK_BASE_URL.rstrip('/')
+        self.timeout = (settings.PAYSTACK_CONNECT_TIMEOUT, settings.PAYSTACK_READ_TIMEOUT)
+        self.session = get_paystack_session()
+        self.breaker = paystack_breaker
+
+    def is_available(self):
+        """False while the circuit breaker refuses calls, so views can refuse early."""
+        return self.breaker.can_request()
+
+    def _request(self, method, path, retries=0, **kwargs):
+        url = f'{self.base_url}{path}'
+        for attempt in range(retries + 1):
+            if not self.breaker.allow_request():
+                raise PaystackUnavailable('Paystack circuit breaker is open.')
+            try:
+                with timed_outbound('paystack'):
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.breaker.record_failure()
+                error = e
+            except BaseException:
+                # Any other error (e.g. a truncated chunked body) still ends
+                # the call, and must release a half-open trial.
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    self.breaker.record_success()
+                    # Raises an HTTPError for the remaining bad responses (4xx)
+                    response.raise_for_status()
+                    return response.json()
+                self.breaker.record_failure()
+                error = requests.exceptions.HTTPError(f'{response.status_code} from Paystack', response=response)
+
+            if attempt < retries:
+                # Exponential backoff with full jitter so retries from many workers don't align.
+                time.sleep(random.uniform(0, settings.PAYSTACK_RETRY_BACKOFF * (2 ** attempt)))
+        raise PaystackUnavailable(str(error))
 
     def initialize_transaction(self, email, amount, reference, callback_url):
         """
         Initializes a transaction and returns the authorization URL.
-        Amount should be in the lowest currency unit (e.g., kobo).
+        Amount should be in the lowest unit of PAYSTACK_CURRENCY (e.g., kobo).
+        Not retried: a repeated initialize with the same reference is rejected.
         """
-        url = f'{self.base_url}/transaction/initialize'
         payload = {
             'email': email,
             'amount': str(amount),
             'reference': reference,
             'callback_url': callback_url,
+            'currency': settings.PAYSTACK_CURRENCY,
         }
         try:
-            response = requests.post(url, headers=self.headers, json=payload, timeout=15)
-            response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            # Handle connection errors, timeouts, etc.
-            print(f"An error occurred while initializing transaction with Paystack: {e}")
+            return self._request('POST', '/transaction/initialize', json=payload)
+        except (PaystackUnavailable, requests.exceptions.RequestException, ValueError) as e:
+            logger.warning("An error occurred while initializing transaction with Paystack: %s", e)
             return None
 
+    def _verify_rejection(self, response):
+        """
+        The result of a verify call Paystack answered with a definitive 4xx:
+        no charge data, so callers settle the transaction as failed.
+        """
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        message = body.get('message') if isinstance(body, dict) else None
+        return {'status': False, 'message': message or f'{response.status_code} from Paystack', 'data': None}
+
     def verify_transaction(self, reference):
         """
         Verifies the status of a transaction using its reference.
+        Verification is idempotent, so transient failures are retried.
+        Returns None only when the outcome is unknown (gateway unreachable,
+        5xx or an unexpected error); a definitive rejection of the reference
+        returns a response without data (see DEFINITIVE_VERIFY_STATUSES).
         """
-        url = f'{self.base_url}/transaction/verify/{reference}'
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred while verifying transaction with Paystack: {e}")
+            return self._request(
+                'GET', f'/transaction/verify/{reference}', retries=settings.PAYSTACK_VERIFY_RETRIES
+            )
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code in self.DEFINITIVE_VERIFY_STATUSES:
+                logger.info("Paystack rejected verification of %s: %s", reference, e)
+                return self._verify_rejection(e.response)
+            logger.warning("An error occurred while verifying transaction with Paystack: %s", e)
             return None
-        
+        except (PaystackUnavailable, requests.exceptions.RequestException, ValueError) as e:
+            logger.warning("An error occurred while verifying transaction with Paystack: %s", e)
+            return None
+
+
+_async_paystack_clients = weakref.WeakKeyDictionary()
 
-def get_youtube_embed_url(video_url):
+
+def get_async_paystack_client():
     """
-    Intelligently extracts the YouTube video ID from various URL formats
-    and returns a clean, reliable embed URL.
+    Returns the pooled httpx.AsyncClient for the running event loop.
+    Under an ASGI worker there is one loop per process, so connections are
+    reused across requests exactly like the sync session.
     """
-    if not video_url:
-        return None
+    loop = asyncio.get_running_loop()
+    client = _async_paystack_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            headers={
+                'Authorization': f'Bearer {settings.PAYSTACK_SECRET_KEY}',
+                'Content-Type': 'application/json',
+            },
+            timeout=httpx.Timeout(settings.PAYSTACK_READ_TIMEOUT, connect=settings.PAYSTACK_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.PAYSTACK_ASYNC_POOL_SIZE,
+                max_keepalive_connections=settings.PAYSTACK_ASYNC_POOL_SIZE,
+            ),
+        )
+        _async_paystack_clients[loop] = client
+    return client
 
-    # Regex to find the YouTube video ID in various URL formats
-    regex = r'(?:https?:\/\/)?(?:www\.)?(?:youtube\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})'
-    
-    match = re.search(regex, video_url)
 
-    if match:
-        video_id = match.group(1)
-        return f'https://www.youtube.com/embed/{video_id}'
-    
-    # Return None if no valid YouTube ID is found
-    return None
+class AsyncPaystackAPI(PaystackAPI):
+    """
+    Native asyncio version of PaystackAPI for async views. Shares the
+    circuit breaker, retry policy and return conventions of the sync client,
+    but waits on the gateway without holding a worker thread.
+    """
+    def __init__(self):
+        self.base_url = settings.PAYSTACK_BASE_URL.rstrip('/')
+        self.breaker = paystack_breaker
+
+    async def _request(self, method, path, retries=0, **kwargs):
+        client = get_async_paystack_client()
+        url = f'{self.base_url}{path}'
+        for attempt in range(retries + 1):
+            if not self.breaker.allow_request():
+                raise PaystackUnavailable('Paystack circuit breaker is open.')
+            try:
+                with timed_outbound('paystack'):
+                    response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                error = f'{type(e).__name__}: {e}'
+            except BaseException:
+                # Includes CancelledError when the client disconnects: a
+                # half-open trial must be released, or the breaker stays shut.
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    self.breaker.record_success()
+                    response.raise_for_status()
+                    return response.json()
+                self.breaker.record_failure()
+                error = f'{response.status_code} from Paystack'
+
+            if attempt < retries:
+                await asyncio.sleep(random.uniform(0, settings.PAYSTACK_RETRY_BACKOFF * (2 ** attempt)))
+        raise PaystackUnavailable(error)
+
+    async def initialize_transaction(self, email, amount, reference, callback_url):
+        """Async version of PaystackAPI.initialize_transaction (not retried)."""
+        payload = {
+            'email': email,
+            'amount': str(amount),
+            'reference': reference,
+            'callback_url': callback_url,
+            'currency': settings.PAYSTACK_CURRENCY,
+        }
+        try:
+            return await self._request('POST', '/transaction/initialize', json=payload)
+        except (PaystackUnavailable, httpx.HTTPError, ValueError) as e:
+            logger.warning("An error occurred while initializing transaction with Paystack: %s", e)
+            return None
+
+    async def verify_transaction(self, reference):
+        """Async version of PaystackAPI.verify_transaction (retried)."""
+        try:
+            return await self._request(
+                'GET', f'/transaction/verify/{reference}', retries=settings.PAYSTACK_VERIFY_RETRIES
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in self.DEFINITIVE_VERIFY_STATUSES:
+                logger.info("Paystack rejected verification of %s: %s", reference, e)
+                return self._verify_rejection(e.response)
+            logger.warning("An error occurred while verifying transaction with Paystack: %s", e)
+            return None
+        except (PaystackUnavailable, httpx.HTTPError, ValueError) as e:
+            logger.warning("An error occurred while verifying transaction with Paystack: %s", e)
+            return None
 
 
 def send_enrollment_confirmation_email(enrollment):
@@ -137,7 +420,7 @@ def generate_certificate_pdf(template_src, context_dict=None):
     html_string = render_to_string(template_src, context_dict)
 
     pdf_file = BytesIO()
-    HTML(string=html_string, base_url=settings.BASE_DIR).write_pdf(pdf_file)
+    weasyprint.HTML(string=html_string, base_url=settings.BASE_DIR).write_pdf(pdf_file)
     return pdf_file.getvalue()
 
 
@@ -164,7 +447,8 @@ def send_completion_certificate_email(enrollment):
             f"Meanwhile, congratulations on completing {course_title}!\n\n"
             f"The Erudio Team"
         )
-        EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [enrollment.student.email]).send()
+        with timed_outbound('mail'):
+            EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [enrollment.student.email]).send()
         return
 
     # Success: send email with PDF certificate attached
@@ -178,7 +462,8 @@ def send_completion_certificate_email(enrollment):
 
     email = EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [enrollment.student.email])
     email.attach(filename, pdf_content, 'application/pdf')
-    email.send()
+    with timed_outbound('mail'):
+        email.send()
 
 
 def send_subscription_confirmation_email(team):
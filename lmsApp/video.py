@@ -0,0 +1,121 @@
+"""
+Video URL parsing for lessons.
+
+Lesson.save() runs the lesson's video_url through the registered providers
+once and stores the match in Lesson.video_provider / Lesson.video_id, so
+the player builds its embed URL from two stored strings instead of running
+regular expressions on every page view.
+
+A provider is registered with register_provider(). After adding one, run
+`manage.py backfill_video_ids` so existing lessons pick it up.
+"""
+import re
+from collections import namedtuple
+
+# Lessons read and updated per batch by backfill_video_refs().
+BACKFILL_BATCH_SIZE = 1000
+
+VideoRef = namedtuple('VideoRef', 'provider video_id')
+
+
+class VideoProvider:
+    """
+    A video host: `patterns` are tried in order against the start of a URL
+    (so the host cannot appear later, e.g. in a query string or as the tail
+    of another domain) and the first group of the first match is the video
+    ID; `embed_template` formats that ID into the player URL.
+    """
+    def __init__(self, name, patterns, embed_template, start_template=''):
+        self.name = name
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.embed_template = embed_template
+        self.start_template = start_template
+
+    def parse(self, url):
+        for pattern in self.patterns:
+            match = pattern.match(url)
+            if match:
+                return match.group(1)
+        return None
+
+    def embed_url(self, video_id, start=0):
+        url = self.embed_template.format(id=video_id)
+        if start and self.start_template:
+            url += self.start_template.format(start=int(start))
+        return url
+
+
+_providers = {}
+
+
+def register_provider(provider):
+    """Adds `provider`, or replaces the one registered under the same name."""
+    _providers[provider.name] = provider
+    return provider
+
+
+def parse_video_url(url):
+    """Returns the VideoRef for `url`, or None if no provider recognises it."""
+    if not url:
+        return None
+    for provider in _providers.values():
+        video_id = provider.parse(url)
+        if video_id:
+            return VideoRef(provider.name, video_id)
+    return None
+
+
+def embed_url(provider, video_id, start=0):
+    """The player URL for a stored provider and ID, or None."""
+    if provider not in _providers or not video_id:
+        return None
+    return _providers[provider].embed_url(video_id, start)
+
+
+register_provider(VideoProvider(
+    'youtube',
+    [r'(?:https?:\/\/)?(?:www\.|m\.)?(?:youtube(?:-nocookie)?\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?|shorts|live)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})'],
+    # enablejsapi lets the course player read the playback position.
+    'https://www.youtube.com/embed/{id}?enablejsapi=1',
+    '&start={start}',
+))
+register_provider(VideoProvider(
+    'vimeo',
+    [
+        r'(?:https?:\/\/)?player\.vimeo\.com\/video\/([0-9]+)',
+        r'(?:https?:\/\/)?(?:www\.)?vimeo\.com\/(?:channels\/[\w-]+\/|groups\/[\w-]+\/videos\/|video\/)?([0-9]+)',
+    ],
+    'https://player.vimeo.com/video/{id}',
+    '#t={start}s',
+))
+
+
+def backfill_video_refs(lesson_model, batch_size=BACKFILL_BATCH_SIZE, using='default'):
+    """
+    Re-parses every lesson's video_url and stores the result where it
+    changed, reading and updating in primary-key batches. Used by the
+    backfill command and the migration that added the fields, so it takes
+    the model class. Returns (updated count, [(lesson id, url), ...] for
+    URLs no provider recognises).
+    """
+    updated, unrecognised = 0, []
+    lessons = lesson_model._default_manager.using(using).order_by('pk')
+    last_pk = 0
+    while True:
+        rows = list(
+            lessons.filter(pk__gt=last_pk)
+            .values_list('pk', 'video_url', 'video_provider', 'video_id')[:batch_size]
+        )
+        changed = []
+        for pk, url, provider, video_id in rows:
+            ref = parse_video_url(url) or VideoRef('', '')
+            if not ref.provider:
+                unrecognised.append((pk, url))
+            if ref != (provider, video_id):
+                changed.append(lesson_model(pk=pk, video_provider=ref.provider, video_id=ref.video_id))
+        if changed:
+            lesson_model._default_manager.using(using).bulk_update(changed, ['video_provider', 'video_id'])
+            updated += len(changed)
+        if len(rows) < batch_size:
+            return updated, unrecognised
+        last_pk = rows[-1][0]
@@ -1,20 +1,42 @@
+import json
+import logging
 import uuid
 from functools import wraps
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib import messages
-from django.contrib.auth import login, logout, update_session_auth_hash, authenticate
+from django.contrib.auth import login, logout, update_session_auth_hash
 from .models import *
 from .forms import *
 from .utils import *
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
 from django.template.loader import render_to_string
 from django.db.models import Sum, Q, Count
 from django.db.models.functions import TruncMonth 
 import datetime
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import PasswordResetForm
 from django.contrib.sites.shortcuts import get_current_site
+from .api import API_BUDGETS
+from .auth import LOGIN_INVITED, LOGIN_UNVERIFIED, get_user_profile
+from .bundles import BundleError, import_bundle
+from .course_content import ContentOrderError, clone_course, parse_content_order, reorder_course_content
+from .conditional import catalog_etag, catalog_last_modified, course_detail_etag, course_detail_last_modified
+from .db_pool import database_stats
+from .db_router import replica_reads
+from .exports import enrollment_export, export_response, streams_async, transaction_export
+from .metrics import histogram_snapshot
+from .progress import ProgressSyncError, complete_lesson, parse_completion_events, sync_lesson_completions
+from .payments import (
+    aconfirm_transaction, apply_charge_result, pending_subscription_payment, setup_team_from_payment, verify_webhook_signature,
+)
+from .watch_time import HEARTBEAT_INTERVAL, WatchTimeError, make_watch_token, parse_heartbeat, read_watch_token, record_heartbeat, resume_position
+
+logger = logging.getLogger(__name__)
 
 
 # --- CUSTOM DECORATORS ---
@@ -25,9 +47,10 @@ def instructor_required(view_func):
     """
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if not request.user.is_authenticated:
+        profile = get_user_profile(request)
+        if not profile.is_authenticated:
             return redirect('login')
-        if not request.user.is_instructor:
+        if not profile.is_instructor:
             messages.error(request, "You do not have permission to access this page.")
             return redirect('home')
         return view_func(request, *args, **kwargs)
@@ -37,7 +60,8 @@ def superuser_required(view_func):
     """Decorator for views that checks that the user is logged in and is a superuser."""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if not request.user.is_authenticated or not request.user.is_superuser:
+        profile = get_user_profile(request)
+        if not profile.is_authenticated or not profile.is_superuser:
             messages.error(request, "You do not have permission to access this page.")
             return redirect('home')
         return view_func(request, *args, **kwargs)
@@ -45,6 +69,7 @@ def superuser_required(view_func):
 
 # --- CORE & AUTHENTICATION VIEWS ---
 
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def home_view(request):
     """Displays the homepage with the 6 most recent published courses."""
     courses = Course.objects.filter(is_published=True).order_by('-created_at')[:6]
@@ -100,41 +125,19 @@ def login_view(request):
 
     if request.method == 'POST':
         form = LoginForm(request, data=request.POST)
-        
-        email = request.POST.get('username')
-        password = request.POST.get('password')
-        
-        # We fetch the user object first to perform our custom checks.
-        user_check = CustomUser.objects.filter(email__iexact=email).first()
-
-        if user_check:
-            # Case 1: The user is an invited B2B member who hasn't set their password yet.
-            if user_check.is_invited and not user_check.has_usable_password():
-                 messages.warning(request, "This account was created via an invitation. Please use the link in your invitation email to set your password.")
-                 return redirect('login')
-
-            # Case 2: The user is a B2B member whose account has been deactivated (subscription expired).
-            if not user_check.is_active and user_check.is_b2b_member:
-                user_auth = authenticate(request, email=email, password=password)
-                if user_auth is None:
-                    messages.error(request, "Your account is inactive. Your team's subscription may have expired. Please contact your team manager.")
-                    return render(request, 'accounts/login.html', {'form': form})
-
-            # Case 3: The user exists but has not verified their email.
-            if not user_check.is_verified:
-                # We check the password is correct before showing the verification error.
-                if user_check.check_password(password):
-                    messages.warning(request, 'Your account is not verified. Please check your email for the activation link.')
-                    return redirect('login')
-
-        # If all our custom checks pass, we proceed with Django's standard validation.
-        # This will handle the generic "incorrect password" error for us.
+        # ErudioBackend fetches the user once and checks the password once;
+        # the form turns the account state into its error message.
         if form.is_valid():
             user = form.get_user()
             login(request, user)
             messages.success(request, f'Welcome back, {user.first_name}!')
             next_page = request.GET.get('next')
             return redirect(next_page) if next_page else redirect('home')
+
+        # Invited and unverified users get a notice instead of a form error.
+        if form.login_state in (LOGIN_INVITED, LOGIN_UNVERIFIED):
+            messages.warning(request, form.error_messages[form.login_state])
+            return redirect('login')
     else:
         form = LoginForm()
 
@@ -220,6 +223,8 @@ def custom_password_reset(request):
 
 # --- PUBLIC COURSE VIEWS ---
 
+@replica_reads
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
 def course_list_view(request):
     queryset = Course.objects.filter(is_published=True).order_by('-created_at')
     categories = Category.objects.all()
@@ -245,6 +250,8 @@ def course_list_view(request):
     return render(request, 'course_list.html', context)
 
 
+@replica_reads
+@condition(etag_func=course_detail_etag, last_modified_func=course_detail_last_modified)
 def course_detail_view(request, slug):
     course = get_object_or_404(Course.objects.prefetch_related('modules__lessons'), slug=slug, is_published=True)
     
@@ -307,13 +314,16 @@ def lesson_detail_view(request, course_slug, lesson_slug):
             return redirect(next_lesson_to_complete.get_absolute_url())
         return redirect('my_courses')
 
-    embed_url = get_youtube_embed_url(current_lesson.video_url)
+    # Only the YouTube player reports its position (see course_player.html).
+    resume_at = resume_position(enrollment, current_lesson) if current_lesson.video_provider == 'youtube' else 0
     context = {
         'course': course,
         'current_lesson': current_lesson,
         'enrollment': enrollment,
         'modules_with_status': modules_with_status,
-        'embed_url': embed_url
+        'embed_url': current_lesson.get_embed_url(start=resume_at),
+        'watch_token': make_watch_token(enrollment, current_lesson),
+        'heartbeat_interval': HEARTBEAT_INTERVAL
     }
     return render(request, 'course_player.html', context)
 
@@ -323,8 +333,11 @@ def mark_lesson_complete_view(request, course_slug, lesson_slug):
     if request.method == 'POST':
         course = get_object_or_404(Course, slug=course_slug)
         lesson = get_object_or_404(Lesson, slug=lesson_slug, module__course=course)
-        enrollment = get_object_or_404(Enrollment, student=request.user, course=course)
-        enrollment.completed_lessons.add(lesson)
+        enrollment = get_object_or_404(Enrollment.objects.select_related('student', 'course'), student=request.user, course=course)
+        if complete_lesson(enrollment, lesson):
+            # complete_lesson() sends the certificate once the transaction commits.
+            messages.success(request, f"🎉 Congratulations! You’ve completed the course: '{course.title}'!")
+            return redirect('my_courses')
 
         # Find the next lesson to redirect to
         all_lessons = list(
@@ -332,46 +345,101 @@ def mark_lesson_complete_view(request, course_slug, lesson_slug):
         )
         try:
             current_index = all_lessons.index(lesson)
+            messages.success(request, f"✅ Great job on completing '{lesson.title}'!")
             if current_index + 1 < len(all_lessons):
-                next_lesson = all_lessons[current_index + 1]
-                messages.success(request, f"✅ Great job on completing '{lesson.title}'!")
-                return redirect(next_lesson.get_absolute_url())
-            else:
-                messages.success(request, f"🎉 Congratulations! You’ve completed the course: '{course.title}'!")
-                send_completion_certificate_email(enrollment)
-                return redirect('my_courses')
+                return redirect(all_lessons[current_index + 1].get_absolute_url())
+            return redirect('my_courses')
         except ValueError:
             return redirect('my_courses')
 
     return redirect('home') 
 
+@require_POST
+def progress_sync_view(request):
+    """
+    Records many lesson completions in one request, e.g. from a mobile client
+    that was offline. Expects a JSON body {"events": [{"course": <slug>,
+    "lesson": <id>}, ...]}; events that do not match an enrollment are
+    reported back without failing the batch. Completions are not
+    timestamped, so a client's `completed_at` is ignored. Sending the same
+    batch again changes nothing.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required.'}, status=401)
+    try:
+        events, rejected = parse_completion_events(json.loads(request.body))
+    except ProgressSyncError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body.'}, status=400)
+
+    result = sync_lesson_completions(request.user, events) if events else {
+        'accepted': [], 'already_completed': [], 'rejected': [], 'enrollments': [],
+    }
+    result['rejected'] = sorted(rejected + result['rejected'], key=lambda item: item['index'])
+    return JsonResponse({'status': 'success', **result})
+
+@require_POST
+def watch_heartbeat_view(request):
+    """
+    Receives the course player's heartbeats: a signed `token` naming the
+    enrollment and lesson, the seconds `watched` since the previous beat and
+    the playback `position`. The heartbeat is buffered in memory (see
+    lmsApp.watch_time), so this view does not write to the database.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentication required.'}, status=401)
+    try:
+        enrollment_id, lesson_id = read_watch_token(request.POST.get('token', ''), request.user)
+        watched, position = parse_heartbeat(request.POST)
+    except WatchTimeError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    record_heartbeat(enrollment_id, lesson_id, watched, position)
+    return JsonResponse({'status': 'success'})
+
 
 # --- PAYMENT & ENROLLMENT VIEWS ---
 
+async def aget_object_or_404(queryset, **kwargs):
+    """Async counterpart of get_object_or_404 for the async views below."""
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+# The payment views are native async views: under an ASGI worker (see Procfile)
+# a slow Paystack call suspends the request instead of blocking a worker.
+
 @login_required
-def initiate_payment_view(request, slug):
+async def initiate_payment_view(request, slug):
     """Initiates payment for a course or enrolls for free."""
-    course = get_object_or_404(Course, slug=slug, is_published=True)
+    user = await request.auser()
+    course = await aget_object_or_404(Course.objects.all(), slug=slug, is_published=True)
 
-    if Enrollment.objects.filter(student=request.user, course=course).exists():
+    if await Enrollment.objects.filter(student=user, course=course).aexists():
         messages.info(request, "You are already enrolled in this course.")
         return redirect('course_detail', slug=slug)
 
     if not course.is_paid or course.price == 0:
-        enrollment = Enrollment.objects.create(student=request.user, course=course)
+        enrollment = await Enrollment.objects.acreate(student=user, course=course)
         messages.success(request, f"You have successfully enrolled in '{course.title}'.")
-        send_enrollment_confirmation_email(enrollment)
+        await sync_to_async(defer_after_commit)(send_enrollment_confirmation_email, enrollment)
         return redirect('my_courses')
 
-    reference = f"ERUDIO-{request.user.id}-{course.id}-{uuid.uuid4().hex[:10].upper()}"
+    paystack = AsyncPaystackAPI()
+    if not paystack.is_available():
+        messages.error(request, "Our payment gateway is temporarily unavailable. Please try again in a few minutes.")
+        return redirect('course_detail', slug=slug)
+
+    reference = f"ERUDIO-{user.id}-{course.id}-{uuid.uuid4().hex[:10].upper()}"
     
-    Transaction.objects.create(
-        student=request.user, course=course, reference=reference, amount=course.price, status='pending'
+    await Transaction.objects.acreate(
+        student=user, course=course, reference=reference, amount=course.price, status='pending'
     )
-    paystack = PaystackAPI()
     callback_url = request.build_absolute_uri(reverse('verify_payment'))
     amount_in_kobo = int(course.price * 100)
-    api_response = paystack.initialize_transaction(request.user.email, amount_in_kobo, reference, callback_url)
+    api_response = await paystack.initialize_transaction(user.email, amount_in_kobo, reference, callback_url)
 
     if api_response and api_response.get('status'):
         return redirect(api_response['data']['authorization_url'])
@@ -380,37 +448,63 @@ def initiate_payment_view(request, slug):
         return redirect('course_detail', slug=slug)
 
 @login_required
-def verify_payment_view(request):
+async def verify_payment_view(request):
     """Handles the callback from Paystack to verify a transaction."""
+    user = await request.auser()
     reference = request.GET.get('reference')
     if not reference:
         messages.error(request, "Payment verification failed. No reference provided.")
         return redirect('course_list')
 
     try:
-        transaction = Transaction.objects.get(reference=reference, student=request.user)
+        transaction = await Transaction.objects.aget(reference=reference, student=user)
     except Transaction.DoesNotExist:
         messages.error(request, "Invalid transaction reference.")
         return redirect('course_list')
 
-    paystack = PaystackAPI()
-    api_response = paystack.verify_transaction(reference)
+    transaction = await aconfirm_transaction(transaction)
+
+    if transaction is None:
+        # The gateway could not be reached; the payment may still have gone through,
+        # so the transaction stays pending instead of being marked as failed.
+        messages.warning(request, "We couldn't confirm your payment with the gateway yet. Please check back shortly, or contact support if you were debited.")
+        return redirect('course_list')
 
-    if api_response and api_response.get('data') and api_response['data']['status'] == 'success':
-        transaction.status = 'success'
-        transaction.save()
-        enrollment, created = Enrollment.objects.get_or_create(student=transaction.student, course=transaction.course)
+    if transaction.status == 'success':
         messages.success(request, f"Payment successful! You are now enrolled in '{transaction.course.title}'.")
-        if created:
-            send_enrollment_confirmation_email(enrollment)
         return redirect('my_courses')
+    elif transaction.status == 'pending':
+        messages.info(request, "Your payment is still being confirmed. You will be enrolled automatically once it clears.")
+        return redirect('course_detail', slug=transaction.course.slug)
     else:
-        transaction.status = 'failed'
-        transaction.save()
-        error_message = api_response.get('message', "Please contact support if you were debited.")
-        messages.error(request, f"Payment verification failed. Reason: {error_message}")
+        messages.error(request, "Payment verification failed. Please contact support if you were debited.")
         return redirect('course_detail', slug=transaction.course.slug)
 
+
+@csrf_exempt
+@require_POST
+def paystack_webhook_view(request):
+    """
+    Receives push notifications from Paystack. Only signed charge.success
+    events are acted upon; everything is acknowledged quickly, with emails
+    and bulk enrollments deferred until after the response.
+    """
+    if not verify_webhook_signature(request.body, request.headers.get('X-Paystack-Signature')):
+        return HttpResponse(status=401)
+
+    try:
+        event = json.loads(request.body)
+    except ValueError:
+        return HttpResponse(status=400)
+
+    if event.get('event') == 'charge.success':
+        charge = event.get('data') or {}
+        reference = charge.get('reference')
+        if reference and apply_charge_result(reference, charge) is None:
+            logger.warning("Paystack webhook for unknown transaction reference %s", reference)
+
+    return HttpResponse(status=200)
+
 # --- INSTRUCTOR DASHBOARD VIEWS ---
 
 @instructor_required
@@ -455,6 +549,38 @@ def course_update_view(request, slug):
     return render(request, 'instructor/course_form.html', context)
 
 
+@instructor_required
+def course_import_view(request):
+    """View for instructors to create a course from an uploaded course bundle."""
+    if request.method == 'POST':
+        form = CourseImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                course, modules, lessons = import_bundle(form.cleaned_data['bundle'], request.user)
+            except BundleError as e:
+                form.add_error('bundle', str(e))
+            else:
+                messages.success(
+                    request,
+                    f"Course '{course.title}' was imported with {modules} modules and {lessons} lessons. "
+                    "Review it and publish it when it is ready."
+                )
+                return redirect('course_manage', slug=course.slug)
+    else:
+        form = CourseImportForm()
+    return render(request, 'instructor/course_import.html', {'form': form})
+
+
+@instructor_required
+@require_POST
+def course_clone_view(request, slug):
+    """Copies one of the instructor's courses, with its content, into a new draft."""
+    course = get_object_or_404(Course, slug=slug, instructor=request.user)
+    clone = clone_course(course, instructor=request.user)
+    messages.success(request, f"Created '{clone.title}' as an unpublished copy of '{course.title}'.")
+    return redirect('course_update', slug=clone.slug)
+
+
 @instructor_required
 def course_manage_view(request, slug):
     course = get_object_or_404(Course.objects.prefetch_related('modules__lessons'), slug=slug, instructor=request.user)
@@ -528,8 +654,27 @@ def lesson_delete_view(request, lesson_id):
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'}, status=400)
 
+@instructor_required
+@require_POST
+def course_reorder_view(request, course_slug):
+    """
+    Saves a new module and lesson order for a course in one request. Expects
+    a JSON body listing every module, in order, each with its lesson IDs in
+    order; lessons may move between modules.
+    """
+    course = get_object_or_404(Course, slug=course_slug, instructor=request.user)
+    try:
+        layout = parse_content_order(json.loads(request.body))
+        modules = reorder_course_content(course, layout)
+    except ContentOrderError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body.'}, status=400)
+    return JsonResponse({'status': 'success', 'modules': modules})
+
 
 @instructor_required
+@replica_reads
 def instructor_analytics_view(request):
     """
     Displays key performance indicators and enrollment trends for the instructor.
@@ -605,6 +750,7 @@ def category_delete_view(request, category_id):
 
 
 @superuser_required
+@replica_reads
 def super_admin_dashboard_view(request):
     """
     Calculates and displays sitewide analytics for the super admin.
@@ -670,6 +816,31 @@ def super_admin_dashboard_view(request):
     return render(request, 'admin/dashboard.html', context)
 
 
+@staff_member_required
+def performance_stats_view(request):
+    """
+    API endpoint exposing this process's rolling request-time histograms per URL name,
+    the JSON API's performance budgets next to what was observed, and its database
+    connection checkout / pool statistics.
+    """
+    views = histogram_snapshot()
+    api_budgets = {}
+    for url_name, budget in API_BUDGETS.items():
+        observed = views.get(url_name)
+        api_budgets[url_name] = {**budget, 'observed': observed and {
+            'p90_ms': observed['p90_ms'],
+            'avg_queries': observed['avg_queries'],
+            'within_budget': observed['p90_ms'] <= budget['p90_ms'] and observed['avg_queries'] <= budget['queries'],
+        }}
+    data = {
+        'sample_rate': settings.PERFORMANCE_SAMPLE_RATE,
+        'views': views,
+        'api_budgets': api_budgets,
+        'databases': database_stats(),
+    }
+    return JsonResponse(data)
+
+
 @login_required
 def account_settings_view(request):
     user = request.user
@@ -784,40 +955,39 @@ def team_setup_view(request):
     This view creates the team, activates the subscription, grants course access,
     and sends the confirmation email.
     """
-    plan_id = request.session.get('pending_subscription_plan_id')
-    
+    transaction_id = request.session.get('pending_subscription_transaction_id')
+    payment = None
+    if transaction_id or get_user_profile(request).owned_team_id is None:
+        # Without the session key, the payment may have been confirmed by the
+        # webhook after the user left the callback page. Only a recent payment
+        # that has not activated a team yet counts.
+        payment = pending_subscription_payment(request.user, transaction_id)
+
     # Security: If the user hasn't just completed a payment, they cannot access this page.
-    if not plan_id:
+    if payment is None:
+        request.session.pop('pending_subscription_transaction_id', None)
         messages.error(request, "No pending subscription found. Please choose a plan to continue.")
         return redirect('for_business')
 
-    plan = get_object_or_404(SubscriptionPlan, id=plan_id)
-    
+    plan = payment.plan
+
     if request.method == 'POST':
         form = TeamCreationForm(request.POST)
         if form.is_valid():
-            team, created = Team.objects.get_or_create(
-                owner=request.user,
-                defaults={'name': form.cleaned_data['name']}
+            # Activates the subscription and marks the payment as used; granting
+            # all-access to existing team members and the confirmation email
+            # happen in the background.
+            team = setup_team_from_payment(
+                payment,
+                request.user,
+                name=form.cleaned_data['name'],
+                phone_number=form.cleaned_data['phone_number'],
+                address=form.cleaned_data['address'],
             )
-            
-            # Update team details from the form
-            team.name = form.cleaned_data['name']
-            team.phone_number = form.cleaned_data['phone_number']
-            team.address = form.cleaned_data['address']
-            
-            # Activate or Renew the subscription
-            team.plan = plan
-            team.is_active = True
-            team.subscription_ends = timezone.now() + datetime.timedelta(days=30)
-            team.save()
-            
-            # Grant all-access to existing team members
-            team.grant_all_members_course_access()
-            send_subscription_confirmation_email(team)
-            
-            # Clean up the session variable
-            del request.session['pending_subscription_plan_id']
+            request.session.pop('pending_subscription_transaction_id', None)
+            if team is None:
+                messages.error(request, "This payment has already been used to activate a team.")
+                return redirect('for_business')
 
             messages.success(request, f"Welcome! Your team '{team.name}' has been created successfully.")
             return redirect('team_dashboard')
@@ -1004,25 +1174,31 @@ def plan_delete_view(request, plan_id):
 
 
 @login_required
-def initiate_team_subscription_view(request, plan_id):
+async def initiate_team_subscription_view(request, plan_id):
     """
     Handles the start of a B2B subscription process.
     """
-    if hasattr(request.user, 'owned_team'):
+    user = await request.auser()
+    if await Team.objects.filter(owner=user).aexists():
         messages.warning(request, "You already manage a team. You cannot subscribe to a new plan.")
         return redirect('team_dashboard')
 
-    plan = get_object_or_404(SubscriptionPlan, id=plan_id)
-    reference = f"ERUDIO-SUB-{request.user.id}-{plan.id}-{uuid.uuid4().hex[:10].upper()}"
-    paystack = PaystackAPI()
-    
-    # Add plan_id to the callback URL so we know what was paid for
-    callback_url = request.build_absolute_uri(
-        f"{reverse('verify_team_subscription')}?plan_id={plan.id}"
+    plan = await aget_object_or_404(SubscriptionPlan.objects.all(), id=plan_id)
+    paystack = AsyncPaystackAPI()
+    if not paystack.is_available():
+        messages.error(request, "Our payment gateway is temporarily unavailable. Please try again in a few minutes.")
+        return redirect('for_business')
+
+    reference = f"ERUDIO-SUB-{user.id}-{plan.id}-{uuid.uuid4().hex[:10].upper()}"
+    await Transaction.objects.acreate(
+        student=user, plan=plan, reference=reference, amount=plan.price, status='pending'
     )
+    
+    # The pending Transaction records which plan was paid for.
+    callback_url = request.build_absolute_uri(reverse('verify_team_subscription'))
     amount_in_kobo = int(plan.price * 100)
 
-    api_response = paystack.initialize_transaction(request.user.email, amount_in_kobo, reference, callback_url)
+    api_response = await paystack.initialize_transaction(user.email, amount_in_kobo, reference, callback_url)
 
     if api_response and api_response.get('status'):
         return redirect(api_response['data']['authorization_url'])
@@ -1032,26 +1208,86 @@ def initiate_team_subscription_view(request, plan_id):
 
 
 @login_required
-def verify_team_subscription_view(request):
+async def verify_team_subscription_view(request):
     """
     Handles the callback from Paystack. Verifies payment and redirects to the team setup page.
     """
+    user = await request.auser()
     reference = request.GET.get('reference')
-    plan_id = request.GET.get('plan_id')
     
-    if not reference or not plan_id:
+    if not reference:
         messages.error(request, "Invalid subscription verification link.")
         return redirect('for_business')
 
-    paystack = PaystackAPI()
-    api_response = paystack.verify_transaction(reference)
+    try:
+        transaction = await Transaction.objects.aget(reference=reference, student=user, plan__isnull=False)
+    except Transaction.DoesNotExist:
+        messages.error(request, "Invalid subscription verification link.")
+        return redirect('for_business')
+
+    transaction = await aconfirm_transaction(transaction)
+
+    if transaction is None:
+        messages.warning(request, "We couldn't confirm your payment with the gateway yet. Please check back shortly, or contact support if you were debited.")
+        return redirect('for_business')
 
-    if api_response and api_response.get('data') and api_response['data']['status'] == 'success':
-        # Payment is successful. Store the plan_id in the session
+    if transaction.status == 'success':
+        if transaction.subscription_applied_at:
+            # The payment renewed the team the user already owns.
+            messages.success(request, "Your team subscription has been renewed.")
+            return redirect('team_dashboard')
+        # Payment is successful. Store the payment in the session
         # and redirect the user to the final setup step.
-        request.session['pending_subscription_plan_id'] = plan_id
-        
+        await request.session.aset('pending_subscription_transaction_id', transaction.pk)
         return redirect('team_setup')
+    elif transaction.status == 'pending':
+        messages.info(request, "Your payment is still being confirmed. Please check back in a few minutes.")
+        return redirect('for_business')
     else:
         messages.error(request, "Payment verification failed. Please try again or contact support if you were debited.")
-        return redirect('for_business')
\ No newline at end of file
+        return redirect('for_business')
+
+
+# --- DATA EXPORTS ---
+# Streamed CSV (default) or XLSX (?format=xlsx) downloads. Rows are read in
+# chunks while the response is sent, so large exports use constant memory
+# under both WSGI and ASGI.
+
+@instructor_required
+@replica_reads
+def instructor_transactions_export_view(request):
+    """Payments for the instructor's courses."""
+    header, rows = transaction_export(Transaction.objects.filter(course__instructor=request.user), keyset=streams_async(request))
+    return export_response(request, 'erudio-transactions', header, rows, 'Transactions')
+
+@instructor_required
+@replica_reads
+def instructor_enrollments_export_view(request):
+    """Enrollments in the instructor's courses, with each student's progress."""
+    header, rows = enrollment_export(Enrollment.objects.filter(course__instructor=request.user), keyset=streams_async(request))
+    return export_response(request, 'erudio-enrollments', header, rows, 'Enrollments')
+
+@login_required
+@replica_reads
+def team_progress_export_view(request):
+    """Course progress of every member of the logged-in owner's team."""
+    team_id = get_user_profile(request).owned_team_id
+    if team_id is None:
+        messages.error(request, "You do not have a team dashboard. Contact sales to get started.")
+        return redirect('for_business')
+    header, rows = enrollment_export(Enrollment.objects.filter(student__teams=team_id), keyset=streams_async(request))
+    return export_response(request, 'erudio-team-progress', header, rows, 'Team progress')
+
+@superuser_required
+@replica_reads
+def admin_transactions_export_view(request):
+    """Every transaction on the site, for finance."""
+    header, rows = transaction_export(Transaction.objects.all(), keyset=streams_async(request))
+    return export_response(request, 'erudio-all-transactions', header, rows, 'Transactions')
+
+@superuser_required
+@replica_reads
+def admin_enrollments_export_view(request):
+    """Every enrollment on the site, with progress."""
+    header, rows = enrollment_export(Enrollment.objects.all(), keyset=streams_async(request))
+    return export_response(request, 'erudio-all-enrollments', header, rows, 'Enrollments')
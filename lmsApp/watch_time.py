@@ -0,0 +1,253 @@
+"""
+Lesson watch time from player heartbeats.
+
+The course player sends a heartbeat every HEARTBEAT_INTERVAL seconds while a
+video plays. Heartbeats are not written one by one: each worker process
+adds them up in memory per (enrollment, lesson) and, at most once every
+WATCH_TIME_FLUSH_INTERVAL seconds, writes the totals with one upsert per
+batch of rows. The number of rows written therefore follows the number of
+learners watching, not the number of heartbeats.
+
+A flush is started by the first heartbeat after the interval, by a full
+buffer, or by a daemon thread that wakes once per interval, so heartbeats
+are written even when traffic stops. A worker that dies without a clean
+shutdown therefore loses at most one flush interval of watch time; the
+player's resume position can lag behind by the same amount when the next
+page is served by another worker.
+"""
+import atexit
+import threading
+import time
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+from .models import Enrollment, Lesson, LessonWatchProgress
+from .utils import defer_after_commit
+
+# Seconds between two heartbeats sent by the player.
+HEARTBEAT_INTERVAL = 15
+# Upper bound on the watch time a single heartbeat can add.
+MAX_HEARTBEAT_SECONDS = 4 * HEARTBEAT_INTERVAL
+# Rows per upsert statement (5 parameters each).
+FLUSH_BATCH_SIZE = 100
+# How long a player page's heartbeat token stays valid.
+WATCH_TOKEN_MAX_AGE = 24 * 60 * 60
+WATCH_TOKEN_SALT = 'lmsApp.watch_time'
+
+
+class WatchTimeError(ValueError):
+    """Raised when a heartbeat cannot be accepted."""
+
+
+# --- TOKENS ---
+
+def make_watch_token(enrollment, lesson):
+    """
+    Signs the enrollment and lesson a player page reports on, so heartbeats
+    can be accepted without looking the enrollment up again.
+    """
+    return signing.dumps([enrollment.pk, lesson.pk, enrollment.student_id], salt=WATCH_TOKEN_SALT)
+
+
+def read_watch_token(token, user):
+    """Returns (enrollment id, lesson id) from a token issued to `user`."""
+    try:
+        enrollment_id, lesson_id, user_id = signing.loads(token, salt=WATCH_TOKEN_SALT, max_age=WATCH_TOKEN_MAX_AGE)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise WatchTimeError("Invalid or expired watch token.")
+    if user_id != user.pk:
+        raise WatchTimeError("This watch token belongs to another user.")
+    return enrollment_id, lesson_id
+
+
+def parse_heartbeat(data):
+    """
+    Reads `watched` (seconds played since the previous heartbeat) and
+    `position` (current playback time) from a heartbeat's form data.
+    """
+    try:
+        watched = float(data.get('watched', 0))
+        position = float(data.get('position', 0))
+    except (TypeError, ValueError):
+        raise WatchTimeError("'watched' and 'position' must be numbers.")
+    if not (0 <= watched < float('inf')) or not (0 <= position < float('inf')):
+        raise WatchTimeError("'watched' and 'position' must be positive numbers.")
+    return int(round(min(watched, MAX_HEARTBEAT_SECONDS))), int(position)
+
+
+# --- BUFFER ---
+
+class WatchTimeBuffer:
+    """
+    Per-process totals of the heartbeats received since the last flush,
+    keyed by (enrollment id, lesson id).
+    """
+    def __init__(self, flush_interval, max_entries):
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.entries = {}
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, enrollment_id, lesson_id, seconds, position):
+        """
+        Adds a heartbeat. Returns the buffered entries, emptying the buffer,
+        when a flush is due; otherwise None.
+        """
+        now = timezone.now()
+        with self.lock:
+            entry = self.entries.get((enrollment_id, lesson_id))
+            if entry is None:
+                self.entries[enrollment_id, lesson_id] = [seconds, position, now]
+            else:
+                entry[0] += seconds
+                entry[1] = position
+                entry[2] = now
+            if len(self.entries) < self.max_entries and time.monotonic() - self.last_flush < self.flush_interval:
+                return None
+            return self._drain()
+
+    def position(self, enrollment_id, lesson_id):
+        with self.lock:
+            entry = self.entries.get((enrollment_id, lesson_id))
+            return entry[1] if entry else None
+
+    def drain(self):
+        with self.lock:
+            return self._drain()
+
+    def drain_if_due(self):
+        """Returns and empties the entries if the flush interval has passed, else None."""
+        with self.lock:
+            if not self.entries or time.monotonic() - self.last_flush < self.flush_interval:
+                return None
+            return self._drain()
+
+    def seconds_until_due(self):
+        """
+        Seconds until the buffered entries are due for a flush. With nothing
+        buffered it is a full interval: the next heartbeat either flushes
+        itself or is due no later than that.
+        """
+        with self.lock:
+            if not self.entries:
+                return self.flush_interval
+            return max(0.0, self.last_flush + self.flush_interval - time.monotonic())
+
+    def _drain(self):
+        entries, self.entries = self.entries, {}
+        self.last_flush = time.monotonic()
+        return entries
+
+
+_buffer = WatchTimeBuffer(
+    getattr(settings, 'WATCH_TIME_FLUSH_INTERVAL', 30),
+    getattr(settings, 'WATCH_TIME_MAX_BUFFERED', 5000),
+)
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def flush_due_watch_time():
+    """Starts a background flush if buffered heartbeats are older than the interval."""
+    entries = _buffer.drain_if_due()
+    if entries:
+        defer_after_commit(write_watch_progress, entries)
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(_buffer.seconds_until_due())
+        flush_due_watch_time()
+
+
+def _start_flusher():
+    """
+    Starts this process's timer thread on its first heartbeat, so it runs in
+    each worker rather than in a parent process that forks them.
+    """
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_periodically, name='erudio-watch-time', daemon=True)
+            _flusher.start()
+
+
+def record_heartbeat(enrollment_id, lesson_id, seconds, position):
+    """Buffers a heartbeat; starts a background flush when one is due."""
+    if _flusher is None or not _flusher.is_alive():
+        _start_flusher()
+    entries = _buffer.add(enrollment_id, lesson_id, seconds, position)
+    if entries:
+        defer_after_commit(write_watch_progress, entries)
+
+
+def resume_position(enrollment, lesson):
+    """Playback position, in seconds, where `enrollment` left `lesson`."""
+    position = _buffer.position(enrollment.pk, lesson.pk)
+    if position is None:
+        position = LessonWatchProgress.objects.filter(
+            enrollment=enrollment, lesson=lesson
+        ).values_list('last_position', flat=True).first()
+    return position or 0
+
+
+@atexit.register
+def flush_pending_watch_time():
+    """Writes whatever this process still holds, e.g. on a worker restart."""
+    entries = _buffer.drain()
+    if entries:
+        write_watch_progress(entries)
+
+
+# --- WRITES ---
+
+def _upsert_sql(connection, row_count):
+    table = connection.ops.quote_name(LessonWatchProgress._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * row_count)
+    # Watch time is added to the stored total; position and timestamp only
+    # move forward, in case an older flush from another worker lands later.
+    return (
+        f'INSERT INTO {table} (enrollment_id, lesson_id, seconds_watched, last_position, updated_at) '
+        f'VALUES {values} '
+        f'ON CONFLICT (enrollment_id, lesson_id) DO UPDATE SET '
+        f'seconds_watched = {table}.seconds_watched + EXCLUDED.seconds_watched, '
+        f'last_position = CASE WHEN EXCLUDED.updated_at >= {table}.updated_at '
+        f'THEN EXCLUDED.last_position ELSE {table}.last_position END, '
+        f'updated_at = CASE WHEN EXCLUDED.updated_at >= {table}.updated_at '
+        f'THEN EXCLUDED.updated_at ELSE {table}.updated_at END'
+    )
+
+
+def _upsert(connection, rows):
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), FLUSH_BATCH_SIZE):
+            batch = rows[start:start + FLUSH_BATCH_SIZE]
+            cursor.execute(_upsert_sql(connection, len(batch)), [value for row in batch for value in row])
+
+
+def write_watch_progress(entries):
+    """
+    Adds buffered {(enrollment id, lesson id): [seconds, position, seen at]}
+    totals to LessonWatchProgress, one INSERT ... ON CONFLICT per batch
+    (PostgreSQL and SQLite both support it).
+    """
+    alias = router.db_for_write(LessonWatchProgress)
+    connection = connections[alias]
+    rows = [
+        (enrollment_id, lesson_id, seconds, position, connection.ops.adapt_datetimefield_value(seen_at))
+        for (enrollment_id, lesson_id), (seconds, position, seen_at) in entries.items()
+    ]
+    try:
+        with transaction.atomic(using=alias):
+            _upsert(connection, rows)
+    except IntegrityError:
+        # An enrollment or lesson was deleted since its heartbeats arrived.
+        enrollment_ids = set(Enrollment.objects.using(alias).filter(pk__in={row[0] for row in rows}).values_list('pk', flat=True))
+        lesson_ids = set(Lesson.objects.using(alias).filter(pk__in={row[1] for row in rows}).values_list('pk', flat=True))
+        rows = [row for row in rows if row[0] in enrollment_ids and row[1] in lesson_ids]
+        with transaction.atomic(using=alias):
+            _upsert(connection, rows)